@@ -1,10 +1,18 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import authentication, exceptions
-from django.contrib.auth import get_user_model
 
-User = get_user_model()
+from .user_cache import user_cache
+
 
 class CookieJWTAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates from the ``access_token`` cookie using the claims that
+    JWTAuthenticationMiddleware already verified, so the token is decoded
+    once per request. The user comes from the per-process user cache.
+    """
+
     def authenticate(self, request):
         access_token = request.COOKIES.get('access_token')
 
@@ -12,9 +20,18 @@ class CookieJWTAuthentication(authentication.BaseAuthentication):
             return None
 
         try:
-            validated_token = AccessToken(access_token)
-            user_id = validated_token['user_id']
-            user = User.objects.get(id=user_id)
-            return (user, None)
-        except Exception as e:
+            claims = request._request.jwt_claims
+        except AttributeError:
+            # Middleware not installed (e.g. a bare APIRequestFactory request).
+            try:
+                claims = AccessToken(access_token).payload
+            except TokenError:
+                claims = None
+
+        if claims is None:
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+
+        user = user_cache.get(claims.get(api_settings.USER_ID_CLAIM))
+        if user is None:
             raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return (user, None)
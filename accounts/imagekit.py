@@ -0,0 +1,88 @@
+import functools
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+@functools.cache
+def get_client():
+    """The process-wide ImageKit client, created (and imagekitio imported) on first use."""
+    from imagekitio import ImageKit
+
+    return ImageKit(
+        public_key=settings.IMAGEKIT_PUBLIC_KEY,
+        private_key=settings.IMAGEKIT_PRIVATE_KEY,
+        url_endpoint=settings.IMAGEKIT_URL_ENDPOINT,
+    )
+
+
+class SignaturePool:
+    """
+    Pre-generated ImageKit upload signatures, each handed out once.
+
+    Signatures are valid for ``IMAGEKIT_SIGNATURE_TTL`` seconds; ones with
+    less than half of that left are discarded rather than handed out. When
+    fewer than half of ``IMAGEKIT_SIGNATURE_POOL_SIZE`` remain, a background
+    thread refills the pool, so upload bursts pop ready signatures instead of
+    signing inline (which only happens when the pool runs dry).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signatures = deque()
+        self._refilling = False
+
+    def sign(self):
+        """A fresh signature, or None when ImageKit is not configured."""
+        if not (settings.IMAGEKIT_PUBLIC_KEY and settings.IMAGEKIT_PRIVATE_KEY and settings.IMAGEKIT_URL_ENDPOINT):
+            return None
+        expire = int(time.time()) + getattr(settings, 'IMAGEKIT_SIGNATURE_TTL', 600)
+        return get_client().get_authentication_parameters(expire=expire)
+
+    def take(self, count=1):
+        fresh_until = int(time.time()) + getattr(settings, 'IMAGEKIT_SIGNATURE_TTL', 600) // 2
+        taken = []
+        with self._lock:
+            while self._signatures and len(taken) < count:
+                params = self._signatures.popleft()
+                if params['expire'] > fresh_until:
+                    taken.append(params)
+            low = len(self._signatures) < getattr(settings, 'IMAGEKIT_SIGNATURE_POOL_SIZE', 32) // 2
+            refill = low and not self._refilling
+            if refill:
+                self._refilling = True
+        if refill:
+            threading.Thread(target=self._refill, daemon=True).start()
+
+        while len(taken) < count:
+            params = self.sign()
+            if params is None:
+                return None
+            taken.append(params)
+        return taken
+
+    def _refill(self):
+        try:
+            target = getattr(settings, 'IMAGEKIT_SIGNATURE_POOL_SIZE', 32)
+            with self._lock:
+                missing = target - len(self._signatures)
+            fresh = [self.sign() for _ in range(max(missing, 0))]
+            if fresh and fresh[0] is not None:
+                with self._lock:
+                    self._signatures.extend(fresh)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def size(self):
+        with self._lock:
+            return len(self._signatures)
+
+    def clear(self):
+        with self._lock:
+            self._signatures.clear()
+
+
+signature_pool = SignaturePool()
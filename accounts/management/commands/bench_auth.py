@@ -0,0 +1,66 @@
+import time
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.authentication import CookieJWTAuthentication
+from accounts.middleware import JWTAuthenticationMiddleware
+from accounts.models import User
+from accounts.user_cache import user_cache
+
+
+class Command(BaseCommand):
+    help = "Measure per-request authentication overhead of the old and current cookie JWT pipelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Work on a throwaway user; everything is rolled back at the end.
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-auth', email='bench-auth@example.com')
+            token = str(RefreshToken.for_user(user).access_token)
+            request = APIRequestFactory().get('/api/accounts/profile/')
+            request.COOKIES['access_token'] = token
+
+            legacy = self.measure(lambda: self.legacy_pipeline(token), iterations)
+            user_cache.clear()
+            current = self.measure(lambda: self.current_pipeline(request), iterations)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"iterations: {iterations}")
+        self.stdout.write(f"legacy  (3 decodes, 2 user queries): {legacy:8.1f} us/request")
+        self.stdout.write(f"current (1 decode, cached user):     {current:8.1f} us/request")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {legacy / current:.1f}x"))
+
+    def measure(self, func, iterations):
+        func()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    def legacy_pipeline(self, token):
+        # JWTAuthenticationMiddleware: decode, then the debug print forced the lazy user.
+        user_id = AccessToken(token)['user_id']
+        User.objects.get(id=user_id)
+        # RefreshTokenMiddleware: second decode.
+        jwt.decode(token, settings.SECRET_KEY, algorithms=[api_settings.ALGORITHM])
+        # CookieJWTAuthentication: third decode and another query.
+        User.objects.get(id=AccessToken(token)['user_id'])
+
+    def current_pipeline(self, request):
+        def view(request):
+            CookieJWTAuthentication().authenticate(Request(request))
+            return HttpResponse()
+
+        JWTAuthenticationMiddleware(view)(request)
@@ -0,0 +1,63 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import PasswordResetOTP, User
+
+
+class Command(BaseCommand):
+    help = "Measure OTP verification latency as the OTP table grows (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--steps', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        now = timezone.now()
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f'bench-otp-{i}', email=f'bench-otp-{i}@example.com')
+                for i in range(options['users'])
+            )
+            target = users[0]
+            PasswordResetOTP.objects.create(user=target, otp='424242')
+
+            self.stdout.write(f"{'rows':>10}{'verify ms':>12}{'legacy ms':>12}")
+            step = options['rows'] // options['steps']
+            seeded = 0
+            for _ in range(options['steps']):
+                # Mostly expired leftovers from other users, like an unswept table.
+                PasswordResetOTP.objects.bulk_create(
+                    (PasswordResetOTP(
+                        user=rng.choice(users),
+                        otp=f'{rng.randrange(10 ** 6):06d}',
+                        expires_at=now - timedelta(minutes=rng.randrange(1, 60 * 24 * 30)),
+                    ) for _ in range(step)),
+                    batch_size=5000,
+                )
+                seeded += step
+                verify = self.measure(
+                    lambda: PasswordResetOTP.objects.valid(target.email, '424242').exists(), options['repeat'])
+                legacy = self.measure(
+                    lambda: PasswordResetOTP.objects.filter(user=target, otp='424242').last(), options['repeat'])
+                self.stdout.write(f"{seeded:>10}{verify:>12.3f}{legacy:>12.3f}")
+
+            swept_at = time.perf_counter()
+            deleted = PasswordResetOTP.objects.sweep()
+            self.stdout.write(f"Swept {deleted} expired OTPs in {time.perf_counter() - swept_at:.2f} s")
+            transaction.set_rollback(True)
+
+    def measure(self, func, repeat):
+        func()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.tokens import prune_tokens, revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted tokens in small chunks, once or every --every seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--every', type=float, default=None, help="Keep pruning at this interval.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or getattr(settings, 'TOKEN_PRUNE_CHUNK_SIZE', 1000)
+        while True:
+            close_old_connections()
+            deleted = prune_tokens(chunk_size)
+            revoked_tokens.rebuild()
+            stats = revoked_tokens.stats()
+            self.stdout.write(
+                f"{deleted} expired tokens deleted; revoked-token filter: {stats['entries']} entries, "
+                f"{stats['bytes']} bytes, error rate {stats['error_rate']:.4%}."
+            )
+            if options['every'] is None:
+                break
+            try:
+                time.sleep(options['every'])
+            except KeyboardInterrupt:
+                break
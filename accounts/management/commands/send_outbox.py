@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.outbox import send_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails in batches, polling for new ones until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send what is due now and exit.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls when idle.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            close_old_connections()
+            sent, failed = send_pending(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"sent {sent}, failed {failed}")
+                continue
+            if options['once']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+        self.stdout.write(self.style.SUCCESS(f"{total_sent} sent, {total_failed} failed."))
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.models import PasswordResetOTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired password-reset OTPs in small chunks, once or every --every seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--every', type=float, default=None, help="Keep sweeping at this interval.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] or getattr(settings, 'OTP_SWEEP_CHUNK_SIZE', 1000)
+        while True:
+            close_old_connections()
+            deleted = PasswordResetOTP.objects.sweep(chunk_size)
+            self.stdout.write(f"{deleted} expired OTPs deleted.")
+            if options['every'] is None:
+                break
+            try:
+                time.sleep(options['every'])
+            except KeyboardInterrupt:
+                break
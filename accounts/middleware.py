@@ -1,47 +1,66 @@
-import jwt
-from datetime import datetime, timedelta
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
-from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
-from django.utils.deprecation import MiddlewareMixin
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.utils.functional import SimpleLazyObject
-from accounts.models import User
+from rest_framework_simplejwt.exceptions import ExpiredTokenError, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
-class RefreshTokenMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        access_token = request.COOKIES.get('access_token')
-        refresh_token = request.COOKIES.get('refresh_token')
+from accounts.tokens import FilteredRefreshToken
+from accounts.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+
+class JWTAuthenticationMiddleware:
+    """
+    The single place the ``access_token`` cookie is decoded.
+
+    The verified claims are stored on ``request.jwt_claims`` (None when the
+    cookie is missing or invalid) for CookieJWTAuthentication to reuse. An
+    expired access token is silently refreshed from the ``refresh_token``
+    cookie: the request is authenticated with the new token and the response
+    sets it as the new cookie. Refreshes from one refresh token within
+    ``JWT_REFRESH_COALESCE_WINDOW`` seconds reuse the same new access token.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.authenticate(request)
+        response = self.get_response(request)
+        self.set_access_cookie(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # Anonymous requests (e.g. chat streams) stay on the event loop; token
+        # checks may hit the database on refresh, so they run in a thread.
+        if request.COOKIES.get('access_token'):
+            await sync_to_async(self.authenticate)(request)
+        else:
+            request.jwt_claims = None
+        response = await self.get_response(request)
+        self.set_access_cookie(request, response)
+        return response
+
+    def authenticate(self, request):
+        request.jwt_claims = self.get_claims(request)
+        if request.jwt_claims:
+            user_id = request.jwt_claims.get(api_settings.USER_ID_CLAIM)
+            request.user = SimpleLazyObject(lambda: user_cache.get(user_id) or AnonymousUser())
 
-        if access_token:
-            try:
-                payload = jwt.decode(
-                    access_token, 
-                    settings.SIMPLE_JWT['SIGNING_KEY'], 
-                    algorithms=[settings.SIMPLE_JWT['ALGORITHM']]
-                )
-                # Token is valid, do nothing
-            except jwt.ExpiredSignatureError:
-                # Access token expired, try refreshing
-                if refresh_token:
-                    try:
-                        refresh_payload = jwt.decode(
-                            refresh_token, 
-                            settings.SIMPLE_JWT['SIGNING_KEY'], 
-                            algorithms=[settings.SIMPLE_JWT['ALGORITHM']]
-                        )
-                        user_id = refresh_payload.get('user_id')
-                        user = User.objects.get(id=user_id)
-                        new_refresh = RefreshToken.for_user(user)
-                        request.new_access_token = str(new_refresh.access_token)
-
-                    except jwt.ExpiredSignatureError:
-                        # Refresh token expired, user must login again
-                        pass
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-
-    def process_response(self, request, response):
+    def set_access_cookie(self, request, response):
         new_token = getattr(request, 'new_access_token', None)
         if new_token:
             response.set_cookie(
@@ -52,21 +71,40 @@ class RefreshTokenMiddleware(MiddlewareMixin):
                 samesite='Lax',
                 max_age=60 * 60 * 24 # Optional: 5 mins expiry
             )
-        return response
 
+    def get_claims(self, request):
+        access_token = request.COOKIES.get('access_token')
+        if not access_token:
+            return None
 
-class JWTAuthenticationMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+        try:
+            return AccessToken(access_token).payload
+        except ExpiredTokenError:
+            return self.refresh(request)
+        except TokenError as e:
+            logger.debug("Rejected access token cookie: %s", e)
+            return None
 
-    def __call__(self, request):
-        access_token = request.COOKIES.get('access_token')
-        if access_token:
-            try:
-                token = AccessToken(access_token)
-                user_id = token['user_id']
-                request.user = SimpleLazyObject(lambda: User.objects.get(id=user_id))
-                print(f'[Middleware] Authenticated User: {request.user.username}')
-            except Exception as e:
-                print('Token Error:', e)
-        return self.get_response(request)
\ No newline at end of file
+    def refresh(self, request):
+        """Mint a new access token from the refresh cookie and return its claims."""
+        refresh_token = request.COOKIES.get('refresh_token')
+        if not refresh_token:
+            return None
+
+        try:
+            refresh = FilteredRefreshToken(refresh_token)
+        except TokenError:
+            # Refresh token expired or revoked, user must login again
+            return None
+
+        # Parallel requests carrying the same expired cookie share one new
+        # access token, minted from the refresh token's claims alone.
+        key = f"jwt-refresh:{refresh[api_settings.JTI_CLAIM]}"
+        minted = cache.get(key)
+        if minted is None:
+            access = refresh.access_token
+            minted = (str(access), access.payload)
+            if not cache.add(key, minted, getattr(settings, 'JWT_REFRESH_COALESCE_WINDOW', 30)):
+                minted = cache.get(key) or minted
+        request.new_access_token, claims = minted
+        return claims
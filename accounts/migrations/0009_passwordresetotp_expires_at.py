@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:32
+
+from datetime import timedelta
+
+import accounts.models
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_expires_at(apps, schema_editor):
+    # Existing OTPs keep the fixed ten-minute lifetime they were issued with.
+    PasswordResetOTP = apps.get_model('accounts', 'PasswordResetOTP')
+    PasswordResetOTP.objects.update(expires_at=F('created_at') + timedelta(minutes=10))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordresetotp',
+            name='expires_at',
+            field=models.DateTimeField(default=accounts.models.otp_expiry),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(fields=['user', 'otp', 'expires_at'], name='otp_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(fields=['expires_at'], name='otp_expiry_idx'),
+        ),
+    ]
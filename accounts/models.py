@@ -1,6 +1,8 @@
 # accounts/models.py
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 
@@ -19,16 +21,115 @@ class User(AbstractUser):
         related_name='following',
         blank=True
     )
+    # Denormalized counters, maintained by follow/unfollow.
+    # `manage.py reconcile_counters` rebuilds them.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Moves with every change to the profile or its counters; the ETag and
+    # Last-Modified of profile responses are derived from it.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.username
 
+    def follow(self, user):
+        """Follow ``user``. Returns False if already following."""
+        with transaction.atomic():
+            _, created = User.followers.through.objects.get_or_create(
+                from_user_id=user.pk, to_user_id=self.pk
+            )
+            if created:
+                self._shift_follow_counters(user, 1)
+        return created
+
+    def unfollow(self, user):
+        """Stop following ``user``. Returns False if not following."""
+        with transaction.atomic():
+            deleted, _ = User.followers.through.objects.filter(
+                from_user_id=user.pk, to_user_id=self.pk
+            ).delete()
+            if deleted:
+                self._shift_follow_counters(user, -1)
+        return bool(deleted)
+
+    def _shift_follow_counters(self, user, delta):
+        from analytics.models import UserAnalytics
+        from backend import response_cache
+        from .serializers import invalidate_author_snapshots
+        from .user_cache import user_cache
+
+        now = timezone.now()
+        User.objects.filter(pk=self.pk).update(following_count=F('following_count') + delta, updated_at=now)
+        User.objects.filter(pk=user.pk).update(followers_count=F('followers_count') + delta, updated_at=now)
+        UserAnalytics.objects.filter(user_id=user.pk).update(total_followers=F('total_followers') + delta)
+        user_cache.invalidate(self.pk, user.pk)
+        invalidate_author_snapshots(self.pk, user.pk)
+        response_cache.bump('users', f'user:{self.pk}', f'user:{user.pk}', f'viewer:{self.pk}')
+
+
+def otp_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'PASSWORD_RESET_OTP_TTL', 600))
+
+
+class PasswordResetOTPQuerySet(models.QuerySet):
+    def valid(self, email, otp):
+        """Unexpired OTPs matching ``email`` and ``otp`` (one indexed lookup)."""
+        return self.filter(user__email=email, otp=otp, expires_at__gt=timezone.now())
+
+    def sweep(self, chunk_size=1000):
+        """
+        Delete expired OTPs ``chunk_size`` rows per statement, each in its own
+        short transaction, so the sweep never holds the write lock for long.
+        Returns the number deleted.
+        """
+        deleted = 0
+        while True:
+            ids = list(self.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            with transaction.atomic():
+                deleted += self.filter(pk__in=ids).delete()[0]
+
 
 class PasswordResetOTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     otp = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=otp_expiry)
+
+    objects = PasswordResetOTPQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'otp', 'expires_at'], name='otp_lookup_idx'),
+            models.Index(fields=['expires_at'], name='otp_expiry_idx'),
+        ]
 
     def is_expired(self):
-        from datetime import timedelta
-        return timezone.now() > self.created_at + timedelta(minutes=10)
+        return timezone.now() > self.expires_at
+
+
+class OutboundEmail(models.Model):
+    """
+    A queued email, delivered by ``accounts.outbox`` off the request path.
+    Rows are deleted once sent; those that keep failing stay as ``failed``.
+    """
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (FAILED, 'Failed')]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
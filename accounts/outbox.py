@@ -0,0 +1,178 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(to, subject, body, html=False):
+    """
+    Store an email for delivery and return it. With ``EMAIL_OUTBOX_THREAD``
+    a background thread of this process sends it once the surrounding
+    transaction commits; otherwise the ``send_outbox`` worker picks it up.
+    """
+    email = OutboundEmail.objects.create(to=to, subject=subject, body=body, html=html)
+    if getattr(settings, 'EMAIL_OUTBOX_THREAD', True):
+        transaction.on_commit(outbox_thread.kick)
+    return email
+
+
+def backoff(attempts):
+    """Seconds before retrying an email that has failed ``attempts`` times."""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_BASE', 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'EMAIL_OUTBOX_BACKOFF_MAX', 3600))
+
+
+def _claim(limit):
+    """
+    Due pending emails (up to ``limit``), leased for ``EMAIL_OUTBOX_LEASE``
+    seconds so concurrent workers skip them; a crashed worker's lease expires.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE', 300))
+    due = OutboundEmail.objects.filter(
+        status=OutboundEmail.PENDING, next_attempt_at__lte=now,
+    ).order_by('next_attempt_at')[:limit]
+    claimed = []
+    for email in due:
+        if OutboundEmail.objects.filter(pk=email.pk, next_attempt_at=email.next_attempt_at).update(next_attempt_at=lease):
+            claimed.append(email)
+    return claimed
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = str(error) or error.__class__.__name__
+    if email.attempts >= getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5):
+        email.status = OutboundEmail.FAILED
+        logger.error("Giving up on email %s to %s after %d attempts: %s",
+                     email.pk, email.to, email.attempts, email.last_error)
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=backoff(email.attempts))
+    # The row may have been deleted mid-send (a superseded reset email).
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        attempts=email.attempts, last_error=email.last_error,
+        status=email.status, next_attempt_at=email.next_attempt_at,
+    )
+
+
+def send_pending(limit=None):
+    """
+    Send one batch of due emails over a single mail connection. Sent emails
+    are deleted; failures are retried with exponential backoff up to
+    ``EMAIL_OUTBOX_MAX_ATTEMPTS`` times. Returns ``(sent, failed)``.
+    """
+    emails = _claim(limit or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50))
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not open the mail connection: %s", e)
+        for email in emails:
+            _failed(email, e)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.to],
+                connection=connection,
+            )
+            if email.html:
+                message.content_subtype = 'html'
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning("Sending email %s to %s failed: %s", email.pk, email.to, e)
+                _failed(email, e)
+                failed += 1
+                # The server may have dropped us; the next send reconnects.
+                connection.close()
+            else:
+                email.delete()
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def next_due():
+    """When the earliest pending email (a retry, or a lease) falls due, or None."""
+    return OutboundEmail.objects.filter(status=OutboundEmail.PENDING).order_by(
+        'next_attempt_at'
+    ).values_list('next_attempt_at', flat=True).first()
+
+
+class OutboxThread:
+    """
+    In-process outbox runner: ``kick`` schedules a drain of every due email on
+    a single background thread, so requests that queue mail return at once.
+    Kicks arriving while a drain is queued are folded into it. A drain that
+    leaves emails pending (failed sends backing off) sets a timer to kick
+    again when the earliest of them is due, so retries need no new mail.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._queued = False
+        self._timer = None
+        self._timer_at = None
+
+    def kick(self):
+        with self._lock:
+            if self._queued:
+                return
+            self._queued = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        self._executor.submit(self.drain)
+
+    def drain(self):
+        with self._lock:
+            self._queued = False
+        try:
+            while send_pending() != (0, 0):
+                pass
+            self.schedule(next_due())
+        except Exception:
+            logger.exception("Draining the email outbox failed")
+        finally:
+            close_old_connections()
+
+    def schedule(self, at):
+        """Kick at ``at``, unless a kick is already set for that time or earlier."""
+        if at is None:
+            return
+        with self._lock:
+            if self._timer is not None and self._timer_at <= at:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer_at = at
+            self._timer = threading.Timer(max((at - timezone.now()).total_seconds(), 0), self._wake)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _wake(self):
+        with self._lock:
+            self._timer = self._timer_at = None
+        self.kick()
+
+
+outbox_thread = OutboxThread()
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from .models import User
 from .models import User, PasswordResetOTP
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db.models.manager import BaseManager
+from backend.fieldsets import SparseFieldsMixin
+from backend.middleware import TimedSerializerMixin
 
 class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,38 +51,122 @@ class LoginSerializer(serializers.Serializer):
         data['user'] = user
         return data
 
-class ProfileSerializer(serializers.ModelSerializer):
+def following_ids_for(request, user_ids):
+    """
+    Return the subset of ``user_ids`` followed by the requesting user, in one
+    query. List serializers store it in their context as ``following_ids`` so
+    ``is_following`` becomes a set lookup instead of a query per user.
+    """
+    if not (request and request.user.is_authenticated):
+        return set()
+    return set(
+        request.user.following.filter(id__in=user_ids).values_list('id', flat=True)
+    )
+
+
+def is_following(context, user_id):
+    following_ids = context.get("following_ids")
+    if following_ids is not None:
+        return user_id in following_ids
+    request = context.get("request")
+    if request and request.user.is_authenticated:
+        return request.user.following.filter(id=user_id).exists()
+    return False
+
+
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Compact author shape embedded in posts and comments."""
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'full_name', 'profile_photo', 'bio', 'role',
+            'followers_count', 'following_count'
+        ]
+
+
+def author_snapshot_key(user_id):
+    return f"author-snapshot:{user_id}"
+
+
+def get_author_snapshots(user_ids):
+    """
+    Return ``{user_id: AuthorSerializer data}`` from the cache, with one
+    query for the misses. Snapshots are dropped by invalidate_author_snapshots
+    when the profile or follower counts change; that only reaches other
+    workers through a shared cache, hence the short default TTL otherwise.
+    """
+    keys = {author_snapshot_key(user_id): user_id for user_id in user_ids}
+    snapshots = {keys[key]: data for key, data in cache.get_many(keys).items()}
+    missing = set(keys.values()) - set(snapshots)
+    if missing:
+        users = User.objects.filter(id__in=missing).only(*AuthorSerializer.Meta.fields)
+        fresh = {user.id: dict(AuthorSerializer(user).data) for user in users}
+        cache.set_many(
+            {author_snapshot_key(user_id): data for user_id, data in fresh.items()},
+            getattr(settings, "AUTHOR_SNAPSHOT_TTL", 300),
+        )
+        snapshots.update(fresh)
+    return snapshots
+
+
+def invalidate_author_snapshots(*user_ids):
+    cache.delete_many([author_snapshot_key(user_id) for user_id in user_ids])
+
+
+def author_snapshot(context, user_id):
+    snapshots = context.get("author_snapshots")
+    if snapshots is None or user_id not in snapshots:
+        snapshots = context.setdefault("author_snapshots", {})
+        snapshots.update(get_author_snapshots([user_id]))
+    return snapshots.get(user_id)
+
+
+def author_profile(context, user_id):
+    """The embedded author of a post or comment, plus the viewer's ``is_following``."""
+    snapshot = author_snapshot(context, user_id)
+    if snapshot is None:
+        return None
+    return {**snapshot, "is_following": is_following(context, user_id)}
+
+
+class ProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'profile_photo', 'bio', 'gender', 'role',
-            'interests', 'followers', 'following', 'full_name', 'is_following'
+            'interests', 'followers_count', 'following_count', 'full_name', 'is_following'
         ]
-        read_only_fields = ['followers', 'following']
+        read_only_fields = ['followers_count', 'following_count']
 
     def get_is_following(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return request.user.following.filter(id=obj.id).exists()
-        return False
+        return is_following(self.context, obj.id)
+
+
+class UserListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, BaseManager) else data)
+        if "following_ids" not in self.context and "is_following" in self.child.fields:
+            self.context["following_ids"] = following_ids_for(
+                self.context.get("request"), [user.id for user in users]
+            )
+        return super().to_representation(users)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = [
             'id', 'username', 'email', 'profile_photo', 'bio', 'full_name', 'is_following'
         ]
 
     def get_is_following(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return request.user.following.filter(id=obj.id).exists()
-        return False
+        return is_following(self.context, obj.id)
 
 
 
@@ -0,0 +1,33 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from backend import response_cache
+from .models import User
+from .serializers import invalidate_author_snapshots
+from .tokens import revoked_tokens
+from .user_cache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    invalidate_author_snapshots(instance.pk)
+    response_cache.bump('users', f'user:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def followers_changed(sender, instance, action, pk_set, **kwargs):
+    # User.follow/unfollow write the through table directly, which sends no
+    # signals; they bump the response cache themselves.
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        user_ids = sorted({instance.pk, *(pk_set or ())})
+        response_cache.bump('users', *(f'user:{user_id}' for user_id in user_ids),
+                            *(f'viewer:{user_id}' for user_id in user_ids))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_revoked_token(sender, instance, created, **kwargs):
+    if created:
+        revoked_tokens.add(instance.token.jti)
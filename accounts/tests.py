@@ -1,3 +1,688 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import time
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.test import APITestCase
+
+from analytics.models import UserAnalytics
+from backend.governor import governor
+
+from posts.models import Post, Comment
+from .imagekit import get_client, signature_pool
+from .models import OutboundEmail, PasswordResetOTP, User
+from .outbox import _failed, outbox_thread, queue_email, send_pending
+from .tokens import BloomFilter, FilteredRefreshToken, prune_tokens, revoked_tokens
+from .user_cache import user_cache
+
+
+class UserFeedQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass')
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.viewer.following.add(cls.author)
+        for i in range(6):
+            post = Post.objects.create(author=cls.author, title=f'Post {i}', description='body')
+            post.likes.add(cls.viewer, cls.author)
+            Comment.objects.create(post=post, author=cls.viewer, content='nice')
+            Comment.objects.create(post=post, author=cls.author, content='thanks')
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def test_user_posts(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/accounts/users/{self.author.id}/posts/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_my_liked_posts(self):
+        # Range read on the likes index, then one batched hydrate.
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/accounts/liked-posts/')
+        self.assertEqual(response.status_code, 200)
+        post = response.data['results'][0]
+        self.assertEqual(post['likes_count'], 2)
+        self.assertTrue(post['is_liked'])
+
+    def test_liked_posts_cursor_walks_posts_newest_first(self):
+        expected = list(self.viewer.liked_posts.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, url = [], '/api/accounts/liked-posts/?limit=4'
+        while url:
+            response = self.client.get(url)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_follow_lists(self):
+        followers = self.client.get(f'/api/accounts/users/{self.author.id}/followers/')
+        following = self.client.get(f'/api/accounts/users/{self.viewer.id}/following/')
+        self.assertEqual([user['id'] for user in followers.data['results']], [self.viewer.id])
+        self.assertEqual([user['id'] for user in following.data['results']], [self.author.id])
+
+    def test_user_list(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/accounts/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sparse_user_list_skips_the_follow_lookup(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/users/?fields=id,username')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+
+    def test_sparse_user_posts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/accounts/users/{self.author.id}/posts/?fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass')
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.post = Post.objects.create(author=cls.author, title='Post', description='body')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCached(self, url, num_queries=0):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Response-Cache'], 'hit')
+        self.assertEqual(len(queries), num_queries)
+        return response
+
+    def test_public_endpoints_are_served_from_cache(self):
+        self.assertCached('/api/accounts/users/')
+        self.assertCached(f'/api/accounts/users/{self.author.id}/posts/')
+        # User detail still reads its ETag validator.
+        self.assertCached(f'/api/accounts/users/{self.author.id}/', num_queries=1)
+
+    def test_profile_change_invalidates_user_detail(self):
+        url = f'/api/accounts/users/{self.author.id}/'
+        self.assertCached(url, num_queries=1)
+        self.author.bio = 'updated'
+        self.author.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Response-Cache'], 'miss')
+        self.assertEqual(response.data['bio'], 'updated')
+
+    def test_posts_comments_and_likes_invalidate_user_posts(self):
+        url = f'/api/accounts/users/{self.author.id}/posts/'
+        self.assertCached(url)
+        Comment.objects.create(post=self.post, author=self.viewer, content='nice')
+        self.assertEqual(len(self.client.get(url).data['results'][0]['comments']), 1)
+
+        self.post.add_like(self.viewer)
+        self.assertEqual(self.client.get(url).data['results'][0]['likes_count'], 1)
+
+        Post.objects.create(author=self.author, title='Second', description='body')
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+    def test_other_authors_keep_their_cached_posts(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        url = f'/api/accounts/users/{self.author.id}/posts/'
+        self.assertCached(url)
+        Post.objects.create(author=other, title='Elsewhere', description='body')
+        self.assertEqual(self.client.get(url)['X-Response-Cache'], 'hit')
+
+    def test_follow_invalidates_the_viewers_is_following(self):
+        self.client.force_authenticate(self.viewer)
+        url = f'/api/accounts/users/{self.author.id}/'
+        self.assertFalse(self.assertCached(url, num_queries=1).data['is_following'])
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        self.assertTrue(self.client.get(url).data['is_following'])
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.assertFalse(self.client.get(url).data['is_following'])
+
+    def test_responses_are_cached_per_viewer(self):
+        url = f'/api/accounts/users/{self.author.id}/'
+        self.viewer.follow(self.author)
+        self.assertFalse(self.assertCached(url, num_queries=1).data['is_following'])
+        self.client.force_authenticate(self.viewer)
+        self.assertTrue(self.client.get(url).data['is_following'])
+
+
+class ConditionalProfileTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.alice).access_token)
+
+    def test_profile_revalidates_until_it_changes(self):
+        etag = self.client.get('/api/accounts/profile/')['ETag']
+        self.assertEqual(self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        time.sleep(0.001)
+        self.client.post(f'/api/accounts/follow/{self.bob.id}/')
+        response = self.client.get('/api/accounts/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['following_count'], 1)
+
+    def test_user_detail_revalidates_until_followed(self):
+        url = f'/api/accounts/users/{self.bob.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        time.sleep(0.001)
+        self.client.post(f'/api/accounts/follow/{self.bob.id}/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_following'])
+
+
+class FollowCounterTests(APITestCase):
+    def test_follow_counters_only_move_on_real_changes(self):
+        alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass')
+        self.client.force_authenticate(alice)
+
+        for _ in range(2):
+            self.client.post(f'/api/accounts/follow/{bob.id}/')
+        alice.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual((alice.following_count, bob.followers_count), (1, 1))
+        self.assertEqual(UserAnalytics.objects.get(user=bob).total_followers, 1)
+        self.assertTrue(bob.followers.filter(id=alice.id).exists())
+
+        for _ in range(2):
+            self.client.post(f'/api/accounts/unfollow/{bob.id}/')
+        alice.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual((alice.following_count, bob.followers_count), (0, 0))
+        self.assertEqual(UserAnalytics.objects.get(user=bob).total_followers, 0)
+
+
+class CookieAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.cookies['access_token'] = str(self.refresh.access_token)
+
+    def test_user_is_resolved_from_cache(self):
+        self.client.get('/api/accounts/profile/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'alice')
+        user_lookups = [q for q in queries if 'WHERE "accounts_user"."id" =' in q['sql']]
+        self.assertEqual(user_lookups, [])
+
+    def test_cached_users_share_no_state(self):
+        first, second = user_cache.get(self.user.id), user_cache.get(self.user.id)
+        self.assertEqual(first, second)
+        self.assertIsNot(first._state, second._state)
+        first._state.fields_cache['marker'] = object()
+        first.interests.append('django')
+        first.bio = 'changed'
+        third = user_cache.get(self.user.id)
+        self.assertEqual(third._state.fields_cache, {})
+        self.assertEqual((third.interests, third.bio), ([], self.user.bio))
+        self.assertFalse(third._state.adding)
+
+    def test_profile_update_invalidates_cached_user(self):
+        self.client.get('/api/accounts/profile/')
+        self.client.patch('/api/accounts/profile/', {'bio': 'updated'})
+        response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.data['bio'], 'updated')
+
+    def test_invalid_token_is_rejected(self):
+        self.client.cookies['access_token'] = 'not-a-token'
+        response = self.client.get('/api/accounts/profile/')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_expired_access_token_is_refreshed(self):
+        expired = self.refresh.access_token
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        self.client.cookies['access_token'] = str(expired)
+        self.client.cookies['refresh_token'] = str(self.refresh)
+
+        response = self.client.get('/api/accounts/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.cookies)
+
+    def test_parallel_refreshes_share_one_new_access_token(self):
+        cache.clear()
+        expired = self.refresh.access_token
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        outstanding = OutstandingToken.objects.count()
+
+        tokens = set()
+        for _ in range(5):
+            self.client.cookies['access_token'] = str(expired)
+            self.client.cookies['refresh_token'] = str(self.refresh)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/accounts/profile/')
+            tokens.add(response.cookies['access_token'].value)
+            self.assertFalse([q for q in queries if 'INSERT' in q['sql']])
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(OutstandingToken.objects.count(), outstanding)
+
+
+class AuthorSnapshotTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        Post.objects.create(author=self.alice, title='t', description='d', category='c')
+        self.client.force_authenticate(self.bob)
+
+    def explore_author(self):
+        return self.client.get('/api/posts/explore/').data['results'][0]['author_profile']
+
+    def test_profile_update_refreshes_snapshot(self):
+        self.assertEqual(self.explore_author()['bio'], '')
+        self.alice.bio = 'updated'
+        self.alice.save()
+        self.assertEqual(self.explore_author()['bio'], 'updated')
+
+    def test_follow_refreshes_snapshot_counts(self):
+        self.assertEqual(self.explore_author()['followers_count'], 0)
+        self.bob.follow(self.alice)
+        self.assertEqual(self.explore_author()['followers_count'], 1)
+
+
+class FollowListTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='pw')
+            for i in range(3)
+        ]
+        for fan in self.fans:
+            fan.follow(self.alice)
+
+    def test_followers_are_paginated(self):
+        response = self.client.get(f'/api/accounts/users/{self.alice.id}/followers/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([u['username'] for u in response.data['results']], ['fan0', 'fan1'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_following(self):
+        response = self.client.get(f'/api/accounts/users/{self.fans[0].id}/following/')
+        self.assertEqual([u['username'] for u in response.data['results']], ['alice'])
+
+
+@override_settings(GOVERNOR_LIMITS={'login': {'rate': '10/min', 'burst': 3}})
+class LoginThrottleTests(APITestCase):
+    def setUp(self):
+        governor.reset()
+
+    def test_login_attempts_are_rate_limited(self):
+        statuses = [
+            self.client.post('/api/accounts/login/', {'username_or_email': 'x', 'password': 'y'}).status_code
+            for _ in range(4)
+        ]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+    def test_forged_forwarded_for_does_not_reset_the_limit(self):
+        # The client prepends a new address each time; the proxy appends the real one.
+        statuses = [
+            self.client.post(
+                '/api/accounts/login/', {'username_or_email': 'x', 'password': 'y'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 198.51.100.7',
+            ).status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 0})
+    def test_without_proxies_forwarded_for_is_ignored(self):
+        statuses = [
+            self.client.post(
+                '/api/accounts/login/', {'username_or_email': 'x', 'password': 'y'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{i}',
+            ).status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    connections = 0
+
+    def open(self):
+        CountingEmailBackend.connections += 1
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('450 try again later')
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    failures = 0
+
+    def send_messages(self, email_messages):
+        if FlakyEmailBackend.failures:
+            FlakyEmailBackend.failures -= 1
+            raise SMTPException('450 try again later')
+        return super().send_messages(email_messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_THREAD=False,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+)
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def request_reset(self):
+        return self.client.post('/api/accounts/forgot-password/', {'email': 'alice@example.com'})
+
+    def test_reset_request_queues_the_otp_email(self):
+        self.assertEqual(self.request_reset().status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        otp = PasswordResetOTP.objects.get(user=self.user).otp
+        self.assertEqual(queued.to, 'alice@example.com')
+        self.assertIn(otp, queued.body)
+
+        call_command('send_outbox', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        self.assertIn(otp, mail.outbox[0].body)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_new_reset_request_drops_the_pending_one(self):
+        self.request_reset()
+        OutboundEmail.objects.update(status=OutboundEmail.PENDING, attempts=1)
+        queue_email('alice@example.com', 'Hi', 'Hello')
+        self.request_reset()
+        otp = PasswordResetOTP.objects.get(user=self.user).otp
+        reset = OutboundEmail.objects.get(subject='SkillSync Password Reset OTP')
+        self.assertIn(otp, reset.body)
+        self.assertEqual(reset.attempts, 0)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_failure_of_a_deleted_email_is_dropped(self):
+        email = queue_email('alice@example.com', 'Hi', 'Hello')
+        OutboundEmail.objects.all().delete()
+        _failed(email, OSError('try again later'))
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.CountingEmailBackend')
+    def test_batch_shares_one_connection(self):
+        CountingEmailBackend.connections = 0
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hi', 'Hello')
+        self.assertEqual(send_pending(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.connections, 1)
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.FailingEmailBackend', EMAIL_OUTBOX_BACKOFF_BASE=30)
+    def test_failures_back_off_then_give_up(self):
+        email = queue_email('alice@example.com', 'Hi', 'Hello')
+        self.assertEqual(send_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.PENDING, 1))
+        self.assertIn('try again later', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=25))
+        # Not due yet.
+        self.assertEqual(send_pending(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboundEmail.FAILED, 2))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_queued_email_is_sent_by_the_outbox_thread_after_commit(self):
+        with override_settings(EMAIL_OUTBOX_THREAD=True), \
+                self.captureOnCommitCallbacks() as callbacks:
+            queue_email('alice@example.com', 'Hi', 'Hello')
+        self.assertEqual(callbacks, [outbox_thread.kick])
+
+
+@override_settings(
+    EMAIL_BACKEND='accounts.tests.FlakyEmailBackend',
+    EMAIL_OUTBOX_THREAD=True,
+    EMAIL_OUTBOX_BACKOFF_BASE=0.2,
+)
+class OutboxThreadRetryTests(TransactionTestCase):
+    # The outbox thread has its own connection, so rows must be committed.
+    databases = {'default', 'read'}
+
+    def test_failed_email_is_retried_without_new_mail(self):
+        FlakyEmailBackend.failures = 1
+        with self.assertLogs('accounts.outbox', 'WARNING'):
+            queue_email('alice@example.com', 'Hi', 'Hello')
+            deadline = time.monotonic() + 5
+            while not OutboundEmail.objects.filter(attempts=1).exists() and time.monotonic() < deadline:
+                time.sleep(0.02)
+        self.assertEqual(mail.outbox, [])
+        deadline = time.monotonic() + 5
+        while OutboundEmail.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual([message.to for message in mail.outbox], [['alice@example.com']])
+
+
+class PasswordResetOTPTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+
+    def verify(self, email='alice@example.com', otp='123456'):
+        return self.client.post('/api/accounts/verify-otp/', {'email': email, 'otp': otp})
+
+    def test_verify_is_one_indexed_query(self):
+        PasswordResetOTP.objects.create(user=self.user, otp='123456')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.verify()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+        sql, params = PasswordResetOTP.objects.valid('alice@example.com', '123456').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('otp_lookup_idx', plan)
+
+    def test_verify_rejects_expired_wrong_and_unknown(self):
+        PasswordResetOTP.objects.create(
+            user=self.user, otp='111111', expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        PasswordResetOTP.objects.create(user=self.other, otp='222222')
+        self.assertEqual(self.verify(otp='111111').data, {'error': 'Invalid or expired OTP'})
+        self.assertEqual(self.verify(otp='222222').data, {'error': 'Invalid or expired OTP'})
+        self.assertEqual(self.verify(email='nobody@example.com').data, {'error': 'Invalid email'})
+
+    @override_settings(EMAIL_OUTBOX_THREAD=False)
+    def test_new_otp_replaces_earlier_ones(self):
+        for _ in range(3):
+            self.client.post('/api/accounts/forgot-password/', {'email': 'alice@example.com'})
+        self.assertEqual(PasswordResetOTP.objects.filter(user=self.user).count(), 1)
+
+    def test_sweep_deletes_expired_otps_in_chunks(self):
+        expired = timezone.now() - timedelta(minutes=1)
+        PasswordResetOTP.objects.bulk_create(
+            PasswordResetOTP(user=self.user, otp=f'{i:06d}', expires_at=expired) for i in range(25)
+        )
+        live = PasswordResetOTP.objects.create(user=self.user, otp='999999')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(PasswordResetOTP.objects.sweep(chunk_size=10), 25)
+        deletes = [q for q in queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(list(PasswordResetOTP.objects.all()), [live])
+
+        out = StringIO()
+        call_command('sweep_otps', stdout=out)
+        self.assertIn('0 expired OTPs deleted', out.getvalue())
+
+
+class RevokedTokenFilterTests(APITestCase):
+    def setUp(self):
+        revoked_tokens.reset()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def blacklist_lookups(self, queries):
+        return [q for q in queries if 'token_blacklist_blacklistedtoken' in q['sql']]
+
+    def test_unrevoked_token_needs_no_blacklist_query(self):
+        FilteredRefreshToken(str(self.refresh))  # builds the filter
+        with CaptureQueriesContext(connection) as queries:
+            FilteredRefreshToken(str(self.refresh))
+        self.assertEqual(self.blacklist_lookups(queries), [])
+
+    def test_logout_revokes_the_token_at_once(self):
+        FilteredRefreshToken(str(self.refresh))
+        self.client.post('/api/accounts/logout/', {'refresh': str(self.refresh)})
+        with self.assertRaises(TokenError):
+            FilteredRefreshToken(str(self.refresh))
+
+    @override_settings(REVOKED_FILTER_SYNC=0)
+    def test_revocations_by_other_workers_are_synced(self):
+        FilteredRefreshToken(str(self.refresh))
+        # bulk_create sends no post_save, like a revocation in another process.
+        outstanding = OutstandingToken.objects.get(jti=self.refresh['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        with self.assertRaises(TokenError):
+            FilteredRefreshToken(str(self.refresh))
+
+    @override_settings(REVOKED_FILTER_SYNC=3600)
+    def test_refresh_and_logout_check_the_table(self):
+        FilteredRefreshToken(str(self.refresh))
+        outstanding = OutstandingToken.objects.get(jti=self.refresh['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        # Not synced yet: only the middleware's silent refresh lets it through.
+        FilteredRefreshToken(str(self.refresh))
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        self.assertEqual(self.client.post('/api/accounts/refresh/').status_code, 401)
+        self.assertEqual(self.client.post('/api/accounts/logout/', {'refresh': str(self.refresh)}).status_code, 400)
+
+    def test_rotated_token_is_rejected_by_the_refresh_view(self):
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        self.assertEqual(self.client.post('/api/accounts/refresh/').status_code, 200)
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        self.assertEqual(self.client.post('/api/accounts/refresh/').status_code, 401)
+
+    def test_bloom_filter_size_and_error_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertLessEqual(len(bloom.bits), 1300)
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'live-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertAlmostEqual(bloom.error_rate(), 0.01, delta=0.005)
+
+    def test_prune_deletes_expired_tokens_in_chunks(self):
+        expired = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            token = OutstandingToken.objects.create(jti=f'old-{i}', token='x', expires_at=expired)
+            BlacklistedToken.objects.create(token=token)
+        self.assertEqual(prune_tokens(chunk_size=2), 5)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.refresh['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+        out = StringIO()
+        call_command('prune_tokens', stdout=out)
+        self.assertIn('0 expired tokens deleted', out.getvalue())
+
+    def test_stats_are_admin_only(self):
+        FilteredRefreshToken(str(self.refresh))
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/accounts/token-filter-stats/').status_code, 403)
+        admin = User.objects.create_user(username='root', email='root@example.com', is_staff=True)
+        self.client.force_authenticate(admin)
+        stats = self.client.get('/api/accounts/token-filter-stats/').data
+        self.assertEqual(stats['entries'], 0)
+        self.assertGreater(stats['bytes'], 0)
+
+
+@override_settings(IMAGEKIT_PRIVATE_KEY='private_test', IMAGEKIT_PUBLIC_KEY='public_test',
+                   IMAGEKIT_URL_ENDPOINT='https://ik.imagekit.io/test', IMAGEKIT_SIGNATURE_POOL_SIZE=8)
+class ImageKitSignatureTests(APITestCase):
+    def setUp(self):
+        get_client.cache_clear()
+        signature_pool.clear()
+        self.addCleanup(get_client.cache_clear)
+        self.addCleanup(signature_pool.clear)
+        # Let a refill started by the test finish before its settings are reverted.
+        self.addCleanup(self.wait_for_idle)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_authenticate(self.user)
+
+    def assertValidSignature(self, params):
+        expected = hmac.new(b'private_test', f"{params['token']}{params['expire']}".encode(), hashlib.sha1)
+        self.assertEqual(params['signature'], expected.hexdigest())
+        self.assertGreater(params['expire'], time.time() + 300)
+
+    def wait_for_idle(self):
+        deadline = time.monotonic() + 5
+        while signature_pool._refilling and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def wait_for_refill(self):
+        deadline = time.monotonic() + 5
+        while signature_pool.size() < 8 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(signature_pool.size(), 8)
+
+    def test_single_signature(self):
+        response = self.client.get('/api/accounts/imagekit-auth/')
+        self.assertEqual(response.status_code, 200)
+        self.assertValidSignature(response.data)
+
+    def test_batch_signatures_are_distinct(self):
+        response = self.client.get('/api/accounts/imagekit-auth/batch/?count=3')
+        self.assertEqual(len(response.data), 3)
+        for params in response.data:
+            self.assertValidSignature(params)
+        self.assertEqual(len({params['token'] for params in response.data}), 3)
+
+        for count in ('0', '11', 'x'):
+            response = self.client.get(f'/api/accounts/imagekit-auth/batch/?count={count}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_pool_is_refilled_in_the_background(self):
+        first = signature_pool.take()
+        self.wait_for_refill()
+        pooled = list(signature_pool._signatures)
+        taken = signature_pool.take(3)
+        self.assertEqual(taken, pooled[:3])
+        self.assertNotIn(first[0], pooled)
+
+    def test_stale_signatures_are_discarded(self):
+        signature_pool.take()
+        self.wait_for_refill()
+        for params in signature_pool._signatures:
+            params['expire'] = int(time.time()) + 60
+        taken = signature_pool.take()[0]
+        self.assertValidSignature(taken)
+        self.assertGreater(taken['expire'], time.time() + 300)
+
+    @override_settings(IMAGEKIT_PRIVATE_KEY=None)
+    def test_unconfigured_imagekit(self):
+        response = self.client.get('/api/accounts/imagekit-auth/')
+        self.assertEqual(response.status_code, 503)
@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings, sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        if all(self.bits[p >> 3] & (1 << (p & 7)) for p in positions):
+            return
+        for p in positions:
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def error_rate(self):
+        """Expected false positive rate at the current fill."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class RevokedTokenFilter:
+    """
+    Per-process Bloom filter of blacklisted refresh-token JTIs, so checking a
+    token that was never revoked (nearly all of them) needs no query. Only
+    JTIs the filter may contain are looked up in the blacklist table.
+
+    The filter is rebuilt from the table every ``REVOKED_FILTER_REBUILD``
+    seconds, sized for twice the revoked tokens still unexpired (at most
+    ``REVOKED_FILTER_MAX_ENTRIES``, which bounds its memory) at
+    ``REVOKED_FILTER_ERROR_RATE``. In between, tokens blacklisted by this
+    process are added at once and those blacklisted by other workers are
+    picked up by an incremental sync every ``REVOKED_FILTER_SYNC`` seconds,
+    which bounds how long another worker's revocation can go unseen.
+    """
+
+    # Blacklist ids are re-read with this much overlap, so rows committed out
+    # of id order by concurrent transactions are not skipped.
+    SYNC_OVERLAP = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._last_id = 0
+        self._built_at = self._synced_at = 0.0
+        self._refreshing = False
+
+    def might_be_revoked(self, jti):
+        self._refresh()
+        with self._lock:
+            return self._bloom is None or jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            rebuild = self._bloom is None or now - self._built_at >= getattr(settings, 'REVOKED_FILTER_REBUILD', 3600)
+            sync = now - self._synced_at >= getattr(settings, 'REVOKED_FILTER_SYNC', 5)
+            # One thread refreshes while the others keep using the current filter.
+            if not (rebuild or sync) or (self._refreshing and self._bloom is not None):
+                return
+            self._refreshing = True
+        try:
+            self.rebuild() if rebuild else self._sync()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def rebuild(self):
+        revoked = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        count = revoked.count()
+        max_entries = getattr(settings, 'REVOKED_FILTER_MAX_ENTRIES', 1_000_000)
+        if count > max_entries:
+            logger.warning("%d revoked tokens exceed REVOKED_FILTER_MAX_ENTRIES=%d; "
+                           "the filter's false positive rate will rise", count, max_entries)
+        bloom = BloomFilter(
+            min(max(2 * count, 1024), max_entries), getattr(settings, 'REVOKED_FILTER_ERROR_RATE', 0.01)
+        )
+        last_id = 0
+        for pk, jti in revoked.values_list('pk', 'token__jti').iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = max(last_id, pk)
+        now = time.monotonic()
+        with self._lock:
+            self._bloom, self._last_id = bloom, last_id
+            self._built_at = self._synced_at = now
+
+    def _sync(self):
+        rows = list(
+            BlacklistedToken.objects.filter(pk__gt=self._last_id - self.SYNC_OVERLAP)
+            .values_list('pk', 'token__jti')
+        )
+        with self._lock:
+            for pk, jti in rows:
+                self._bloom.add(jti)
+                self._last_id = max(self._last_id, pk)
+            self._synced_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            bloom = self._bloom
+            if bloom is None:
+                return {'entries': 0, 'bytes': 0}
+            return {
+                'entries': bloom.count,
+                'bytes': len(bloom.bits),
+                'bits': bloom.size,
+                'hashes': bloom.hashes,
+                'error_rate': round(bloom.error_rate(), 6),
+                'age': round(time.monotonic() - self._built_at, 1),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._last_id = 0
+
+
+revoked_tokens = RevokedTokenFilter()
+
+
+class FilteredRefreshToken(tokens.RefreshToken):
+    """
+    Refresh token whose blacklist check goes through ``revoked_tokens`` first.
+
+    A negative answer is trusted, so a token revoked by another worker passes
+    until this worker's next sync, up to ``REVOKED_FILTER_SYNC`` seconds. That
+    is accepted for RefreshTokenMiddleware minting short-lived access tokens;
+    the refresh and logout views, which rotate and revoke refresh tokens, use
+    simplejwt's RefreshToken and its exact table check.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if revoked_tokens.might_be_revoked(jti) and BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+
+def prune_tokens(chunk_size=1000):
+    """
+    Delete expired outstanding tokens and their blacklist entries,
+    ``chunk_size`` tokens per short transaction. Returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+            .order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            _, per_model = OutstandingToken.objects.filter(pk__in=ids).delete()
+        deleted += per_model.get(OutstandingToken._meta.label, 0)
@@ -1,9 +1,10 @@
 from django.urls import path
 from .views import (
     RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView,
-    UserListView, UserDetailView, CookieTokenRefreshView, LogoutView, MyLikedPostsView, UserPostsView, RequestPasswordResetView, VerifyOTPView, ResetPasswordView, 
+    UserListView, UserDetailView, FollowersListView, FollowingListView, CookieTokenRefreshView, LogoutView, MyLikedPostsView, UserPostsView, RequestPasswordResetView, VerifyOTPView, ResetPasswordView,
+    RevokedTokenFilterStatsView,
 )
-from .views import imagekit_auth_view
+from .views import imagekit_auth_batch_view, imagekit_auth_view
 
 
 urlpatterns = [
@@ -16,11 +17,15 @@ urlpatterns = [
     path('users/', UserListView.as_view(), name='user-list'),
     path('users/<int:id>/', UserDetailView.as_view(), name='user-detail'),
     path('users/<int:user_id>/posts/', UserPostsView.as_view(), name='user-posts'),
+    path('users/<int:user_id>/followers/', FollowersListView.as_view(), name='user-followers'),
+    path('users/<int:user_id>/following/', FollowingListView.as_view(), name='user-following'),
     path('refresh/', CookieTokenRefreshView.as_view(), name='token-refresh'),
+    path('token-filter-stats/', RevokedTokenFilterStatsView.as_view(), name='token-filter-stats'),
     path('liked-posts/', MyLikedPostsView.as_view(), name='my-liked-posts'),
     path('forgot-password/', RequestPasswordResetView.as_view(), name='forgot-password'),
     path('verify-otp/', VerifyOTPView.as_view(), name='verify-otp'),
     path('reset-password/', ResetPasswordView.as_view(), name='reset-password'),
     path("imagekit-auth/", imagekit_auth_view, name="imagekit-auth"),
+    path("imagekit-auth/batch/", imagekit_auth_batch_view, name="imagekit-auth-batch"),
 
 ]
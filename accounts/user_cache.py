@@ -0,0 +1,66 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import User
+
+
+class UserCache:
+    """
+    Bounded per-process LRU cache of ``User`` rows keyed by id, so an
+    authenticated request does not need a query to resolve its user.
+
+    Entries expire after ``USER_CACHE_TTL`` seconds and the least recently
+    used are evicted beyond ``USER_CACHE_MAX_SIZE``. Saving or deleting a
+    user, and following or unfollowing, invalidate the affected entries.
+    Entries hold the row's field values and every call builds a fresh
+    instance from them, so requests share no model state or related-object
+    caches and cannot mutate one another's user.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        """Return the user with ``user_id``, or None if there is none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(user_id)
+                return self._build(entry[0], entry[1])
+
+        user = User.objects.filter(id=user_id).first()
+        if user is None:
+            return None
+        values = tuple(getattr(user, field.attname) for field in User._meta.concrete_fields)
+        with self._lock:
+            self._entries[user_id] = (user._state.db, values, now + getattr(settings, 'USER_CACHE_TTL', 60))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > getattr(settings, 'USER_CACHE_MAX_SIZE', 1024):
+                self._entries.popitem(last=False)
+        return self._build(user._state.db, values)
+
+    @staticmethod
+    def _build(db, values):
+        # Deep copy: JSON fields (interests) hold mutable values.
+        return User.from_db(db, [field.attname for field in User._meta.concrete_fields], copy.deepcopy(values))
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
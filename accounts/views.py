@@ -6,32 +6,57 @@ from django.conf import settings
 from .models import User
 from .serializers import RequestPasswordResetSerializer, ResetPasswordSerializer, UserSerializer, RegisterSerializer, ProfileSerializer, LoginSerializer, VerifyOTPSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import revoked_tokens
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework.exceptions import ValidationError
 from posts.serializers import PostSerializer
-from posts.models import Post
+from posts.models import Post, PostLike
+from posts.pagination import FeedPagination, keyset_filter
+from posts import timeline
+from search.suggest import suggestions
 from django.core.mail import send_mail
-from .models import PasswordResetOTP
+from .models import OutboundEmail, PasswordResetOTP
+from .outbox import queue_email
 import random
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from imagekitio import ImageKit
+from .imagekit import signature_pool
 from rest_framework.views import APIView
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from backend.conditional import ConditionalGetMixin
+from backend.response_cache import CachedResponseMixin
+
+
+def _signatures(count):
+    signatures = signature_pool.take(count)
+    if signatures is None:
+        return None, Response({'error': 'Image uploads are not configured.'},
+                              status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return signatures, None
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])  # remove if public
 def imagekit_auth_view(request):
-    imagekit = ImageKit(
-        public_key=settings.IMAGEKIT_PUBLIC_KEY,
-        private_key=settings.IMAGEKIT_PRIVATE_KEY,
-        url_endpoint=settings.IMAGEKIT_URL_ENDPOINT,
-    )
-    auth_params = imagekit.get_authentication_parameters()
-    return Response(auth_params)
+    signatures, error = _signatures(1)
+    return error or Response(signatures[0])
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def imagekit_auth_batch_view(request):
+    """``?count=N`` upload signatures at once, for posts with several images."""
+    limit = getattr(settings, 'IMAGEKIT_SIGNATURE_BATCH_MAX', 10)
+    try:
+        count = int(request.query_params.get('count', 1))
+    except ValueError:
+        count = 0
+    if not 1 <= count <= limit:
+        return Response({'error': f'count must be between 1 and {limit}.'}, status=status.HTTP_400_BAD_REQUEST)
+    signatures, error = _signatures(count)
+    return error or Response(signatures)
 
 # Utility function to set cookies
 def set_jwt_cookies(response, refresh, access):
@@ -66,6 +91,7 @@ class RegisterView(generics.CreateAPIView):
 
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -181,10 +207,22 @@ class LogoutView(generics.GenericAPIView):
         return response
 
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class RevokedTokenFilterStatsView(APIView):
+    """Size and fill of this worker's revoked-token filter."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(revoked_tokens.stats())
+
+
+class ProfileView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_validators(self):
+        # Same (cached) user the response is serialized from; no query.
+        return [self.request.user.updated_at]
+
     def get_object(self):
         return self.request.user
 
@@ -194,7 +232,9 @@ class FollowUserView(generics.GenericAPIView):
     
     def post(self, request, user_id):
         user_to_follow = User.objects.get(id=user_id)
-        request.user.following.add(user_to_follow)
+        if request.user.follow(user_to_follow):
+            timeline.backfill(request.user, user_to_follow)
+            suggestions.followers_changed(user_to_follow.id, 1)
         return Response({'message': 'Followed Successfully'})
 
 
@@ -203,26 +243,65 @@ class UnfollowUserView(generics.GenericAPIView):
     
     def post(self, request, user_id):
         user_to_unfollow = User.objects.get(id=user_id)
-        request.user.following.remove(user_to_unfollow)
+        if request.user.unfollow(user_to_unfollow):
+            timeline.purge(request.user, user_to_unfollow)
+            suggestions.followers_changed(user_to_unfollow.id, -1)
         return Response({'message': 'Unfollowed Successfully'})
 
 
-class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+class UserListView(CachedResponseMixin, generics.ListAPIView):
+    queryset = User.objects.order_by('id')
+    serializer_class = UserSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_cache_entities(self):
+        return ['users']
+
+
+class FollowersListView(generics.ListAPIView):
+    """Paginated list of the users following ``user_id``."""
+    serializer_class = UserSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        # An id subquery on the follow table, so users are read in primary key
+        # order instead of joined and sorted.
+        follower_ids = User.followers.through.objects.filter(from_user_id=self.kwargs['user_id'])
+        return User.objects.filter(pk__in=follower_ids.values('to_user_id')).order_by('id')
+
+
+class FollowingListView(generics.ListAPIView):
+    """Paginated list of the users ``user_id`` follows."""
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_queryset(self):
+        followee_ids = User.followers.through.objects.filter(to_user_id=self.kwargs['user_id'])
+        return User.objects.filter(pk__in=followee_ids.values('from_user_id')).order_by('id')
+
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     lookup_field = 'id'
     permission_classes = [permissions.AllowAny]
-    
-class UserPostsView(generics.ListAPIView):
+
+    def get_validators(self):
+        # Following the user moves their followers_count, hence updated_at.
+        return User.objects.filter(pk=self.kwargs['id']).values_list('updated_at').first()
+
+    def get_cache_entities(self):
+        return [f"user:{self.kwargs['id']}"]
+
+class UserPostsView(CachedResponseMixin, generics.ListAPIView):
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
     permission_classes = [permissions.AllowAny]  # Publicly accessible
 
+    def get_cache_entities(self):
+        # The author's profile is embedded in each post.
+        return [f"user:{self.kwargs['user_id']}", f"user-posts:{self.kwargs['user_id']}"]
+
     def get_queryset(self):
         user_id = self.kwargs['user_id']
         return Post.objects.filter(author__id=user_id)
@@ -232,12 +311,31 @@ class MyLikedPostsView(generics.ListAPIView):
     Returns posts liked by the current authenticated user.
     """
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         return Post.objects.filter(likes=user)
-    
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator.use_offset(request):
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginator.paginate_keyset(self.fetch, request)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+    def fetch(self, cursor, reverse, limit):
+        # Page through the user's likes on (user, created_at, post), then hydrate.
+        likes = PostLike.objects.filter(user=self.request.user)
+        page = list(keyset_filter(likes, cursor, reverse, id_field='post_id').values_list('post_id', flat=True)[:limit])
+        posts = Post.objects.in_bulk(page)
+        return [posts[post_id] for post_id in page if post_id in posts]
+
+
+
+RESET_EMAIL_SUBJECT = 'SkillSync Password Reset OTP'
 
 
 def generate_otp():
@@ -255,22 +353,23 @@ class RequestPasswordResetView(generics.GenericAPIView):
         try:
             user = User.objects.get(email=email)
             otp = generate_otp()
-            PasswordResetOTP.objects.create(user=user, otp=otp)
-
             html_message = render_to_string('accounts/otp_email_template.html', {
                 'username': user.username,
                 'email': user.email,
                 'otp': otp,
             })
 
-            email_message = EmailMessage(
-                subject='SkillSync Password Reset OTP',
-                body=html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[email],
-            )
-            email_message.content_subtype = 'html'
-            email_message.send()
+            # Delivered by the outbox worker; SMTP stays off the request path.
+            with transaction.atomic():
+                # A new OTP replaces the user's earlier ones, and any of their
+                # emails still waiting in the outbox (a retry would deliver a
+                # dead code after the live one).
+                PasswordResetOTP.objects.filter(user=user).delete()
+                OutboundEmail.objects.filter(
+                    to=email, subject=RESET_EMAIL_SUBJECT, status=OutboundEmail.PENDING,
+                ).delete()
+                PasswordResetOTP.objects.create(user=user, otp=otp)
+                queue_email(email, RESET_EMAIL_SUBJECT, html_message, html=True)
 
             return Response({'message': 'OTP sent to your email'}, status=status.HTTP_200_OK)
 
@@ -287,17 +386,11 @@ class VerifyOTPView(generics.GenericAPIView):
         email = serializer.validated_data['email']
         otp = serializer.validated_data['otp']
 
-        try:
-            user = User.objects.get(email=email)
-            otp_record = PasswordResetOTP.objects.filter(user=user, otp=otp).last()
-
-            if not otp_record or otp_record.is_expired():
-                return Response({'error': 'Invalid or expired OTP'}, status=status.HTTP_400_BAD_REQUEST)
-
+        if PasswordResetOTP.objects.valid(email, otp).exists():
             return Response({'message': 'OTP verified successfully'}, status=status.HTTP_200_OK)
-
-        except User.DoesNotExist:
+        if not User.objects.filter(email=email).exists():
             return Response({'error': 'Invalid email'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'error': 'Invalid or expired OTP'}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class ResetPasswordView(generics.GenericAPIView):
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upstream answers worth retrying, and failures that happen before the request
+# reaches the provider (so retrying cannot bill a chat twice).
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def get_openrouter_headers():
+    """Always build headers fresh with the latest API key from settings."""
+    key = getattr(settings, "OPENROUTER_API_KEY", None)
+    if not key:
+        return None
+    return {
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json",
+    }
+
+
+def get_openrouter_url(path: str):
+    """Safely combine base and a path (avoid double slashes)."""
+    base = getattr(settings, "OPENROUTER_BASE", "https://openrouter.ai/api/v1")
+    return f"{base.rstrip('/')}/{path.lstrip('/')}"
+
+
+def _timeout(stream):
+    read = "OPENROUTER_STREAM_READ_TIMEOUT" if stream else "OPENROUTER_READ_TIMEOUT"
+    return httpx.Timeout(
+        getattr(settings, read, 60),
+        connect=getattr(settings, "OPENROUTER_CONNECT_TIMEOUT", 5),
+    )
+
+
+def _limits():
+    size = getattr(settings, "OPENROUTER_POOL_SIZE", 20)
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size)
+
+
+def backoff_delay(attempt, response=None):
+    """
+    Seconds to wait before retry ``attempt`` (0-based): the provider's
+    ``Retry-After`` when it sends one, else full-jitter exponential backoff.
+    Both are capped at ``OPENROUTER_BACKOFF_MAX``.
+    """
+    cap = getattr(settings, "OPENROUTER_BACKOFF_MAX", 8)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    base = getattr(settings, "OPENROUTER_BACKOFF_BASE", 0.5)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class OpenRouterClient:
+    """
+    Shared, keep-alive connection pool to OpenRouter.
+
+    ``post`` (sync views) and ``apost`` (async views) send a chat completion
+    request, retrying ``OPENROUTER_MAX_RETRIES`` times with jittered backoff on
+    429/5xx answers and connection failures. The last response is returned
+    whatever its status; with ``stream=True`` the body is left unread and the
+    caller must close it.
+
+    One ``httpx.Client`` serves every thread of the process; async clients
+    are per event loop, since their connections belong to the loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=_limits())
+            return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(limits=_limits())
+        return client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _request(self, client, payload, stream):
+        return client.build_request(
+            "POST",
+            get_openrouter_url("/chat/completions"),
+            json=payload,
+            headers=get_openrouter_headers(),
+            timeout=_timeout(stream),
+        )
+
+    def post(self, payload, stream=False):
+        client = self.client()
+        retries = getattr(settings, "OPENROUTER_MAX_RETRIES", 2)
+        attempt = 0
+        while True:
+            try:
+                response = client.send(self._request(client, payload, stream), stream=stream)
+            except RETRY_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.info("OpenRouter connection failed (%s), retrying in %.2fs", e, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                delay = backoff_delay(attempt, response)
+                response.close()
+                logger.info("OpenRouter returned %s, retrying in %.2fs", response.status_code, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def apost(self, payload, stream=False):
+        client = self.async_client()
+        retries = getattr(settings, "OPENROUTER_MAX_RETRIES", 2)
+        attempt = 0
+        while True:
+            try:
+                response = await client.send(self._request(client, payload, stream), stream=stream)
+            except RETRY_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.info("OpenRouter connection failed (%s), retrying in %.2fs", e, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                delay = backoff_delay(attempt, response)
+                await response.aclose()
+                logger.info("OpenRouter returned %s, retrying in %.2fs", response.status_code, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+openrouter = OpenRouterClient()
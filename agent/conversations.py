@@ -0,0 +1,133 @@
+import math
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_LINE_CHARS = 200
+
+
+def estimate_tokens(text):
+    """
+    Approximate BPE token count without a tokenizer: the larger of one token
+    per 4 characters and 4 tokens per 3 words (punctuation counts as a word).
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(_WORDS.findall(text)) * 4 / 3))
+
+
+def _summary_line(message):
+    speaker = "User" if message.role == "user" else "Freezy"
+    text = " ".join(message.content.split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return f"{speaker}: {text}"
+
+
+def _fold(conversation, messages):
+    """
+    Append ``messages`` (oldest first) to the summary as one clipped line each,
+    dropping the oldest lines past ``FREEZY_SUMMARY_TOKEN_BUDGET``, and mark
+    them summarized so they are never sent verbatim again.
+    """
+    lines = conversation.summary.splitlines() + [_summary_line(m) for m in messages]
+    sizes = [estimate_tokens(line) for line in lines]
+    budget = getattr(settings, "FREEZY_SUMMARY_TOKEN_BUDGET", 400)
+    total = sum(sizes)
+    while len(lines) > 1 and total > budget:
+        total -= sizes.pop(0)
+        lines.pop(0)
+    conversation.summary = "\n".join(lines)
+    with transaction.atomic():
+        Message.objects.filter(id__in=[m.id for m in messages]).update(summarized=True)
+        Conversation.objects.filter(pk=conversation.pk).update(summary=conversation.summary)
+
+
+def _valid_history(history):
+    """Items of a client-sent ``history`` list Freezy accepts (the last 20)."""
+    if not isinstance(history, list):
+        return []
+    return [
+        item for item in history[-20:]
+        if isinstance(item, dict) and item.get("role") in ("user", "assistant") and item.get("content")
+    ]
+
+
+def get_conversation(conversation_id, user):
+    """The conversation, or None if unknown or owned by someone other than ``user``."""
+    try:
+        conversation = Conversation.objects.get(pk=conversation_id)
+    except (Conversation.DoesNotExist, ValidationError):
+        return None
+    if conversation.user_id is not None and conversation.user_id != user.pk:
+        return None
+    return conversation
+
+
+def start_conversation(user, history=None):
+    """A new conversation, seeded from the ``history`` older clients still send."""
+    conversation = Conversation.objects.create(user=user if user.is_authenticated else None)
+    Message.objects.bulk_create([
+        Message(
+            conversation=conversation, role=item["role"], content=item["content"],
+            tokens=estimate_tokens(item["content"]),
+        )
+        for item in _valid_history(history)
+    ])
+    return conversation
+
+
+def add_message(conversation, role, content):
+    Message.objects.create(
+        conversation=conversation, role=role, content=content, tokens=estimate_tokens(content)
+    )
+    Conversation.objects.filter(pk=conversation.pk).update(updated_at=timezone.now())
+
+
+def build_history(conversation):
+    """
+    The chat history to send upstream: the summary, then the newest messages
+    not yet summarized that fit ``FREEZY_HISTORY_TOKEN_BUDGET`` (always at
+    least the latest one). Older messages are folded into the summary.
+    """
+    recent = list(conversation.messages.filter(summarized=False).order_by("-id"))
+    budget = getattr(settings, "FREEZY_HISTORY_TOKEN_BUDGET", 2000)
+    kept, used = [], 0
+    for message in recent:
+        if kept and used + message.tokens > budget:
+            break
+        kept.append(message)
+        used += message.tokens
+    folded = recent[len(kept):]
+    if folded:
+        _fold(conversation, folded[::-1])
+
+    history = []
+    if conversation.summary:
+        history.append({"role": "system", "content": SUMMARY_PREFIX + conversation.summary})
+    history.extend({"role": m.role, "content": m.content} for m in reversed(kept))
+    return history
+
+
+def open_turn(user, message, conversation_id=None, history=None):
+    """
+    Store the user's ``message`` in its conversation (a new one when no id is
+    given) and return ``(conversation, history)``; ``(None, None)`` when the
+    id does not name a conversation of this user.
+    """
+    if conversation_id:
+        conversation = get_conversation(conversation_id, user)
+        if conversation is None:
+            return None, None
+    else:
+        conversation = start_conversation(user, history)
+    add_message(conversation, "user", message)
+    return conversation, build_history(conversation)
@@ -1,3 +1,38 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Conversation(models.Model):
+    """
+    A Freezy chat kept on the server. Clients send only the new message and
+    the conversation id; turns that no longer fit the history token budget
+    are folded into ``summary`` (see agent.conversations).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="conversations",
+    )
+    summary = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Message(models.Model):
+    ROLE_CHOICES = [("user", "User"), ("assistant", "Assistant")]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    content = models.TextField()
+    # Estimated prompt tokens (agent.conversations.estimate_tokens).
+    tokens = models.PositiveIntegerField()
+    # Set once the message is folded into the conversation summary.
+    summarized = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "summarized", "-id"], name="message_history_idx"),
+        ]
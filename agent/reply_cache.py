@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+
+def reply_key(payload):
+    """
+    Cache key of a chat completion request: model, sampling settings, system
+    prompt and the newest ``FREEZY_CACHE_CONTEXT_MESSAGES`` history messages
+    plus the new one, with whitespace and case normalized.
+    """
+    messages = payload["messages"]
+    context = getattr(settings, "FREEZY_CACHE_CONTEXT_MESSAGES", 4)
+    recent = messages[:1] + messages[1:][-(context + 1):]
+    normalized = [(m["role"], " ".join(m["content"].split()).casefold()) for m in recent]
+    blob = json.dumps([payload["model"], payload.get("temperature"), payload.get("max_tokens"), normalized])
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ReplyCache:
+    """
+    Per-process LRU cache of Freezy replies with in-flight coalescing.
+
+    Replies expire after ``FREEZY_CACHE_TTL`` seconds and the least recently
+    used are evicted beyond ``FREEZY_CACHE_MAX_ENTRIES``. On a miss the first
+    request for a key becomes its leader (``begin`` returns None) and must
+    call ``finish`` with its reply, or None if it failed. Identical requests
+    arriving meanwhile get the leader's future from ``begin`` and wait on it
+    (``wait`` from threads, ``await_reply`` from async views) instead of going
+    upstream; a None result sends them upstream themselves. Threads wait at
+    most ``FREEZY_COALESCE_SYNC_WAIT`` seconds, since each one holds a WSGI
+    worker while it waits.
+
+    Views report each request's outcome to ``record``; ``stats`` gives the
+    counts and hit rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._outcomes = Counter()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, reply):
+        with self._lock:
+            self._entries[key] = (reply, time.monotonic() + getattr(settings, "FREEZY_CACHE_TTL", 3600))
+            self._entries.move_to_end(key)
+            while len(self._entries) > getattr(settings, "FREEZY_CACHE_MAX_ENTRIES", 1000):
+                self._entries.popitem(last=False)
+
+    def begin(self, key):
+        """
+        None if the caller leads ``key``, else the in-flight leader's future.
+        A leader that has not finished within ``FREEZY_COALESCE_TIMEOUT`` is
+        presumed lost and the caller takes over.
+        """
+        now = time.monotonic()
+        with self._lock:
+            future, started = self._inflight.get(key, (None, now))
+            if future is None or now - started > getattr(settings, "FREEZY_COALESCE_TIMEOUT", 60):
+                self._inflight[key] = (Future(), now)
+                return None
+            return future
+
+    def finish(self, key, reply):
+        """Publish the leader's reply (None on failure); later calls are ignored."""
+        with self._lock:
+            future, _ = self._inflight.pop(key, (None, None))
+        if future is None:
+            return
+        if reply:
+            self.set(key, reply)
+        future.set_result(reply or None)
+
+    def wait(self, future):
+        try:
+            return future.result(timeout=getattr(settings, "FREEZY_COALESCE_SYNC_WAIT", 5))
+        except FutureTimeout:
+            return None
+
+    async def await_reply(self, future, timeout=None):
+        if timeout is None:
+            timeout = getattr(settings, "FREEZY_COALESCE_TIMEOUT", 60)
+        # shield: a timed-out follower must not cancel the future others wait on.
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def record(self, outcome):
+        """Count a request as ``"hit"``, ``"coalesced"`` or ``"miss"``."""
+        with self._lock:
+            self._outcomes[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            hits, coalesced, misses = (self._outcomes[k] for k in ("hit", "coalesced", "miss"))
+            size = len(self._entries)
+        total = hits + coalesced + misses
+        return {
+            "hits": hits,
+            "coalesced": coalesced,
+            "misses": misses,
+            "hit_rate": round((hits + coalesced) / total, 4) if total else 0.0,
+            "entries": size,
+            "in_flight": len(self._inflight),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+            self._outcomes.clear()
+
+
+reply_cache = ReplyCache()
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_CHARS = 64
+
+
+def _delta_text(data):
+    """The content delta of one streamed completion chunk ('' if it has none)."""
+    try:
+        choices = json.loads(data).get("choices") or []
+        return choices[0].get("delta", {}).get("content") or ""
+    except (ValueError, AttributeError, IndexError):
+        return ""
+
+
+def _data_field(line):
+    """The ``data:`` value of an upstream SSE line, or None for other lines."""
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    return line[len("data:"):].strip()
+
+
+class StreamSlots:
+    """Per-process cap (``FREEZY_MAX_STREAMS``) on concurrently open chat streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= getattr(settings, "FREEZY_MAX_STREAMS", 200):
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+stream_slots = StreamSlots()
+
+
+class SSERelay:
+    """
+    Relays an upstream (httpx, streamed) SSE response to the client.
+
+    Each upstream ``data:`` line is forwarded as its own event as soon as it
+    arrives; upstream comments and other fields are dropped. While upstream is
+    silent for ``FREEZY_HEARTBEAT_INTERVAL`` seconds a ``: heartbeat`` comment
+    is sent so proxies keep the connection open.
+
+    When the stream completes, ``on_complete`` (a sync callable, run in a
+    thread) receives the assembled reply text. On client disconnect Django
+    cancels the response task, which lands in the relay and closes the
+    upstream request. ``close`` is called by Django when the response is
+    finished and runs ``on_close`` (releasing the stream's slots) exactly once.
+
+    Iterating the relay needs an ASGI server and an ``httpx.AsyncClient``
+    upstream; under WSGI, relay a sync upstream with ``sync_events`` instead.
+    """
+
+    def __init__(self, upstream, on_complete=None, on_close=None):
+        self.upstream = upstream
+        self.on_complete = on_complete
+        self.on_close = on_close
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        lines = self.upstream.aiter_lines()
+        interval = getattr(settings, "FREEZY_HEARTBEAT_INTERVAL", 15)
+        pending = None
+        reply = []
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(anext(lines))
+                done, _ = await asyncio.wait({pending}, timeout=interval)
+                if not done:
+                    yield ": heartbeat\n\n"
+                    continue
+                next_line, pending = pending, None
+                try:
+                    data = _data_field(next_line.result())
+                except StopAsyncIteration:
+                    break
+                if data is None:
+                    continue
+                yield f"data: {data}\n\n"
+                if data == "[DONE]":
+                    break
+                reply.append(_delta_text(data))
+            if self.on_complete and any(reply):
+                await sync_to_async(self.on_complete)("".join(reply))
+        except httpx.HTTPError as e:
+            logger.exception("Error while streaming from OpenRouter")
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            if pending is not None:
+                pending.cancel()
+            await self.upstream.aclose()
+            self.close()
+
+    def sync_events(self):
+        """
+        The same events from a sync (``httpx.Client``) upstream, for WSGI
+        servers. A reader thread feeds the upstream lines through a queue so
+        heartbeats still go out while upstream is silent. Django closes the
+        generator when the response ends or the client goes away, which
+        closes the upstream request and ends the reader.
+        """
+        lines = queue.SimpleQueue()
+        threading.Thread(target=self._read_lines, args=(lines,), daemon=True).start()
+        interval = getattr(settings, "FREEZY_HEARTBEAT_INTERVAL", 15)
+        reply = []
+        try:
+            while True:
+                try:
+                    line = lines.get(timeout=interval)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if line is None:
+                    break
+                if isinstance(line, Exception):
+                    raise line
+                data = _data_field(line)
+                if data is None:
+                    continue
+                yield f"data: {data}\n\n"
+                if data == "[DONE]":
+                    break
+                reply.append(_delta_text(data))
+            if self.on_complete and any(reply):
+                self.on_complete("".join(reply))
+        except httpx.HTTPError as e:
+            logger.exception("Error while streaming from OpenRouter")
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            self.upstream.close()
+            self.close()
+
+    def _read_lines(self, lines):
+        try:
+            for line in self.upstream.iter_lines():
+                lines.put(line)
+        except Exception as e:
+            lines.put(e)
+        else:
+            lines.put(None)
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if self.on_close:
+            self.on_close()
+
+
+def replay_events(text):
+    """A stored reply as the same SSE chunks an upstream stream would send."""
+    for start in range(0, len(text), REPLAY_CHUNK_CHARS):
+        chunk = {"choices": [{"delta": {"content": text[start:start + REPLAY_CHUNK_CHARS]}}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def replay(text):
+    """``replay_events`` for ASGI responses."""
+    for event in replay_events(text):
+        yield event
@@ -1,3 +1,512 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core import signals
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections
+from django.test import RequestFactory, override_settings
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from backend.governor import governor
+
+from .client import openrouter
+from .conversations import build_history, estimate_tokens, start_conversation, add_message
+from .models import Conversation, Message
+from .reply_cache import ReplyCache, reply_cache
+from .streaming import SSERelay, stream_slots
+
+
+def completion(text):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+def chunk(text):
+    return {"choices": [{"delta": {"content": text}}]}
+
+
+class StubOpenRouter:
+    """
+    Local stand-in for the OpenRouter chat completions endpoint.
+
+    Replies are taken from ``replies`` in order (the default reply once it is
+    empty): ``(status, body)`` answers with a JSON body, ``(status, [events],
+    delay)`` streams each event as an SSE ``data:`` line (``":..."`` strings
+    as comments), ``delay`` seconds apart. ``requests`` records ``(client port, payload)`` per call.
+    """
+
+    def __init__(self):
+        self.replies = []
+        self.default = (200, completion("hi"))
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub.requests.append((self.client_address[1], json.loads(self.rfile.read(length))))
+                reply = stub.replies.pop(0) if stub.replies else stub.default
+                if isinstance(reply[1], list):
+                    self.stream(*reply)
+                else:
+                    self.answer(*reply)
+
+            def answer(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, status, events, delay=0):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for event in events + ["[DONE]"]:
+                        if isinstance(event, str) and event.startswith(":"):
+                            line = f"{event}\n\n".encode()
+                        else:
+                            data = event if isinstance(event, str) else json.dumps(event)
+                            line = f"data: {data}\n\n".encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                        time.sleep(delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        openrouter.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubOpenRouterTestCase(APITestCase):
+    def setUp(self):
+        reply_cache.clear()
+        governor.reset()
+        self.stub = self.enterContext(StubOpenRouter())
+        self.enterContext(override_settings(
+            OPENROUTER_API_KEY="test-key",
+            OPENROUTER_BASE=self.stub.url,
+            OPENROUTER_BACKOFF_BASE=0,
+            OPENROUTER_MAX_RETRIES=2,
+        ))
+
+
+class OpenRouterClientTests(StubOpenRouterTestCase):
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            openrouter.post({"messages": []}).read()
+        ports = {port for port, _ in self.stub.requests}
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(len(ports), 1)
+
+    def test_retries_transient_errors(self):
+        self.stub.replies = [(503, {}), (429, {}, {"Retry-After": "0"})]
+        response = openrouter.post({"messages": []})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub.replies = [(502, {})] * 3
+        self.assertEqual(openrouter.post({"messages": []}).status_code, 502)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.stub.replies = [(400, {})]
+        self.assertEqual(openrouter.post({"messages": []}).status_code, 400)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_async_stream(self):
+        self.stub.replies = [(503, {}), (200, [chunk("a"), chunk("b")])]
+
+        async def collect():
+            response = await openrouter.apost({"messages": []}, stream=True)
+            try:
+                return [line async for line in response.aiter_lines() if line]
+            finally:
+                await response.aclose()
+
+        lines = asyncio.run(collect())
+        self.assertEqual(lines[-1], "data: [DONE]")
+        self.assertEqual(json.loads(lines[0][len("data: "):]), chunk("a"))
+        self.assertEqual(len(self.stub.requests), 2)
+
+
+class FreezyChatViewTests(StubOpenRouterTestCase):
+    def test_reply(self):
+        self.stub.replies = [(500, {}), (200, completion("Hello from Freezy"))]
+        response = self.client.post("/api/ai/freezy/", {"message": "hi"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["reply"], "Hello from Freezy")
+        self.assertEqual(self.stub.requests[-1][1]["messages"][-1], {"role": "user", "content": "hi"})
+
+    def test_conversation_is_kept_on_the_server(self):
+        self.stub.replies = [(200, completion("First answer"))]
+        first = self.client.post("/api/ai/freezy/", {"message": "first"}, format="json")
+        conversation_id = first.data["conversation_id"]
+
+        self.stub.replies = [(200, completion("Second answer"))]
+        self.client.post("/api/ai/freezy/", {"message": "second", "conversation_id": conversation_id}, format="json")
+        self.assertEqual(self.stub.requests[-1][1]["messages"][1:], [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "First answer"},
+            {"role": "user", "content": "second"},
+        ])
+        self.assertEqual(Message.objects.filter(conversation_id=conversation_id).count(), 4)
+
+    def test_legacy_history_seeds_a_new_conversation(self):
+        history = [{"role": "user", "content": "earlier"}, {"role": "system", "content": "ignored"}]
+        self.client.post("/api/ai/freezy/", {"message": "hi", "history": history}, format="json")
+        self.assertEqual(self.stub.requests[-1][1]["messages"][1:], [
+            {"role": "user", "content": "earlier"},
+            {"role": "user", "content": "hi"},
+        ])
+
+    def test_foreign_or_unknown_conversation(self):
+        owner = User.objects.create_user(username="owner", email="owner@example.com", password="pw")
+        conversation = Conversation.objects.create(user=owner)
+        for conversation_id in (str(conversation.id), "not-a-uuid"):
+            response = self.client.post(
+                "/api/ai/freezy/", {"message": "hi", "conversation_id": conversation_id}, format="json"
+            )
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_upstream_failure(self):
+        self.stub.replies = [(503, {})] * 3
+        with self.assertLogs("agent.views", "ERROR"):
+            response = self.client.post("/api/ai/freezy/", {"message": "hi"}, format="json")
+        self.assertEqual(response.status_code, 502)
+
+
+
+class FreezyChatStreamViewTests(StubOpenRouterTestCase):
+    async def stream(self):
+        response = await self.async_client.post(
+            "/api/ai/freezy/stream/", {"message": "hi"}, content_type="application/json"
+        )
+        if not response.streaming:
+            return response, None
+        return response, b"".join([part async for part in response.streaming_content]).decode()
+
+    async def test_relays_events(self):
+        self.stub.replies = [(200, [chunk("Hel"), ": OPENROUTER PROCESSING", chunk("lo")])]
+        response, body = await self.stream()
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(body, "".join(
+            f"data: {data}\n\n" for data in (json.dumps(chunk("Hel")), json.dumps(chunk("lo")), "[DONE]")
+        ))
+        self.assertEqual(stream_slots.active, 0)
+        reply = await Message.objects.filter(
+            conversation_id=response["X-Conversation-Id"], role="assistant"
+        ).aget()
+        self.assertEqual(reply.content, "Hello")
+
+    @override_settings(FREEZY_HEARTBEAT_INTERVAL=0.05)
+    async def test_heartbeats_while_upstream_is_silent(self):
+        self.stub.replies = [(200, [chunk("a")], 0.3)]
+        _, body = await self.stream()
+        self.assertIn(": heartbeat\n\n", body)
+        self.assertTrue(body.endswith("data: [DONE]\n\n"))
+
+    @override_settings(FREEZY_MAX_STREAMS=0)
+    async def test_concurrency_cap(self):
+        response, _ = await self.stream()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.stub.requests, [])
+
+    async def test_upstream_error(self):
+        self.stub.replies = [(400, {"error": "bad"})]
+        with self.assertLogs("agent.views", "ERROR"):
+            response, _ = await self.stream()
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(stream_slots.active, 0)
+
+    def wsgi_stream(self):
+        """Serve the stream through Django's WSGI handler, as gunicorn does."""
+        # Like the test client, keep the test transaction's connection open.
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+        self.addCleanup(signals.request_started.connect, close_old_connections)
+        self.addCleanup(signals.request_finished.connect, close_old_connections)
+        environ = RequestFactory().post(
+            "/api/ai/freezy/stream/", {"message": "hi"}, content_type="application/json"
+        ).environ
+        handler, started = WSGIHandler(), []
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            result = handler(environ, lambda status, headers: started.append((status, dict(headers))))
+            try:
+                body = b"".join(result).decode()
+            finally:
+                result.close()
+        return started[0], body
+
+    def test_streams_under_wsgi(self):
+        self.stub.replies = [(200, [chunk("Hel"), chunk("lo")])]
+        (status_line, headers), body = self.wsgi_stream()
+        self.assertEqual(status_line, "200 OK")
+        self.assertEqual(body, "".join(
+            f"data: {data}\n\n" for data in (json.dumps(chunk("Hel")), json.dumps(chunk("lo")), "[DONE]")
+        ))
+        self.assertEqual(stream_slots.active, 0)
+        self.assertEqual(Message.objects.get(
+            conversation_id=headers["X-Conversation-Id"], role="assistant"
+        ).content, "Hello")
+
+        # The stored reply is replayed the same way.
+        (_, headers), body = self.wsgi_stream()
+        self.assertEqual(headers["X-Freezy-Cache"], "hit")
+        self.assertTrue(body.endswith("data: [DONE]\n\n"))
+
+    @override_settings(FREEZY_HEARTBEAT_INTERVAL=0.05)
+    def test_heartbeats_under_wsgi(self):
+        self.stub.replies = [(200, [chunk("a")], 0.3)]
+        _, body = self.wsgi_stream()
+        self.assertIn(": heartbeat\n\n", body)
+        self.assertTrue(body.endswith("data: [DONE]\n\n"))
+
+    async def test_disconnect_cancels_upstream(self):
+        self.stub.replies = [(200, [chunk(str(i)) for i in range(50)], 0.05)]
+        self.assertTrue(stream_slots.acquire())
+        upstream = await openrouter.apost({"messages": []}, stream=True)
+        relay = SSERelay(upstream, on_close=stream_slots.release)
+        received = []
+
+        async def consume():
+            async for event in relay:
+                received.append(event)
+
+        task = asyncio.create_task(consume())
+        while len(received) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        relay.close()
+        self.assertTrue(upstream.is_closed)
+        self.assertLess(len(received), 50)
+        self.assertEqual(stream_slots.active, 0)
+
+
+class ReplyCacheTests(StubOpenRouterTestCase):
+    def ask(self, message, url="/api/ai/freezy/"):
+        return self.client.post(url, {"message": message}, format="json")
+
+    def test_identical_questions_are_answered_from_the_cache(self):
+        self.stub.replies = [(200, completion("Open their profile and tap Follow."))]
+        first = self.ask("How do I follow someone?")
+        second = self.ask("  how do I FOLLOW someone? ")
+        self.assertEqual((first["X-Freezy-Cache"], second["X-Freezy-Cache"]), ("miss", "hit"))
+        self.assertEqual(second.data["reply"], "Open their profile and tap Follow.")
+        self.assertEqual(len(self.stub.requests), 1)
+        # The cached reply is still part of the second conversation.
+        self.assertEqual(Message.objects.filter(
+            conversation_id=second.data["conversation_id"], role="assistant"
+        ).count(), 1)
+
+    def test_different_context_misses(self):
+        self.ask("hi")
+        first = self.client.post("/api/ai/freezy/", {"message": "hi", "history": [
+            {"role": "user", "content": "I'm a designer"},
+        ]}, format="json")
+        self.assertEqual(first["X-Freezy-Cache"], "miss")
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_failures_are_not_cached(self):
+        self.stub.replies = [(400, {})]
+        with self.assertLogs("agent.views", "ERROR"):
+            self.ask("hi")
+        self.assertEqual(self.ask("hi")["X-Freezy-Cache"], "miss")
+        self.assertEqual(reply_cache.stats()["in_flight"], 0)
+
+    async def test_cached_reply_is_replayed_as_a_stream(self):
+        await self.async_client.post("/api/ai/freezy/", {"message": "hi"}, content_type="application/json")
+        response = await self.async_client.post(
+            "/api/ai/freezy/stream/", {"message": "hi"}, content_type="application/json"
+        )
+        body = b"".join([part async for part in response.streaming_content]).decode()
+        self.assertEqual(response["X-Freezy-Cache"], "hit")
+        self.assertEqual(body, f"data: {json.dumps(chunk('hi'))}\n\ndata: [DONE]\n\n")
+        self.assertEqual(stream_slots.active, 0)
+
+    async def test_concurrent_streams_are_coalesced(self):
+        self.stub.replies = [(200, [chunk("Hel"), chunk("lo")], 0.1)]
+
+        async def ask():
+            response = await self.async_client.post(
+                "/api/ai/freezy/stream/", {"message": "hi"}, content_type="application/json"
+            )
+            body = b"".join([part async for part in response.streaming_content]).decode()
+            return response["X-Freezy-Cache"], body
+
+        (leader, leader_body), (follower, follower_body) = await asyncio.gather(ask(), ask())
+        self.assertEqual((leader, follower), ("miss", "coalesced"))
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertIn(json.dumps(chunk("Hello")), follower_body)
+        self.assertEqual(reply_cache.stats()["hit_rate"], 0.5)
+
+    def test_stats_are_admin_only(self):
+        self.assertIn(self.client.get("/api/ai/freezy/cache-stats/").status_code, (401, 403))
+        admin = User.objects.create_user(username="admin", email="admin@example.com", password="pw", is_staff=True)
+        self.client.force_authenticate(admin)
+        self.ask("hi")
+        self.ask("hi")
+        stats = self.client.get("/api/ai/freezy/cache-stats/").data
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_waiting_on_a_failed_leader(self):
+        cache = ReplyCache()
+        self.assertIsNone(cache.begin("k"))
+        waiting = cache.begin("k")
+        cache.finish("k", None)
+        self.assertIsNone(cache.wait(waiting))
+        self.assertIsNone(cache.begin("k"))
+
+    @override_settings(FREEZY_COALESCE_SYNC_WAIT=0.05, FREEZY_COALESCE_TIMEOUT=60)
+    def test_threads_wait_briefly_for_a_slow_leader(self):
+        cache = ReplyCache()
+        self.assertIsNone(cache.begin("k"))
+        started = time.monotonic()
+        self.assertIsNone(cache.wait(cache.begin("k")))
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(FREEZY_CACHE_MAX_ENTRIES=2)
+    def test_lru_eviction(self):
+        cache = ReplyCache()
+        for key in "abc":
+            cache.set(key, key)
+        self.assertEqual([cache.get(key) for key in "abc"], [None, "b", "c"])
+
+
+FREEZY_LIMITS = {"freezy": {"rate": "2/min", "burst": 2, "concurrency": 4}}
+
+
+class GovernorTests(StubOpenRouterTestCase):
+    def ask(self, message="hi"):
+        return self.client.post("/api/ai/freezy/", {"message": message}, format="json")
+
+    async def ask_stream(self, message="hi", consume=True):
+        response = await self.async_client.post(
+            "/api/ai/freezy/stream/", {"message": message}, content_type="application/json"
+        )
+        if consume and response.streaming:
+            [part async for part in response.streaming_content]
+        return response
+
+    @override_settings(GOVERNOR_LIMITS=FREEZY_LIMITS)
+    def test_rate_limit(self):
+        self.assertEqual(self.ask("a").status_code, 200)
+        self.assertEqual(self.ask("b").status_code, 200)
+        response = self.ask("c")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertFalse(Message.objects.filter(content="c").exists())
+
+    @override_settings(GOVERNOR_LIMITS=FREEZY_LIMITS)
+    async def test_stream_shares_the_rate_limit(self):
+        self.assertEqual((await self.ask_stream("a")).status_code, 200)
+        self.assertEqual((await self.ask_stream("b")).status_code, 200)
+        response = await self.ask_stream("c")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(GOVERNOR_LIMITS={"freezy": {"concurrency": 0}})
+    def test_upstream_concurrency_cap(self):
+        response = self.ask()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.stub.requests, [])
+        self.assertEqual(reply_cache.stats()["in_flight"], 0)
+
+    @override_settings(GOVERNOR_LIMITS={"freezy": {"concurrency": 1}})
+    async def test_stream_holds_an_upstream_slot_until_it_ends(self):
+        self.stub.replies = [(200, [chunk("a")], 0.2)]
+        first = await self.ask_stream("a", consume=False)
+        self.assertEqual((await self.ask_stream("b")).status_code, 429)
+        [part async for part in first.streaming_content]
+        self.assertEqual((await self.ask_stream("b")).status_code, 200)
+
+    @override_settings(GOVERNOR_LIMITS={"freezy": {"concurrency": 0}})
+    def test_cache_hits_do_not_need_a_slot(self):
+        with override_settings(GOVERNOR_LIMITS={}):
+            self.ask()
+        self.assertEqual(self.ask()["X-Freezy-Cache"], "hit")
+
+    @override_settings(GOVERNOR_LIMITS={"t": {"rate": "20/s", "burst": 1}})
+    def test_bucket_refills(self):
+        self.assertEqual(governor.check_rate("t", "ip:1"), 0)
+        wait = governor.check_rate("t", "ip:1")
+        self.assertGreater(wait, 0)
+        self.assertEqual(governor.check_rate("t", "ip:2"), 0)
+        time.sleep(wait + 0.01)
+        self.assertEqual(governor.check_rate("t", "ip:1"), 0)
+
+    @override_settings(GOVERNOR_BACKEND="cache", GOVERNOR_LIMITS={"t": {"rate": "2/min"}})
+    def test_shared_cache_backend(self):
+        cache.clear()
+        self.assertEqual([governor.check_rate("t", "ip:9") > 0 for _ in range(3)], [False, False, True])
+
+
+class ConversationHistoryTests(APITestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("hello world"), 3)
+        self.assertGreater(estimate_tokens("def f(x): return x[0] + 1"), 10)
+
+    @override_settings(FREEZY_HISTORY_TOKEN_BUDGET=30, FREEZY_SUMMARY_TOKEN_BUDGET=1000)
+    def test_old_turns_are_folded_into_the_summary(self):
+        conversation = start_conversation(AnonymousUser())
+        for i in range(6):
+            add_message(conversation, "user" if i % 2 == 0 else "assistant", f"message {i} " + "word " * 10)
+
+        history = build_history(conversation)
+        self.assertEqual(history[0]["role"], "system")
+        self.assertIn("User: message 0", history[0]["content"])
+        self.assertEqual(history[-1]["content"], "message 5 " + "word " * 10)
+        self.assertLessEqual(sum(estimate_tokens(m["content"]) for m in history[1:]), 30)
+
+        # Folded turns stay folded: the next history adds nothing new to the summary.
+        conversation.refresh_from_db()
+        summary = conversation.summary
+        self.assertEqual(build_history(conversation)[0]["content"].count("message 0"), 1)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.summary, summary)
+
+    @override_settings(FREEZY_HISTORY_TOKEN_BUDGET=1, FREEZY_SUMMARY_TOKEN_BUDGET=10)
+    def test_summary_keeps_the_newest_lines_within_budget(self):
+        conversation = start_conversation(AnonymousUser())
+        for i in range(5):
+            add_message(conversation, "user", f"question number {i}")
+        history = build_history(conversation)
+        self.assertNotIn("question number 0", history[0]["content"])
+        self.assertIn("question number 3", history[0]["content"])
+        self.assertEqual(history[-1]["content"], "question number 4")
@@ -1,8 +1,9 @@
 # backend/agent/urls.py
 from django.urls import path
-from .views import FreezyChatView, FreezyChatStreamView
+from .views import FreezyCacheStatsView, FreezyChatView, FreezyChatStreamView
 
 urlpatterns = [
     path("freezy/", FreezyChatView.as_view(), name="freezy-chat"),
     path("freezy/stream/", FreezyChatStreamView.as_view(), name="freezy-chat-stream"),
+    path("freezy/cache-stats/", FreezyCacheStatsView.as_view(), name="freezy-cache-stats"),
 ]
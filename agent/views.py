@@ -1,12 +1,28 @@
 import logging
-import requests
 import json
+import math
+from contextlib import ExitStack
+
+import httpx
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import Throttled
+
+from backend.governor import Overloaded, governor, request_ident
+
+from .client import openrouter
+from .conversations import add_message, open_turn
+from .reply_cache import reply_cache, reply_key
+from .streaming import SSERelay, replay, replay_events, stream_slots
 
 logger = logging.getLogger(__name__)
 
@@ -38,20 +54,6 @@ def _mask_key_for_log(key: str) -> str:
         return key[0:2] + "*" * max(0, len(key)-4) + key[-2:]
     return key[:4] + ("*" * (len(key) - 8)) + key[-4:]
 
-def get_openrouter_headers():
-    """Always build headers fresh with the latest API key from settings."""
-    key = getattr(settings, "OPENROUTER_API_KEY", None)
-    if not key:
-        return None
-    return {
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json",
-    }
-
-def get_openrouter_url(path: str):
-    """Safely combine base and a path (avoid double slashes)."""
-    return f"{OPENROUTER_BASE.rstrip('/')}/{path.lstrip('/')}"
-
 def _extract_reply_text(resp_json):
     """Robust extraction of reply text from provider response shapes."""
     if not resp_json:
@@ -82,12 +84,29 @@ def _extract_reply_text(resp_json):
     except Exception:
         return ""
 
+def _throttled(exc):
+    """The 429 DRF would send for ``exc``, for the plain async stream view."""
+    response = JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+    response["Retry-After"] = str(math.ceil(exc.wait))
+    return response
+
+def _build_messages(history):
+    """System prompt followed by the conversation history (ending with the new message)."""
+    return [{"role": "system", "content": FREEZY_SYSTEM_PROMPT}] + history
+
 class FreezyChatView(APIView):
     """
     Non-streaming chat endpoint.
-    POST body: { "message": "...", "history": [{role, content}, ...] }
+    POST body: { "message": "...", "conversation_id": "<uuid>" }
+
+    Without ``conversation_id`` a new conversation is started (seeded from
+    ``history`` if an older client still sends it); its id is returned.
+    Replies come from ``agent.reply_cache`` when an identical request was
+    answered recently or is in flight; ``X-Freezy-Cache`` says which.
+    Rate and upstream concurrency are limited by the ``freezy`` governor scope.
     """
     permission_classes = [AllowAny]
+    throttle_scope = "freezy"
 
     def post(self, request):
         # diagnostics: confirm key presence (masked)
@@ -103,44 +122,62 @@ class FreezyChatView(APIView):
 
         data = request.data or {}
         user_message = data.get("message", "")
-        history = data.get("history", []) or []
 
         if not user_message:
             return Response({"error": "message required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Build messages
-        messages = [{"role": "system", "content": FREEZY_SYSTEM_PROMPT}]
-        if isinstance(history, list):
-            recent = history[-20:]
-            for item in recent:
-                if isinstance(item, dict) and item.get("role") in ("user", "assistant"):
-                    content = item.get("content", "")
-                    if content:
-                        messages.append({"role": item["role"], "content": content})
-        messages.append({"role": "user", "content": user_message})
+        conversation, history = open_turn(
+            request.user, user_message, data.get("conversation_id"), data.get("history")
+        )
+        if conversation is None:
+            return Response({"error": "conversation not found"}, status=status.HTTP_404_NOT_FOUND)
 
         payload = {
             "model": OPENROUTER_MODEL,
-            "messages": messages,
+            "messages": _build_messages(history),
             "temperature": 0.7,
             "max_tokens": 1200,
             "stream": False,
         }
 
-        url = get_openrouter_url("/chat/completions")
-        headers = get_openrouter_headers()
-
+        cache_key = reply_key(payload)
+        reply, raw, outcome, leading = reply_cache.get(cache_key), None, "hit", False
+        if reply is None:
+            waiting = reply_cache.begin(cache_key)
+            leading = waiting is None
+            if not leading:
+                reply, outcome = reply_cache.wait(waiting), "coalesced"
+        if reply is None:
+            outcome = "miss"
+            try:
+                with governor.concurrency(self.throttle_scope):
+                    reply, raw, error = self.ask_upstream(payload)
+            finally:
+                if leading:
+                    reply_cache.finish(cache_key, reply)
+            if error is not None:
+                return error
+
+        reply_cache.record(outcome)
+        if reply:
+            add_message(conversation, "assistant", reply)
+        response = Response({"reply": reply, "raw": raw, "conversation_id": str(conversation.id)})
+        response["X-Freezy-Cache"] = outcome
+        return response
+
+    def ask_upstream(self, payload):
+        """Returns ``(reply_text, raw_json, None)``, or ``(None, None, error_response)``."""
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        except requests.RequestException as e:
-            logger.exception("Network/requests error when calling OpenRouter")
-            return Response({"error": "OpenRouter request failed", "details": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+            resp = openrouter.post(payload)
+        except httpx.HTTPError as e:
+            logger.exception("Network error when calling OpenRouter")
+            return None, None, Response({"error": "OpenRouter request failed", "details": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
 
         # If provider says 401, return helpful message
         if resp.status_code == 401:
             body = resp.text
             logger.warning("OpenRouter returned 401 Unauthorized. provider_response=%s", body[:2000])
-            return Response(
+            return None, None, Response(
                 {
                     "error": "OpenRouter unauthorized. Check OPENROUTER_API_KEY and model permissions.",
                     "provider_status": resp.status_code,
@@ -152,94 +189,165 @@ class FreezyChatView(APIView):
         try:
             resp.raise_for_status()
             resp_json = resp.json()
-            reply_text = _extract_reply_text(resp_json).strip()
-            return Response({"reply": reply_text, "raw": resp_json})
+            return _extract_reply_text(resp_json).strip(), resp_json, None
         except ValueError:
             logger.exception("OpenRouter returned non-JSON body")
-            return Response({"error": "OpenRouter returned non-JSON response", "body": resp.text}, status=status.HTTP_502_BAD_GATEWAY)
-        except requests.HTTPError:
+            return None, None, Response({"error": "OpenRouter returned non-JSON response", "body": resp.text}, status=status.HTTP_502_BAD_GATEWAY)
+        except httpx.HTTPStatusError:
             logger.exception("OpenRouter HTTP error, status=%s body=%s", resp.status_code, resp.text[:2000])
-            return Response({"error": "OpenRouter request failed", "status": resp.status_code, "body": resp.text}, status=status.HTTP_502_BAD_GATEWAY)
+            return None, None, Response({"error": "OpenRouter request failed", "status": resp.status_code, "body": resp.text}, status=status.HTTP_502_BAD_GATEWAY)
         except Exception as e:
             logger.exception("Unexpected error handling OpenRouter response")
-            return Response({"error": "Internal server error", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return None, None, Response({"error": "Internal server error", "details": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class FreezyChatStreamView(APIView):
+@method_decorator(csrf_exempt, name="dispatch")
+class FreezyChatStreamView(View):
     """
     Streaming proxy. Client should parse server-sent events.
+
+    An async view: under ``backend.asgi`` one worker relays many streams
+    without holding a thread each (see ``agent.streaming.SSERelay``). Under
+    WSGI (gunicorn) the view runs to completion in its own event loop, so the
+    upstream is opened with the sync client and relayed by a sync iterator
+    that the worker thread consumes as before. At most
+    ``FREEZY_MAX_STREAMS`` streams are open per process; beyond that the
+    request is refused with 503. Takes the same body as FreezyChatView; the
+    conversation id is returned in the ``X-Conversation-Id`` header and the
+    streamed reply is stored once it completes. Cached and coalesced replies
+    (``agent.reply_cache``) are replayed as the same kind of event stream.
+    Shares FreezyChatView's ``freezy`` governor scope.
     """
-    permission_classes = [AllowAny]
+    throttle_scope = "freezy"
 
-    def post(self, request):
+    async def post(self, request):
+        asgi = isinstance(request, ASGIRequest)
         key = getattr(settings, "OPENROUTER_API_KEY", None)
         logger.debug("FreezyChatStreamView called. openrouter_key=%s base=%s", _mask_key_for_log(key), OPENROUTER_BASE)
 
         if not key:
-            return Response(
+            return JsonResponse(
                 {"error": "AI backend not configured. OPENROUTER_API_KEY missing on server."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        data = request.data or {}
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(data, dict):
+            data = {}
         user_message = data.get("message", "")
-        history = data.get("history", []) or []
 
         if not user_message:
-            return Response({"error": "message required"}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({"error": "message required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        messages = [{"role": "system", "content": FREEZY_SYSTEM_PROMPT}]
-        if isinstance(history, list):
-            recent = history[-20:]
-            for item in recent:
-                if isinstance(item, dict) and item.get("role") in ("user", "assistant"):
-                    content = item.get("content", "")
-                    if content:
-                        messages.append({"role": item["role"], "content": content})
-        messages.append({"role": "user", "content": user_message})
+        wait = governor.check_rate(self.throttle_scope, request_ident(request))
+        if wait:
+            return _throttled(Throttled(wait=wait))
 
-        payload = {
-            "model": OPENROUTER_MODEL,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 1200,
-            "stream": True,
-        }
+        if not stream_slots.acquire():
+            response = JsonResponse({"error": "Too many open chat streams, retry shortly."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = "1"
+            return response
 
-        url = get_openrouter_url("/chat/completions")
-        headers = get_openrouter_headers()
+        # Everything held for this stream is released when the view returns,
+        # unless ownership is handed to the relay, which releases on close.
+        with ExitStack() as held:
+            held.callback(stream_slots.release)
 
+            conversation, history = await sync_to_async(open_turn)(
+                request.user, user_message, data.get("conversation_id"), data.get("history")
+            )
+            if conversation is None:
+                return JsonResponse({"error": "conversation not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            payload = {
+                "model": OPENROUTER_MODEL,
+                "messages": _build_messages(history),
+                "temperature": 0.7,
+                "max_tokens": 1200,
+                "stream": True,
+            }
+
+            cache_key = reply_key(payload)
+            reply, outcome, leading = reply_cache.get(cache_key), "hit", False
+            if reply is None:
+                waiting = reply_cache.begin(cache_key)
+                leading = waiting is None
+                if leading:
+                    # No-op once save_reply published the reply.
+                    held.callback(reply_cache.finish, cache_key, None)
+                else:
+                    # Under WSGI the wait holds a worker thread, so it is capped like FreezyChatView's.
+                    timeout = None if asgi else getattr(settings, "FREEZY_COALESCE_SYNC_WAIT", 5)
+                    reply, outcome = await reply_cache.await_reply(waiting, timeout), "coalesced"
+
+            if reply is not None:
+                reply_cache.record(outcome)
+                await sync_to_async(add_message)(conversation, "assistant", reply)
+                events = replay(reply) if asgi else replay_events(reply)
+                return self.event_stream(events, conversation, outcome)
+
+            reply_cache.record("miss")
+            if not governor.acquire(self.throttle_scope):
+                return _throttled(Overloaded(wait=1))
+            held.callback(governor.release, self.throttle_scope)
+
+            r, error = await self.open_upstream(payload, asgi)
+            if error is not None:
+                return error
+
+            def save_reply(text):
+                add_message(conversation, "assistant", text)
+                if leading:
+                    reply_cache.finish(cache_key, text)
+
+            relay = SSERelay(r, on_complete=save_reply, on_close=held.pop_all().close)
+            return self.event_stream(relay if asgi else relay.sync_events(), conversation, "miss")
+
+    def event_stream(self, events, conversation, outcome):
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["X-Conversation-Id"] = str(conversation.id)
+        response["X-Freezy-Cache"] = outcome
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def open_upstream(self, payload, asgi=True):
+        """
+        Returns ``(streamed upstream response, None)``, or ``(None, error_response)``.
+        The response is async under ASGI; under WSGI it comes from the sync
+        client, since an async one would not outlive the view's event loop.
+        """
         try:
-            r = requests.post(url, headers=headers, json=payload, stream=True, timeout=300)
-        except requests.RequestException as e:
+            if asgi:
+                r = await openrouter.apost(payload, stream=True)
+            else:
+                r = await sync_to_async(openrouter.post)(payload, stream=True)
+        except httpx.HTTPError as e:
             logger.exception("OpenRouter streaming request failed")
-            return Response({"error": "OpenRouter stream request failed", "details": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+            return None, JsonResponse({"error": "OpenRouter stream request failed", "details": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+
+        if not r.is_error:
+            return r, None
+        # Load the error body for the messages below; this also frees the connection.
+        if asgi:
+            await r.aread()
+        else:
+            await sync_to_async(r.read)()
 
         if r.status_code == 401:
             logger.warning("OpenRouter streaming returned 401 Unauthorized. body=%s", r.text[:2000])
-            return Response({"error": "OpenRouter unauthorized. Check OPENROUTER_API_KEY."}, status=status.HTTP_502_BAD_GATEWAY)
+            return None, JsonResponse({"error": "OpenRouter unauthorized. Check OPENROUTER_API_KEY."}, status=status.HTTP_502_BAD_GATEWAY)
 
-        try:
-            r.raise_for_status()
-        except requests.HTTPError:
-            logger.exception("OpenRouter streaming returned HTTP error. status=%s body=%s", r.status_code, r.text[:2000])
-            return Response({"error": "OpenRouter stream failed", "status": r.status_code, "body": r.text}, status=status.HTTP_502_BAD_GATEWAY)
+        logger.error("OpenRouter streaming returned HTTP error. status=%s body=%s", r.status_code, r.text[:2000])
+        return None, JsonResponse({"error": "OpenRouter stream failed", "status": r.status_code, "body": r.text}, status=status.HTTP_502_BAD_GATEWAY)
 
-        def event_stream():
-            try:
-                for raw_line in r.iter_lines(decode_unicode=True):
-                    if not raw_line:
-                        continue
-                    line = raw_line.strip()
-                    if line.startswith("data: "):
-                        payload_line = line[len("data: "):]
-                        yield f"data: {payload_line}\n\n"
-                    else:
-                        yield f"data: {line}\n\n"
-            except Exception as e:
-                logger.exception("Error while streaming from OpenRouter")
-                yield f"data: {{\"error\":\"{str(e)}\"}}\n\n"
-            finally:
-                r.close()
 
-        return StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+class FreezyCacheStatsView(APIView):
+    """Reply cache counters and hit rate for this worker process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(reply_cache.stats())
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import User
+from analytics.models import UserAnalytics
+from posts.models import Comment, Post
+
+
+def _aggregate(model, fk_name, aggregate, ref='pk'):
+    """Correlated subquery aggregating ``model`` rows that point at the outer row."""
+    rows = (
+        model.objects.filter(**{fk_name: OuterRef(ref)})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=aggregate)
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized like, comment, follower and analytics counters."
+
+    def handle(self, *args, **options):
+        follows = User.followers.through
+
+        now = timezone.now()
+        with transaction.atomic():
+            posts = Post.objects.update(
+                likes_count=_aggregate(Post.likes.through, 'post', Count('*')),
+                comments_count=_aggregate(Comment, 'post', Count('*')),
+                updated_at=now,
+            )
+            users = User.objects.update(
+                followers_count=_aggregate(follows, 'from_user', Count('*')),
+                following_count=_aggregate(follows, 'to_user', Count('*')),
+                updated_at=now,
+            )
+
+            missing = User.objects.filter(analytics__isnull=True).values_list('id', flat=True)
+            UserAnalytics.objects.bulk_create(
+                [UserAnalytics(user_id=user_id) for user_id in missing.iterator()],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            UserAnalytics.objects.update(
+                total_posts=_aggregate(Post, 'author', Count('*'), 'user_id'),
+                total_likes=_aggregate(Post, 'author', Sum('likes_count'), 'user_id'),
+                total_comments=_aggregate(Post, 'author', Sum('comments_count'), 'user_id'),
+                total_followers=_aggregate(follows, 'from_user', Count('*'), 'user_id'),
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled counters for {posts} posts and {users} users."
+        ))
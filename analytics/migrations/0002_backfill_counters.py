@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _aggregate(model, fk_name, aggregate, ref='pk'):
+    rows = (
+        model.objects.filter(**{fk_name: OuterRef(ref)})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=aggregate)
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    UserAnalytics = apps.get_model('analytics', 'UserAnalytics')
+    follows = User.followers.through
+
+    Post.objects.update(
+        likes_count=_aggregate(Post.likes.through, 'post', Count('*')),
+        comments_count=_aggregate(Comment, 'post', Count('*')),
+    )
+    User.objects.update(
+        followers_count=_aggregate(follows, 'from_user', Count('*')),
+        following_count=_aggregate(follows, 'to_user', Count('*')),
+    )
+    missing = User.objects.filter(analytics__isnull=True).values_list('id', flat=True)
+    UserAnalytics.objects.bulk_create(
+        [UserAnalytics(user_id=user_id) for user_id in missing], ignore_conflicts=True
+    )
+    UserAnalytics.objects.update(
+        total_posts=_aggregate(Post, 'author', Count('*'), 'user_id'),
+        total_likes=_aggregate(Post, 'author', Sum('likes_count'), 'user_id'),
+        total_comments=_aggregate(Post, 'author', Sum('comments_count'), 'user_id'),
+        total_followers=_aggregate(follows, 'from_user', Count('*'), 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('accounts', '0007_user_followers_count_user_following_count'),
+        ('posts', '0005_post_comments_count_post_likes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,11 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 class UserAnalytics(models.Model):
+    """
+    Running totals for a user's profile, kept current with F() updates by the
+    post, like, comment and follow views. Likes and comments are the ones
+    received on the user's posts. `manage.py reconcile_counters` rebuilds them.
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='analytics')
     total_posts = models.IntegerField(default=0)
     total_likes = models.IntegerField(default=0)
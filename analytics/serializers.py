@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import UserAnalytics
+from backend.middleware import TimedSerializerMixin
 
-class UserAnalyticsSerializer(serializers.ModelSerializer):
+class UserAnalyticsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAnalytics
         fields = '__all__'
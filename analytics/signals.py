@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import UserAnalytics
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_analytics(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserAnalytics.objects.create(user=instance)
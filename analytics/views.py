@@ -7,4 +7,5 @@ class UserAnalyticsView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user.analytics
+        analytics, _ = UserAnalytics.objects.get_or_create(user=self.request.user)
+        return analytics
@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve Freezy chat streams through it (e.g. ``uvicorn backend.asgi:application``)
+so each open stream is a task on the event loop rather than a blocked thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +16,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Warm the in-memory search suggestions before the first request.
+from search.suggest import suggestions  # noqa: E402
+
+suggestions.warm_on_startup()
@@ -0,0 +1,91 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=`` on GET responses.
+
+``fields`` is a comma-separated list of the fields to return. Nested objects
+(a serializer's ``Meta.expandable_fields``) are returned as before when the
+request names neither parameter; once it does, they are only returned when
+listed in ``fields`` or ``expand``. ``expand`` takes dotted paths into nested
+serializers (``?expand=comments.author_profile``). Unknown names are a 400.
+
+List serializers look at the fields left on their child to skip the lookups
+and prefetches of the fields left out, so a card-only page such as
+``?fields=id,title,likes_count`` never reads comments or authors.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class Fieldset:
+    def __init__(self, fields=None, expand=None):
+        # None selects every field that is not expandable.
+        self.fields = fields
+        # Expanded name -> the expand tree of its own nested fields.
+        self.expand = expand or {}
+
+    @classmethod
+    def from_request(cls, request):
+        """The request's fieldset, or None when it asks for the full representation."""
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        expand = {}
+        for path in _names(params.get('expand', '')):
+            node = expand
+            for name in path.split('.'):
+                node = node.setdefault(name, {})
+        fields = set(_names(params['fields'])) if 'fields' in params else None
+        return cls(fields, expand)
+
+    def names(self):
+        return set(self.fields or ()) | set(self.expand)
+
+    def select(self, names, expandable=(), strict=True):
+        """The subset of ``names`` to keep."""
+        unknown = self.names() - set(names)
+        if unknown and strict:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        if self.fields is None:
+            return {name for name in names if name not in expandable or name in self.expand}
+        return {name for name in names if name in self.fields or name in self.expand}
+
+    def nested(self, name):
+        return Fieldset(expand=self.expand.get(name))
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin dropping the fields the request's Fieldset leaves out.
+    The fieldset comes from ``context['fieldset']`` when a view builds it
+    itself, else from the request; nested serializers get theirs from their
+    parent.
+    """
+
+    def get_fieldset(self):
+        if hasattr(self, '_fieldset'):
+            return self._fieldset
+        if 'fieldset' in self.context:
+            return self.context['fieldset']
+        return Fieldset.from_request(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+        keep = fieldset.select(
+            fields, getattr(self.Meta, 'expandable_fields', ()), self.context.get('strict_fields', True)
+        )
+        for name in list(fields):
+            if name not in keep:
+                del fields[name]
+                continue
+            nested = getattr(fields[name], 'child', fields[name])
+            if isinstance(nested, SparseFieldsMixin):
+                nested._fieldset = fieldset.nested(name)
+        return fields
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.settings import api_settings
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def parse_rate(rate):
+    """``"20/min"`` -> ``(20, 60)``."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period]
+
+
+def request_ident(request):
+    """
+    ``user:<id>`` for requests carrying an access cookie, else ``ip:<address>``
+    (resolved through ``NUM_PROXIES`` trusted proxies).
+    """
+    claims = getattr(request, "jwt_claims", None)
+    if claims:
+        return f"user:{claims.get(api_settings.USER_ID_CLAIM)}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+class Overloaded(Throttled):
+    """Raised when a scope's concurrent call cap is reached; DRF answers 429."""
+
+
+class Governor:
+    """
+    Per-endpoint request governor.
+
+    ``GOVERNOR_LIMITS`` maps a scope (a view's ``throttle_scope``) to its
+    limits: ``rate`` (``"20/min"``) and ``burst`` configure a token bucket
+    per user or IP, and ``concurrency`` caps the scope's simultaneous calls
+    in this process. Buckets live in process memory (the least recently used
+    are dropped beyond ``GOVERNOR_MAX_KEYS``); with ``GOVERNOR_BACKEND =
+    "cache"`` the rate is instead enforced across workers through the
+    default cache, as a fixed window of ``rate`` requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._active = {}
+
+    def limits(self, scope):
+        return getattr(settings, "GOVERNOR_LIMITS", {}).get(scope) or {}
+
+    def check_rate(self, scope, ident):
+        """Take one request from ``ident``'s bucket: 0 if allowed, else seconds to wait."""
+        limits = self.limits(scope)
+        if not limits.get("rate"):
+            return 0
+        count, period = parse_rate(limits["rate"])
+        if getattr(settings, "GOVERNOR_BACKEND", "local") == "cache":
+            return self._check_window(scope, ident, count, period)
+
+        capacity = limits.get("burst", count)
+        refill = count / period
+        key = (scope, ident)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * refill)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > getattr(settings, "GOVERNOR_MAX_KEYS", 10000):
+                self._buckets.popitem(last=False)
+        return wait
+
+    def _check_window(self, scope, ident, count, period):
+        now = time.time()
+        key = f"governor:{scope}:{ident}:{int(now // period)}"
+        cache.add(key, 0, period + 1)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            # The window expired between add and incr.
+            cache.set(key, 1, period + 1)
+            used = 1
+        return 0 if used <= count else period - now % period
+
+    def acquire(self, scope):
+        """Take one of ``scope``'s concurrent call slots; False when all are in use."""
+        cap = self.limits(scope).get("concurrency")
+        with self._lock:
+            if cap is not None and self._active.get(scope, 0) >= cap:
+                return False
+            self._active[scope] = self._active.get(scope, 0) + 1
+            return True
+
+    def release(self, scope):
+        with self._lock:
+            self._active[scope] -= 1
+
+    @contextmanager
+    def concurrency(self, scope):
+        """Hold a slot of ``scope`` for the block, or raise Overloaded."""
+        if not self.acquire(scope):
+            raise Overloaded(wait=1)
+        try:
+            yield
+        finally:
+            self.release(scope)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._active.clear()
+
+
+governor = Governor()
+
+
+class GovernorThrottle(BaseThrottle):
+    """
+    DRF throttle applying the governor's rate limit for the view's
+    ``throttle_scope``; views without a configured scope are not limited.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if not scope:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = request_ident(request)
+        self._wait = governor.check_rate(scope, ident)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
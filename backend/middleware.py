@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.middleware import http
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger('backend.perf')
+
+# Metrics of the request being handled in this thread / task, or None when
+# the request is not sampled.
+_current = ContextVar('request_metrics', default=None)
+
+_IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql):
+    """Strip literals and collapse ``IN (...)`` lists so equal statements group together."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        # Nesting of timed ``to_representation`` calls; only the outermost is timed.
+        self.serializer_depth = 0
+        self.total = 0.0
+        self.slow_queries = []
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed * 1000 >= getattr(settings, 'PERF_SLOW_QUERY_MS', 100):
+                self.slow_queries.append((sql, elapsed))
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+def _install_execute_wrapper(connection, **kwargs):
+    # Connections are per thread, but the metrics context variable follows the
+    # request into sync_to_async threads, so one permanent wrapper serves all.
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding ``to_representation`` time to the request's
+    serializer time. Only the outermost call is timed: nested serializers and
+    ``.data`` calls made while it runs (author snapshots) are part of it.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+
+
+class PerformanceMiddleware:
+    """
+    Per-request query count, DB time, serializer time and total time.
+
+    Sampled requests (``PERF_SAMPLE_RATE``) get a ``Server-Timing`` header
+    when ``PERF_SERVER_TIMING`` allows it for the requesting user::
+
+        db;dur=4.1;desc="6 queries", serialize;dur=9.7, total;dur=15.2
+
+    Serializer time covers serializers with TimedSerializerMixin, including
+    the queries they trigger. Requests
+    slower than ``PERF_SLOW_REQUEST_MS`` and queries slower than
+    ``PERF_SLOW_QUERY_MS`` are logged as JSON to the ``backend.perf`` logger
+    with the view name and normalized SQL. Unsampled requests pay one random
+    draw plus a context variable lookup per query.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_install_execute_wrapper)
+        for connection in connections.all():
+            _install_execute_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        with self.measure() as metrics:
+            response = self.get_response(request)
+        self.report(request, response, metrics, self.shows_timing(request))
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        with self.measure() as metrics:
+            response = await self.get_response(request)
+        # Resolving a lazy request.user may query the database.
+        shows_timing = await sync_to_async(self.shows_timing)(request)
+        self.report(request, response, metrics, shows_timing)
+        return response
+
+    def sampled(self):
+        return (
+            getattr(settings, 'PERF_INSTRUMENTATION', True)
+            and random.random() < getattr(settings, 'PERF_SAMPLE_RATE', 0.01)
+        )
+
+    def shows_timing(self, request):
+        mode = getattr(settings, 'PERF_SERVER_TIMING', 'staff')
+        if mode == 'staff':
+            user = getattr(request, 'user', None)
+            return bool(user is not None and user.is_staff)
+        return mode == 'all'
+
+    @contextmanager
+    def measure(self):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            _current.reset(token)
+            metrics.total = time.perf_counter() - start
+
+    def report(self, request, response, metrics, shows_timing):
+        # For streamed responses this covers the time to the first byte.
+        if shows_timing:
+            response['Server-Timing'] = (
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+                f'serialize;dur={metrics.serializer_time * 1000:.1f}, '
+                f'total;dur={metrics.total * 1000:.1f}'
+            )
+        self.log_slow(request, response, metrics)
+
+    def log_slow(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else None
+        for sql, elapsed in metrics.slow_queries:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'view': view,
+                'duration_ms': round(elapsed * 1000, 1),
+                'sql': normalize_sql(sql),
+            }))
+        if metrics.total * 1000 >= getattr(settings, 'PERF_SLOW_REQUEST_MS', 500):
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(metrics.total * 1000, 1),
+                'db_ms': round(metrics.db_time * 1000, 1),
+                'serialize_ms': round(metrics.serializer_time * 1000, 1),
+                'queries': metrics.queries,
+            }))
+
+
+class StaticFilesMiddleware:
+    """
+    WhiteNoise, usable in an async middleware stack.
+
+    Django runs sync-only middleware on its single thread-sensitive worker
+    thread, which then stays blocked until the async views below it return;
+    under ASGI that would serialize every request (and any view waiting on
+    another, like coalesced Freezy chats) behind one thread. WhiteNoise is
+    sync-only, so a stock WhiteNoiseMiddleware is called (in a thread of its
+    own under ASGI) as a black box: it answers static requests and passes
+    everything else to ``_not_static``, which sends them on down this stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.whitenoise = WhiteNoiseMiddleware(_not_static)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.whitenoise(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = await sync_to_async(self.whitenoise, thread_sensitive=False)(request)
+        return await self.get_response(request) if response is None else response
+
+
+def _not_static(request):
+    return None
+
+
+class ConditionalGetMiddleware(http.ConditionalGetMiddleware):
+    """
+    Django's conditional GET handling, with weak ETags: GET responses that
+    carry no validator of their own (list pages, mostly) get a weak hash of
+    their content, so a client re-polling an unchanged page gets an empty 304.
+    Views with cheap validators (backend.conditional) set strong ETags instead.
+    """
+
+    def process_response(self, request, response):
+        if (request.method == 'GET' and response.status_code == 200 and not response.streaming
+                and not response.has_header('ETag') and self.needs_etag(response)):
+            digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+            response.headers['ETag'] = f'W/"{digest}"'
+        return super().process_response(request, response)
@@ -0,0 +1,100 @@
+"""
+Versioned response cache for public read endpoints.
+
+A cached response is keyed on the view, the URL, the viewer and the current
+version of each entity it depends on (``user:<id>``, ``user-posts:<id>``,
+``users``, ``posts``, and ``viewer:<id>`` for the viewer's own follows and
+likes). Signal handlers in accounts.signals and posts.signals, and
+User.follow/unfollow, bump those versions when the rows behind them change,
+so outdated entries are simply never looked up again and expire after
+``RESPONSE_CACHE_TTL``; no key is scanned or deleted. Entries and versions
+live in the ``RESPONSE_CACHE_ALIAS`` cache, which every worker must share
+(``RESPONSE_CACHE_ENABLED`` is off by default on local memory).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def version_key(entity):
+    return f"response-version:{entity}"
+
+
+def versions(entities):
+    cache = get_cache()
+    keys = [version_key(entity) for entity in entities]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock rather than 0, so an evicted version never
+            # comes back with a number that older entries were cached under.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key, 0)
+    return [found[key] for key in keys]
+
+
+def _bump(entities):
+    cache = get_cache()
+    for entity in entities:
+        try:
+            cache.incr(version_key(entity))
+        except ValueError:
+            cache.set(version_key(entity), time.time_ns(), None)
+
+
+def bump(*entities):
+    """
+    Invalidate every cached response that depends on ``entities``. Versions
+    move now and again once the transaction commits, so a response cached
+    from the pre-commit rows in between is not served either.
+    """
+    if not entities:
+        return
+    _bump(entities)
+    transaction.on_commit(lambda: _bump(entities))
+
+
+def response_key(request, view_name, entities):
+    viewer = request.user.pk if request.user.is_authenticated else 'anon'
+    parts = [view_name, request.get_host(), request.get_full_path(), viewer, *versions(entities)]
+    return 'response:' + hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    Serve GET requests from the response cache. Views return the entities
+    their response depends on from ``get_cache_entities``; with
+    ``cache_anonymous_only`` set, only anonymous requests are cached.
+    """
+    cache_anonymous_only = False
+
+    def get_cache_entities(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        authenticated = request.user.is_authenticated
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True) or (self.cache_anonymous_only and authenticated):
+            return super().get(request, *args, **kwargs)
+
+        entities = list(self.get_cache_entities())
+        if authenticated:
+            entities.append(f'viewer:{request.user.pk}')
+        cache = get_cache()
+        key = response_key(request, type(self).__name__, entities)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Response-Cache': 'hit'})
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+            response['X-Response-Cache'] = 'miss'
+        return response
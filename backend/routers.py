@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ALIAS = 'read'
+
+
+class ReadWriteRouter:
+    """
+    Sends reads to the ``read`` database alias (a read-only connection to the
+    same SQLite file) and everything else to ``default``. Reads made while
+    ``default`` is inside a transaction stay on it, so code always sees its
+    own uncommitted writes; without a ``read`` alias every query uses
+    ``default``.
+    """
+
+    def db_for_read(self, model, **hints):
+        if READ_ALIAS not in settings.DATABASES or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
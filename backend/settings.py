@@ -23,8 +23,163 @@ IMAGEKIT_PUBLIC_KEY = os.getenv("IMAGEKIT_PUBLIC_KEY")
 IMAGEKIT_PRIVATE_KEY = os.getenv("IMAGEKIT_PRIVATE_KEY")
 IMAGEKIT_URL_ENDPOINT = os.getenv("IMAGEKIT_URL_ENDPOINT")
 
+# Upload signatures are valid this many seconds; each worker keeps a pool of
+# pre-generated ones, and the batch endpoint hands out at most BATCH_MAX.
+IMAGEKIT_SIGNATURE_TTL = int(os.getenv("IMAGEKIT_SIGNATURE_TTL", "600"))
+IMAGEKIT_SIGNATURE_POOL_SIZE = int(os.getenv("IMAGEKIT_SIGNATURE_POOL_SIZE", "32"))
+IMAGEKIT_SIGNATURE_BATCH_MAX = int(os.getenv("IMAGEKIT_SIGNATURE_BATCH_MAX", "10"))
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "deepseek/deepseek-chat-v3.1:free")
+OPENROUTER_BASE = os.getenv("OPENROUTER_BASE", "https://openrouter.ai/api/v1")
+
+# Pooled OpenRouter client (agent/client.py). Timeouts are in seconds; the
+# stream read timeout is the longest allowed gap between streamed chunks.
+# 429/5xx answers and connection failures are retried with jittered backoff.
+OPENROUTER_POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", "20"))
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5"))
+OPENROUTER_READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", "60"))
+OPENROUTER_STREAM_READ_TIMEOUT = float(os.getenv("OPENROUTER_STREAM_READ_TIMEOUT", "300"))
+OPENROUTER_MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "2"))
+OPENROUTER_BACKOFF_BASE = float(os.getenv("OPENROUTER_BACKOFF_BASE", "0.5"))
+OPENROUTER_BACKOFF_MAX = float(os.getenv("OPENROUTER_BACKOFF_MAX", "8"))
+
+# Freezy chat streams (async under backend.asgi, a thread each under gunicorn's
+# WSGI workers): open streams allowed per process, and seconds of upstream
+# silence before a heartbeat comment is sent.
+FREEZY_MAX_STREAMS = int(os.getenv("FREEZY_MAX_STREAMS", "200"))
+FREEZY_HEARTBEAT_INTERVAL = float(os.getenv("FREEZY_HEARTBEAT_INTERVAL", "15"))
+
+# Estimated tokens of stored history sent upstream with each chat turn; older
+# turns are folded into a conversation summary capped at the second budget.
+FREEZY_HISTORY_TOKEN_BUDGET = int(os.getenv("FREEZY_HISTORY_TOKEN_BUDGET", "2000"))
+FREEZY_SUMMARY_TOKEN_BUDGET = int(os.getenv("FREEZY_SUMMARY_TOKEN_BUDGET", "400"))
+
+# Per-process Freezy reply cache, keyed on model, prompt and the newest history
+# messages. Identical requests in flight wait up to FREEZY_COALESCE_TIMEOUT
+# seconds (FREEZY_COALESCE_SYNC_WAIT when the wait holds a WSGI worker thread)
+# for the first one's reply, then go upstream themselves.
+FREEZY_CACHE_TTL = int(os.getenv("FREEZY_CACHE_TTL", "3600"))
+FREEZY_CACHE_MAX_ENTRIES = int(os.getenv("FREEZY_CACHE_MAX_ENTRIES", "1000"))
+FREEZY_CACHE_CONTEXT_MESSAGES = int(os.getenv("FREEZY_CACHE_CONTEXT_MESSAGES", "4"))
+FREEZY_COALESCE_TIMEOUT = float(os.getenv("FREEZY_COALESCE_TIMEOUT", "60"))
+FREEZY_COALESCE_SYNC_WAIT = float(os.getenv("FREEZY_COALESCE_SYNC_WAIT", "5"))
+
+# Request governor (backend/governor.py), per view throttle_scope: a token
+# bucket of `burst` requests refilled at `rate` per user or IP, and at most
+# `concurrency` simultaneous upstream calls per process. Over the limit the
+# API answers 429 with Retry-After. GOVERNOR_BACKEND = "cache" enforces the
+# rates across workers through the default cache instead of per process.
+GOVERNOR_BACKEND = os.getenv("GOVERNOR_BACKEND", "local")
+# Reverse proxies in front of the app (Render's load balancer). Anonymous
+# callers are identified by the X-Forwarded-For entry that many hops from the
+# right, which the client cannot forge; 0 uses REMOTE_ADDR. Left unset, DRF
+# would trust the whole client-supplied header.
+NUM_PROXIES = int(os.getenv("NUM_PROXIES", "1"))
+GOVERNOR_MAX_KEYS = int(os.getenv("GOVERNOR_MAX_KEYS", "10000"))
+GOVERNOR_LIMITS = {
+    "freezy": {
+        "rate": os.getenv("FREEZY_RATE", "20/min"),
+        "burst": int(os.getenv("FREEZY_BURST", "5")),
+        "concurrency": int(os.getenv("FREEZY_MAX_UPSTREAM_CALLS", "16")),
+    },
+    "login": {"rate": os.getenv("LOGIN_RATE", "10/min"), "burst": 5},
+    "search": {"rate": os.getenv("SEARCH_RATE", "120/min"), "burst": 30},
+    "suggest": {"rate": os.getenv("SUGGEST_RATE", "600/min"), "burst": 60},
+}
+
+# Post views are buffered in each worker and written in batches once this many
+# events are pending or this many seconds have passed since the last flush
+# (a timer flushes idle workers too).
+VIEW_BUFFER_MAX_EVENTS = int(os.getenv("VIEW_BUFFER_MAX_EVENTS", "500"))
+VIEW_BUFFER_FLUSH_INTERVAL = float(os.getenv("VIEW_BUFFER_FLUSH_INTERVAL", "5"))
+
+# Per-process cache of authenticated users, keyed by id.
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# The default cache is local memory, per process. Point CACHE_BACKEND and
+# CACHE_LOCATION at a shared cache in production (for example
+# django.core.cache.backends.redis.RedisCache and redis://host:6379/0).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Public read endpoints (user detail, list and posts, anonymous post list)
+# cache responses in this cache for RESPONSE_CACHE_TTL seconds, keyed on entity
+# versions that signals bump on writes (backend/response_cache.py). Versions
+# are only bumped in the cache of the worker handling the write, so the cache
+# must be shared by every worker: it is off on the per-process LocMemCache
+# default unless RESPONSE_CACHE_ENABLED=1 is set for a single-process server.
+RESPONSE_CACHE_ENABLED = os.getenv(
+    "RESPONSE_CACHE_ENABLED", "0" if CACHES["default"]["BACKEND"].endswith(".LocMemCache") else "1"
+) == "1"
+RESPONSE_CACHE_ALIAS = os.getenv("RESPONSE_CACHE_ALIAS", "default")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Compact author representations embedded in posts and comments are cached
+# (in the default cache) for this many seconds, and dropped on profile or
+# follower changes. The drop only reaches the writing worker's cache, so on
+# the per-process LocMemCache default the TTL falls back to a few seconds,
+# which bounds how long other workers serve a stale author.
+AUTHOR_SNAPSHOT_TTL = int(os.getenv(
+    "AUTHOR_SNAPSHOT_TTL", "5" if CACHES["default"]["BACKEND"].endswith(".LocMemCache") else "300"
+))
+
+# Home timelines: posts are fanned out to followers' timelines on write unless
+# the author has more followers than this; timelines keep the newest entries.
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(os.getenv("TIMELINE_FANOUT_MAX_FOLLOWERS", "5000"))
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", "800"))
+
+# Seconds after which each worker reloads its in-memory search suggestions.
+SUGGEST_INDEX_REFRESH = float(os.getenv("SUGGEST_INDEX_REFRESH", "300"))
+
+# Password-reset OTPs expire after this many seconds; `manage.py sweep_otps`
+# deletes expired ones in chunks of OTP_SWEEP_CHUNK_SIZE rows.
+PASSWORD_RESET_OTP_TTL = int(os.getenv("PASSWORD_RESET_OTP_TTL", "600"))
+OTP_SWEEP_CHUNK_SIZE = int(os.getenv("OTP_SWEEP_CHUNK_SIZE", "1000"))
+
+# Silent refreshes of an expired access cookie share one new access token per
+# refresh token for this many seconds (in the default cache).
+JWT_REFRESH_COALESCE_WINDOW = int(os.getenv("JWT_REFRESH_COALESCE_WINDOW", "30"))
+
+# Silent refreshes in RefreshTokenMiddleware first consult a per-process Bloom
+# filter of revoked JTIs (accounts/tokens.py), rebuilt from the table every
+# REVOKED_FILTER_REBUILD seconds and synced with other workers' revocations
+# every REVOKED_FILTER_SYNC seconds: a refresh token revoked by another worker
+# can still mint access tokens there for up to that long. The refresh and
+# logout views always check the table. `manage.py prune_tokens` deletes
+# expired outstanding and blacklisted tokens.
+REVOKED_FILTER_REBUILD = float(os.getenv("REVOKED_FILTER_REBUILD", "3600"))
+REVOKED_FILTER_SYNC = float(os.getenv("REVOKED_FILTER_SYNC", "5"))
+REVOKED_FILTER_MAX_ENTRIES = int(os.getenv("REVOKED_FILTER_MAX_ENTRIES", "1000000"))
+REVOKED_FILTER_ERROR_RATE = float(os.getenv("REVOKED_FILTER_ERROR_RATE", "0.01"))
+TOKEN_PRUNE_CHUNK_SIZE = int(os.getenv("TOKEN_PRUNE_CHUNK_SIZE", "1000"))
+
+# Email outbox (accounts/outbox.py): queued mail is sent in batches over one
+# connection and retried with exponential backoff. EMAIL_OUTBOX_THREAD sends
+# from a background thread of the web process; set it to 0 when running
+# `manage.py send_outbox` as a separate worker.
+EMAIL_OUTBOX_THREAD = os.getenv("EMAIL_OUTBOX_THREAD", "1") == "1"
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_BACKOFF_BASE = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE", "30"))
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX", "3600"))
+EMAIL_OUTBOX_LEASE = int(os.getenv("EMAIL_OUTBOX_LEASE", "300"))
+
+# Per-request performance metrics for this fraction of requests; slow requests
+# and queries among them are logged to backend.perf with the full numbers.
+# PERF_SERVER_TIMING sends them back in a Server-Timing header to "staff"
+# users only, to "all" clients (development), or to no one ("off"), since
+# query counts and DB time tell an attacker which requests are expensive.
+PERF_INSTRUMENTATION = os.getenv("PERF_INSTRUMENTATION", "1") == "1"
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.01"))
+PERF_SERVER_TIMING = os.getenv("PERF_SERVER_TIMING", "staff")
+PERF_SLOW_REQUEST_MS = float(os.getenv("PERF_SLOW_REQUEST_MS", "500"))
+PERF_SLOW_QUERY_MS = float(os.getenv("PERF_SLOW_QUERY_MS", "100"))
 
 
 SECRET_KEY = 'django-insecure-m*#s%3khf$udnd$stk(+s6ke@3^%jy00laox96=s7k!651cwf%'
@@ -51,14 +206,17 @@ INSTALLED_APPS = [
     'posts',
     'analytics',
     'search',
+    'agent',
     'corsheaders',
     
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'backend.middleware.ConditionalGetMiddleware',
+    'backend.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -66,7 +224,6 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'accounts.middleware.JWTAuthenticationMiddleware',
-    'accounts.middleware.RefreshTokenMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -92,13 +249,43 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite is tuned on every new connection: WAL lets readers run alongside the
+# single writer, busy_timeout makes a writer wait for the lock instead of
+# failing with "database is locked", and transactions take the write lock up
+# front (BEGIN IMMEDIATE) so they never deadlock upgrading a read lock.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    'mmap_size': int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    'cache_size': -int(os.getenv("SQLITE_CACHE_KB", "20000")),
+    'temp_store': 'MEMORY',
+}
+SQLITE_INIT_COMMAND = '; '.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items())
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Reads outside transactions go to a separate read-only connection
+# (backend/routers.py), so they never queue behind the writer's connection.
+if os.getenv("DB_READ_ALIAS", "1") == "1":
+    DATABASES['read'] = {
+        **DATABASES['default'],
+        'OPTIONS': {'init_command': SQLITE_INIT_COMMAND + '; PRAGMA query_only=1'},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['backend.routers.ReadWriteRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,6 +345,8 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 5,
+    'DEFAULT_THROTTLE_CLASSES': ['backend.governor.GovernorThrottle'],
+    'NUM_PROXIES': NUM_PROXIES,
 }
 
 SIMPLE_JWT = {
@@ -177,6 +366,7 @@ CORS_ALLOWED_ORIGINS = [
     "https://skill-sync-frontend-silk.vercel.app"
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ["X-Conversation-Id", "X-Freezy-Cache"]
 
 
 
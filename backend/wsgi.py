@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Warm the in-memory search suggestions before the first request.
+from search.suggest import suggestions  # noqa: E402
+
+suggestions.warm_on_startup()
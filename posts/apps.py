@@ -1,6 +1,15 @@
+import atexit
+
 from django.apps import AppConfig
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .buffers import view_buffer
+
+        # Write out buffered view counts when the worker shuts down.
+        atexit.register(view_buffer.flush)
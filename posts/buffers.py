@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from backend import response_cache
+from .models import Post, PostView
+
+logger = logging.getLogger(__name__)
+
+# Keeps every bulk statement well under SQLite's bound-parameter limit.
+CHUNK_SIZE = 200
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class ViewCountBuffer:
+    """
+    Write-behind buffer for post views.
+
+    Detail-page hits and (post, user) view marks are gathered in process
+    memory and written in batches: one ``bulk_create(ignore_conflicts=True)``
+    of new ``PostView`` rows and one ``UPDATE ... CASE`` adding every pending
+    increment. A flush runs once ``VIEW_BUFFER_MAX_EVENTS`` events are
+    pending or ``VIEW_BUFFER_FLUSH_INTERVAL`` seconds have passed since the
+    last one, and again at interpreter shutdown (see ``PostsConfig.ready``).
+    The first event into an empty buffer sets a daemon timer for the interval,
+    so an idle worker writes its events without waiting for another request
+    (a SIGKILLed worker never runs its shutdown flush).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._marks = set()
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def record(self, post_id, user_id=None):
+        """
+        Count a view; with ``user_id`` count it only if that user never viewed
+        the post. Returns True if the view was written by a flush it triggered.
+        """
+        with self._lock:
+            if user_id is None:
+                self._counts[post_id] += 1
+            else:
+                self._marks.add((post_id, user_id))
+            pending = sum(self._counts.values()) + len(self._marks)
+            interval = getattr(settings, 'VIEW_BUFFER_FLUSH_INTERVAL', 5)
+            due = (
+                pending >= getattr(settings, 'VIEW_BUFFER_MAX_EVENTS', 500)
+                or time.monotonic() - self._last_flush >= interval
+            )
+            if not due:
+                self._schedule(interval)
+        if due:
+            self.flush()
+        return due
+
+    def pending(self, post_id):
+        """Increments recorded for ``post_id`` but not written yet, marks included."""
+        with self._lock:
+            return self._counts[post_id] + sum(1 for mark in self._marks if mark[0] == post_id)
+
+    def flush(self):
+        with self._lock:
+            counts, marks = self._counts, self._marks
+            self._counts, self._marks = Counter(), set()
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not counts and not marks:
+            return
+
+        try:
+            with transaction.atomic():
+                author_ids = self._write(counts, marks)
+        except DatabaseError:
+            logger.exception("Flushing %d post view events failed; keeping them for the next flush",
+                             sum(counts.values()) + len(marks))
+            with self._lock:
+                self._counts.update(counts)
+                self._marks |= marks
+                self._schedule(getattr(settings, 'VIEW_BUFFER_FLUSH_INTERVAL', 5))
+            return
+        response_cache.bump('posts', *(f'user-posts:{author_id}' for author_id in sorted(author_ids)))
+
+    def _schedule(self, interval):
+        # Called with the lock held.
+        if self._timer is None:
+            self._timer = threading.Timer(interval, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def _write(self, counts, marks):
+        """Write one flush; returns the authors of the posts whose counts moved."""
+        counts = Counter(counts)
+        post_ids = set(counts) | {post_id for post_id, _ in marks}
+        authors = {}
+        for chunk in _chunks(post_ids):
+            authors.update(Post.objects.filter(pk__in=chunk).values_list('pk', 'author_id'))
+        live_ids = set(authors)
+
+        new_marks = {mark for mark in marks if mark[0] in live_ids}
+        for chunk in _chunks(new_marks):
+            seen = PostView.objects.filter(
+                post_id__in={post_id for post_id, _ in chunk},
+                user_id__in={user_id for _, user_id in chunk},
+            ).values_list('post_id', 'user_id')
+            new_marks.difference_update(seen)
+        PostView.objects.bulk_create(
+            [PostView(post_id=post_id, user_id=user_id) for post_id, user_id in new_marks],
+            batch_size=CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+        counts.update(post_id for post_id, _ in new_marks)
+
+        now = timezone.now()
+        for chunk in _chunks(pk for pk in counts if pk in live_ids):
+            Post.objects.filter(pk__in=chunk).update(views_count=F('views_count') + Case(
+                *[When(pk=pk, then=Value(counts[pk])) for pk in chunk],
+                default=Value(0),
+                output_field=PositiveIntegerField(),
+            ), updated_at=now)
+        return {authors[pk] for pk in counts if pk in live_ids}
+
+
+view_buffer = ViewCountBuffer()
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from posts.models import Comment, Post, PostLike, TimelineEntry
+from posts.pagination import keyset_filter
+
+# Plans that are allowed to scan or sort, and why.
+EXEMPT = {
+    'following (past the timeline)': "fan-in over every followed author; only read once the "
+                                     "materialized timeline runs out (see posts.timeline)",
+}
+
+
+def endpoint_queries(user_id=1, limit=21):
+    """The main query of each feed and list endpoint, as the views build them."""
+    cursor = (timezone.now(), 1)
+    page = list(range(1, limit))
+    large = getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+    follows = User.followers.through.objects
+    return [
+        ('explore / posts', keyset_filter(Post.objects.all(), None)[:limit]),
+        ('explore / posts (cursor)', keyset_filter(Post.objects.all(), cursor)[:limit]),
+        ('explore / posts (previous)', keyset_filter(Post.objects.all(), cursor, reverse=True)[:limit]),
+        ('explore / posts (offset)', Post.objects.order_by('-created_at', '-id')[100:100 + limit]),
+        ('comments of a page', Comment.objects.filter(post_id__in=page).order_by('post_id', 'created_at')),
+        ('liked ids of a page', PostLike.objects.filter(user_id=user_id, post_id__in=page).values('post_id')),
+        ('user posts', keyset_filter(Post.objects.filter(author_id=user_id), cursor)[:limit]),
+        ('following (timeline)', keyset_filter(
+            TimelineEntry.objects.filter(user_id=user_id), cursor, id_field='post_id'
+        ).values('post_id', 'created_at')[:limit]),
+        ('following (large accounts)', User.objects.filter(
+            followers__id=user_id, followers_count__gt=large).values('id')),
+        ('following (past the timeline)', keyset_filter(Post.objects.filter(
+            author__in=follows.filter(to_user_id=user_id).values('from_user_id')), cursor)[:limit]),
+        ('liked posts', keyset_filter(
+            PostLike.objects.filter(user_id=user_id), cursor, id_field='post_id'
+        ).values('post_id')[:limit]),
+        ('followers', User.objects.filter(
+            pk__in=follows.filter(from_user_id=user_id).values('to_user_id')).order_by('id')[:limit]),
+        ('following users', User.objects.filter(
+            pk__in=follows.filter(to_user_id=user_id).values('from_user_id')).order_by('id')[:limit]),
+        ('users', User.objects.order_by('id')[:limit]),
+    ]
+
+
+def plan_problems(queryset):
+    """
+    Why ``queryset``'s plan is slow: a temporary B-tree sort, or a full scan
+    of a table that is filtered or read without a LIMIT.
+    """
+    plan = queryset.explain()
+    query = queryset.query
+    problems = []
+    for line in plan.splitlines():
+        if 'USE TEMP B-TREE' in line:
+            problems.append(line.strip())
+        elif ' SCAN ' in f' {line} ' and 'CONSTANT ROW' not in line and (query.where or not query.is_sliced):
+            problems.append(line.strip())
+    return plan, problems
+
+
+class Command(BaseCommand):
+    help = ("Run EXPLAIN QUERY PLAN on each feed and list endpoint's main query, and fail "
+            "if any needs a full table scan or a temporary sort.")
+
+    def handle(self, *args, **options):
+        failed = 0
+        for name, queryset in endpoint_queries():
+            plan, problems = plan_problems(queryset)
+            if not problems:
+                status = self.style.SUCCESS('ok')
+            elif name in EXEMPT:
+                status = self.style.WARNING(f'exempt: {EXEMPT[name]}')
+            else:
+                status = self.style.ERROR('FAIL')
+                failed += 1
+            self.stdout.write(f"{name:<34} {status}")
+            if options['verbosity'] > 1 or (problems and name not in EXEMPT):
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+        if failed:
+            raise CommandError(f"{failed} queries need a full scan or a temporary sort.")
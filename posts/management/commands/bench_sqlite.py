@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT, views_count INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE post_like (post_id INTEGER, user_id INTEGER, UNIQUE (post_id, user_id));
+"""
+POSTS = 200
+
+
+class Config:
+    def __init__(self, name, pragmas, persistent, begin):
+        self.name, self.pragmas, self.persistent, self.begin = name, pragmas, persistent, begin
+
+    def connect(self, path):
+        # isolation_level=None: transactions are issued explicitly, as Django does.
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+
+LEGACY = Config("before (rollback journal, connection per request, BEGIN)", {}, False, "BEGIN")
+TUNED = Config("after (WAL + pragmas, persistent, BEGIN IMMEDIATE)", settings.SQLITE_PRAGMAS, True, "BEGIN IMMEDIATE")
+
+
+class Command(BaseCommand):
+    help = ("Hammer a scratch SQLite file with concurrent view increments, likes and feed reads, "
+            "with the old and the tuned connection setup, and report lock waits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=200, help="Operations per thread.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{options['writers']} writers, {options['readers']} readers, {options['ops']} ops each")
+        for config in (LEGACY, TUNED):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                setup = config.connect(path)
+                setup.executescript(SCHEMA)
+                setup.executemany("INSERT INTO post (id, title) VALUES (?, ?)",
+                                  [(i, f"post {i}") for i in range(1, POSTS + 1)])
+                setup.close()
+                self.report(config, *self.run(config, path, options))
+
+    def run(self, config, path, options):
+        baseline = self.measure_baseline(config, path)
+        write_ms, read_ms, errors = [], [], []
+        lock = threading.Lock()
+
+        def worker(kind, worker_id):
+            conn = config.connect(path) if config.persistent else None
+            latencies, failed = [], 0
+            for op in range(options['ops']):
+                start = time.perf_counter()
+                try:
+                    c = conn or config.connect(path)
+                    if kind == 'write':
+                        self.write(c, config, worker_id, op)
+                    else:
+                        self.read(c, op)
+                    if not config.persistent:
+                        c.close()
+                except sqlite3.OperationalError:
+                    failed += 1
+                    if c.in_transaction:
+                        c.execute("ROLLBACK")
+                latencies.append((time.perf_counter() - start) * 1000)
+            with lock:
+                (write_ms if kind == 'write' else read_ms).extend(latencies)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=('write', i)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=('read', i)) for i in range(options['readers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return baseline, write_ms, read_ms, sum(errors), elapsed
+
+    def write(self, conn, config, worker_id, op):
+        # A view increment and a like, read-modify-write like a model save.
+        post_id = (worker_id * 7919 + op) % POSTS + 1
+        conn.execute(config.begin)
+        conn.execute("SELECT views_count FROM post WHERE id = ?", (post_id,)).fetchone()
+        conn.execute("UPDATE post SET views_count = views_count + 1 WHERE id = ?", (post_id,))
+        conn.execute("INSERT OR IGNORE INTO post_like (post_id, user_id) VALUES (?, ?)", (post_id, worker_id))
+        conn.execute("COMMIT")
+
+    def read(self, conn, op):
+        conn.execute(
+            "SELECT p.id, p.title, p.views_count, COUNT(l.user_id) FROM post p "
+            "LEFT JOIN post_like l ON l.post_id = p.id GROUP BY p.id ORDER BY p.id DESC LIMIT 20 OFFSET ?",
+            (op % 10 * 20,),
+        ).fetchall()
+
+    def measure_baseline(self, config, path):
+        """Median uncontended write latency; anything above it under load is lock wait."""
+        conn = config.connect(path) if config.persistent else None
+        samples = []
+        for op in range(50):
+            start = time.perf_counter()
+            c = conn or config.connect(path)
+            self.write(c, config, 0, op)
+            if not config.persistent:
+                c.close()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def report(self, config, baseline, write_ms, read_ms, errors, elapsed):
+        lock_wait = sum(max(0.0, ms - baseline) for ms in write_ms) / 1000
+
+        def p(values, q):
+            return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else 0.0
+
+        self.stdout.write(self.style.MIGRATE_HEADING(config.name))
+        self.stdout.write(f"  wall time            {elapsed:8.2f} s")
+        self.stdout.write(f"  'database is locked' {errors:8d}")
+        self.stdout.write(f"  write lock wait      {lock_wait:8.2f} s total")
+        self.stdout.write(f"  write p50 / p99      {p(write_ms, 50):8.2f} / {p(write_ms, 99):.2f} ms")
+        self.stdout.write(f"  read  p50 / p99      {p(read_ms, 50):8.2f} / {p(read_ms, 99):.2f} ms")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = "Rebuild home timelines from the follow graph, or only trim them to TIMELINE_MAX_ENTRIES."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trim-only', action='store_true', help="Only delete entries beyond the cap.")
+
+    def handle(self, *args, **options):
+        if not options['trim_only']:
+            follows = User.followers.through.objects.select_related('from_user', 'to_user')
+            for follow in follows.iterator():
+                # from_user is the followed account, to_user the follower.
+                timeline.backfill(follow.to_user, follow.from_user)
+        deleted = timeline.trim()
+        self.stdout.write(self.style.SUCCESS(
+            f"{TimelineEntry.objects.count()} timeline entries, {deleted} trimmed."
+        ))
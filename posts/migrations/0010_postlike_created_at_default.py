@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_comment_updated_at_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postlike',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
 from accounts.models import User
+from analytics.models import UserAnalytics
+
 
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
@@ -9,15 +13,90 @@ class Post(models.Model):
     external_link = models.URLField(blank=True, null=True)
     image_url = models.URLField(blank=True, null=True)
     category = models.CharField(max_length=100, blank=True, null=True)
-    likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    likes = models.ManyToManyField(User, through='PostLike', related_name='liked_posts', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Denormalized counters, maintained by add_like/remove_like and the
+    # comment views. `manage.py reconcile_counters` rebuilds them.
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # Moves with every change to the post or its counters; the ETag and
+    # Last-Modified of post responses are derived from it.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the feeds (see posts.pagination.FeedPagination).
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_id_idx'),
+        ]
+
+    def add_like(self, user):
+        """Like the post as ``user``. Returns False if it was already liked."""
+        with transaction.atomic():
+            _, created = PostLike.objects.get_or_create(post=self, user_id=user.pk)
+            if created:
+                Post.objects.filter(pk=self.pk).update(likes_count=F('likes_count') + 1, updated_at=timezone.now())
+                UserAnalytics.objects.filter(user_id=self.author_id).update(total_likes=F('total_likes') + 1)
+        return created
+
+    def remove_like(self, user):
+        """Remove ``user``'s like. Returns False if there was none."""
+        with transaction.atomic():
+            deleted, _ = PostLike.objects.filter(post_id=self.pk, user_id=user.pk).delete()
+            if deleted:
+                Post.objects.filter(pk=self.pk).update(likes_count=F('likes_count') - 1, updated_at=timezone.now())
+                UserAnalytics.objects.filter(user_id=self.author_id).update(total_likes=F('total_likes') - 1)
+        return bool(deleted)
+
+    def record_comment(self, delta=1):
+        """Shift the comment counters after a comment was created or deleted."""
+        Post.objects.filter(pk=self.pk).update(
+            comments_count=F('comments_count') + delta, updated_at=timezone.now()
+        )
+        UserAnalytics.objects.filter(user_id=self.author_id).update(total_comments=F('total_comments') + delta)
+
+
+class PostLike(models.Model):
+    """A user's like of a post (the ``Post.likes`` through table)."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Copy of post.created_at, so a user's liked posts page in index order.
+    # Set by save(); rows inserted by likes.add() / liked_posts.add() get the
+    # default and are corrected by copy_post_created_at (posts.signals).
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'posts_post_likes'
+        unique_together = ('post', 'user')
+        indexes = [
+            # MyLikedPostsView pages through one user's likes, newest post first.
+            models.Index(fields=['user', '-created_at', '-post'], name='like_user_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.created_at = self.post.created_at
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def copy_post_created_at(cls, likes):
+        """Set ``created_at`` of the ``likes`` queryset from their posts."""
+        likes.update(created_at=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1]))
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Comments prefetched for a page of posts, oldest first per post.
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+        ]
 
 
 class PostView(models.Model):
@@ -26,4 +105,18 @@ class PostView(models.Model):
     viewed_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ("post", "user") 
\ No newline at end of file
+        unique_together = ("post", "user")
+
+
+class TimelineEntry(models.Model):
+    """A post pushed into a follower's home timeline (see posts.timeline)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # Copy of post.created_at, so a page is one range read on the index below.
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="timeline_user_created_idx"),
+        ]
@@ -0,0 +1,133 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_filter(queryset, cursor, reverse=False, id_field='id'):
+    """
+    Restrict ``queryset`` to rows after ``cursor`` (a ``(created_at, id)``
+    pair) in newest-first order, or before it when ``reverse`` is set, and
+    order it in the direction of travel.
+    """
+    ordering = ('created_at', id_field) if reverse else ('-created_at', f'-{id_field}')
+    queryset = queryset.order_by(*ordering)
+    if cursor is None:
+        return queryset
+    created_at, pk = cursor
+    if reverse:
+        return queryset.filter(
+            Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(**{f'{id_field}__gt': pk}))
+        )
+    return queryset.filter(
+        Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(**{f'{id_field}__lt': pk}))
+    )
+
+
+class FeedPagination(BasePagination):
+    """
+    Keyset pagination for time-ordered feeds, newest first.
+
+    Pages are selected with ``WHERE (created_at, id) < cursor`` against the
+    ``(created_at, id)`` indexes on Post, so every page costs the same however
+    deep the client scrolls, and no ``COUNT(*)`` is run. Responses carry
+    opaque ``next``/``previous`` links; ``?limit=`` sets the page size.
+
+    Old clients keep limit/offset pagination, including ``count``, by sending
+    ``?offset=`` or ``?pagination=offset``.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 50
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    offset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_offset(request):
+            self.offset_pagination = LimitOffsetPagination()
+            return self.offset_pagination.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+
+        return self.paginate_keyset(
+            lambda cursor, reverse, limit: list(keyset_filter(queryset, cursor, reverse)[:limit]),
+            request,
+        )
+
+    def paginate_keyset(self, fetch, request):
+        """
+        Paginate rows returned by ``fetch(cursor, reverse, limit)``, which must
+        return up to ``limit`` objects with ``created_at`` and ``pk``, ordered
+        in the direction of travel. Feeds that are not a single queryset (see
+        posts.timeline) page through here.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            created_at, pk, reverse = cursor
+            cursor = (created_at, pk)
+
+        results = fetch(cursor, reverse, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if self.offset_pagination is not None:
+            return self.offset_pagination.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def use_offset(self, request):
+        return 'offset' in request.query_params or request.query_params.get('pagination') == 'offset'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk, reverse = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk), reverse == '1'
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, post, reverse):
+        raw = f"{post.created_at.isoformat()}|{post.pk}|{int(reverse)}"
+        encoded = base64.urlsafe_b64encode(raw.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
@@ -1,10 +1,17 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
+from backend.fieldsets import SparseFieldsMixin
+from backend.middleware import TimedSerializerMixin
 from .models import Post, Comment
-from accounts.serializers import ProfileSerializer
+from accounts.serializers import author_profile, author_snapshot, following_ids_for, get_author_snapshots
 
-class CommentSerializer(serializers.ModelSerializer):
-    author_name = serializers.CharField(source='author.username', read_only=True)
-    author_profile = ProfileSerializer(source='author', read_only=True)  # ✅ NEW
+AUTHOR_FIELDS = {'author_name', 'author_profile'}
+
+
+class CommentSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    author_name = serializers.SerializerMethodField()
+    author_profile = serializers.SerializerMethodField()  # ✅ NEW
 
     class Meta:
         model = Comment
@@ -13,36 +20,96 @@ class CommentSerializer(serializers.ModelSerializer):
             'content', 'created_at'
         ]
         read_only_fields = ['author', 'created_at']
+        expandable_fields = ['author_profile']
+
+    def get_author_profile(self, obj):
+        return author_profile(self.context, obj.author_id)
+
+    def get_author_name(self, obj):
+        snapshot = author_snapshot(self.context, obj.author_id)
+        return snapshot and snapshot['username']
+
+
+class PostListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    Serializes a page of posts with batched lookups: comments are prefetched
+    in one query, ``is_liked`` and every nested ``is_following`` are answered
+    from two id sets computed once for the whole page, and every embedded
+    author comes from one cached-snapshot lookup. Lookups for fields left out
+    by ``?fields=`` (see backend.fieldsets) are skipped.
+    """
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, BaseManager) else data)
+        request = self.context.get("request")
+        fields = self.child.fields
+        comment_fields = fields['comments'].child.fields if 'comments' in fields else {}
+
+        if comment_fields:
+            prefetch_related_objects(
+                posts, Prefetch('comments', queryset=Comment.objects.order_by('post_id', 'created_at'))
+            )
+
+        if 'is_liked' in fields:
+            liked_ids = set()
+            if request and request.user.is_authenticated:
+                liked_ids = set(
+                    Post.likes.through.objects.filter(
+                        user_id=request.user.id, post_id__in=[post.id for post in posts]
+                    ).values_list('post_id', flat=True)
+                )
+            self.context["liked_post_ids"] = liked_ids
+
+        post_authors = {post.author_id for post in posts}
+        comment_authors = set()
+        if comment_fields:
+            comment_authors = {comment.author_id for post in posts for comment in post.comments.all()}
+        author_ids, profile_ids = set(), set()
+        for names, user_ids in ((fields, post_authors), (comment_fields, comment_authors)):
+            if AUTHOR_FIELDS & set(names):
+                author_ids |= user_ids
+            if 'author_profile' in names:
+                profile_ids |= user_ids
+        if profile_ids:
+            self.context["following_ids"] = following_ids_for(request, profile_ids)
+        if author_ids:
+            self.context["author_snapshots"] = get_author_snapshots(author_ids)
+
+        return super().to_representation(posts)
 
 
-class PostSerializer(serializers.ModelSerializer):
-    author_name = serializers.CharField(source='author.username', read_only=True)
-    author_profile = ProfileSerializer(source='author', read_only=True)  # ✅ nested
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+class PostSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    author_name = serializers.SerializerMethodField()
+    author_profile = serializers.SerializerMethodField()  # ✅ nested
     comments = CommentSerializer(many=True, read_only=True)
     is_liked = serializers.SerializerMethodField()  # ✅ NEW
 
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = [
             'id', 'author', 'author_name', 'author_profile',
             'title', 'description', 'external_link', 'image_url', 'category',
             'likes_count', 'comments_count', 'views_count',
             'comments', 'created_at', 'is_liked'
         ]
-        read_only_fields = ['author', 'created_at', 'views_count']
+        read_only_fields = ['author', 'created_at', 'views_count', 'likes_count', 'comments_count']
+        expandable_fields = ['author_profile', 'comments']
         extra_kwargs = {
             "category": {"required": False, "allow_blank": True},
         }
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    def get_author_profile(self, obj):
+        return author_profile(self.context, obj.author_id)
 
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def get_author_name(self, obj):
+        snapshot = author_snapshot(self.context, obj.author_id)
+        return snapshot and snapshot['username']
 
     def get_is_liked(self, obj): 
+        liked_ids = self.context.get("liked_post_ids")
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
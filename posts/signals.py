@@ -0,0 +1,61 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from backend import response_cache
+from .models import Comment, Post, PostLike
+
+# post id -> author id for the response cache's user-posts versions. Posts
+# never change author, so entries only go stale by deletion.
+POST_AUTHORS_MAX = 10_000
+_post_authors = {}
+
+
+def user_posts_entities(post_ids):
+    missing = [post_id for post_id in post_ids if post_id not in _post_authors]
+    if missing:
+        if len(_post_authors) > POST_AUTHORS_MAX:
+            _post_authors.clear()
+        _post_authors.update(Post.objects.filter(pk__in=missing).values_list('pk', 'author_id'))
+    return [f'user-posts:{_post_authors[post_id]}' for post_id in post_ids if post_id in _post_authors]
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    _post_authors[instance.pk] = instance.author_id
+    response_cache.bump('posts', f'user-posts:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _post_authors.pop(instance.pk, None)
+    response_cache.bump('posts', f'user-posts:{instance.author_id}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    response_cache.bump('posts', *user_posts_entities([instance.post_id]))
+
+
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+def like_changed(sender, instance, **kwargs):
+    response_cache.bump('posts', f'viewer:{instance.user_id}', *user_posts_entities([instance.post_id]))
+
+
+@receiver(m2m_changed, sender=PostLike)
+def likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_add' and pk_set:
+        # The m2m API bulk-inserts rows, bypassing PostLike.save().
+        if reverse:
+            PostLike.copy_post_created_at(PostLike.objects.filter(user_id=instance.pk, post_id__in=pk_set))
+        else:
+            PostLike.copy_post_created_at(PostLike.objects.filter(post_id=instance.pk, user_id__in=pk_set))
+    if reverse:
+        # instance is the user; pk_set the posts (unknown on clear).
+        response_cache.bump('posts', f'viewer:{instance.pk}', *user_posts_entities(sorted(pk_set or ())))
+    else:
+        response_cache.bump('posts', f'user-posts:{instance.author_id}',
+                            *(f'viewer:{user_id}' for user_id in pk_set or ()))
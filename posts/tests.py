@@ -1,3 +1,556 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+
+from analytics.models import UserAnalytics
+
+from accounts.models import User
+from backend.middleware import RequestMetrics, TimedSerializerMixin, _current
+from backend.routers import ReadWriteRouter
+from . import timeline
+from .buffers import view_buffer
+from .management.commands.audit_query_plans import plan_problems
+from .models import Post, PostLike, Comment, PostView, TimelineEntry
+
+
+class FeedQueryCountTests(APITestCase):
+    """
+    Pin the number of queries a page of posts costs, whatever the number of
+    posts, comments, likes and follows on it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass')
+        authors = [
+            User.objects.create_user(username=f'author{i}', email=f'author{i}@example.com', password='pass')
+            for i in range(3)
+        ]
+        cls.viewer.following.add(*authors)
+        for i in range(8):
+            author = authors[i % len(authors)]
+            post = Post.objects.create(author=author, title=f'Post {i}', description='body')
+            timeline.fan_out(post)
+            post.likes.add(cls.viewer, *authors)
+            for commenter in authors:
+                Comment.objects.create(post=post, author=commenter, content='nice')
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+    def assertFeedQueries(self, url, num):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_explore_posts(self):
+        response = self.assertFeedQueries('/api/posts/explore/', 5)
+        post = response.data['results'][0]
+        self.assertEqual(post['likes_count'], 4)
+        self.assertEqual(post['comments_count'], 3)
+        self.assertTrue(post['is_liked'])
+        self.assertTrue(post['author_profile']['is_following'])
+        self.assertTrue(post['comments'][0]['author_profile']['is_following'])
+
+    def test_post_list(self):
+        self.assertFeedQueries('/api/posts/', 5)
+
+    def test_following_posts(self):
+        # Timeline range read, large-account merge and hydrate replace the feed query.
+        self.assertFeedQueries('/api/posts/following/', 7)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.assertFeedQueries('/api/posts/explore/?limit=2', 5)
+        cache.clear()
+        self.assertFeedQueries('/api/posts/explore/?limit=8', 5)
+
+    def test_cached_author_snapshots_skip_the_author_query(self):
+        self.assertFeedQueries('/api/posts/explore/', 5)
+        self.assertFeedQueries('/api/posts/explore/', 4)
+
+    def test_query_count_does_not_grow_with_scroll_depth(self):
+        url = '/api/posts/explore/?limit=2'
+        while url:
+            cache.clear()
+            url = self.assertFeedQueries(url, 5).data['next']
+
+    def test_offset_pagination_is_kept_for_old_clients(self):
+        response = self.assertFeedQueries('/api/posts/explore/?offset=5', 6)
+        self.assertEqual(response.data['count'], 8)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_sparse_fields_skip_unused_lookups(self):
+        # No comments, likes, authors or follows are read for card fields.
+        response = self.assertFeedQueries('/api/posts/explore/?fields=id,title,likes_count', 1)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'likes_count'})
+        response = self.assertFeedQueries('/api/posts/explore/?fields=id,is_liked,author_name', 3)
+        post = response.data['results'][0]
+        self.assertEqual(set(post), {'id', 'is_liked', 'author_name'})
+        self.assertTrue(post['is_liked'])
+
+    def test_nested_objects_are_only_returned_when_expanded(self):
+        post = self.assertFeedQueries('/api/posts/explore/?expand=', 3).data['results'][0]
+        self.assertNotIn('comments', post)
+        self.assertNotIn('author_profile', post)
+        self.assertIn('description', post)
+
+        post = self.assertFeedQueries('/api/posts/explore/?fields=id&expand=comments', 2).data['results'][0]
+        self.assertEqual(set(post), {'id', 'comments'})
+        self.assertNotIn('author_profile', post['comments'][0])
+
+        cache.clear()
+        post = self.assertFeedQueries(
+            '/api/posts/explore/?fields=id&expand=comments.author_profile', 4
+        ).data['results'][0]
+        self.assertTrue(post['comments'][0]['author_profile']['is_following'])
+
+    def test_unknown_fields_are_rejected(self):
+        for query in ('fields=id,secret', 'expand=comments.secret'):
+            response = self.client.get(f'/api/posts/explore/?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('fields', response.data)
+
+
+class FeedPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.posts = [Post.objects.create(author=cls.author, title=f'Post {i}', description='body') for i in range(7)]
+        # Identical timestamps must not skip or repeat posts.
+        Post.objects.filter(id__in=[post.id for post in cls.posts[2:5]]).update(created_at=cls.posts[2].created_at)
+
+    def page_ids(self, response):
+        return [post['id'] for post in response.data['results']]
+
+    def test_cursor_walks_the_feed_in_order(self):
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, url = [], '/api/posts/?limit=3'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            seen += self.page_ids(response)
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get('/api/posts/?limit=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self.page_ids(back), self.page_ids(first))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/posts/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class AnonymousPostListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', description='body')
+
+    def test_anonymous_post_list_is_cached_until_posts_change(self):
+        self.client.get('/api/posts/')
+        self.assertEqual(self.client.get('/api/posts/')['X-Response-Cache'], 'hit')
+        Post.objects.create(author=self.author, title='Second', description='body')
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Response-Cache'], 'miss')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_flushed_views_invalidate_the_list(self):
+        self.client.get('/api/posts/')
+        view_buffer.record(self.post.id)
+        view_buffer.flush()
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['views_count'], 1)
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.client.force_authenticate(self.author)
+        self.client.get('/api/posts/')
+        self.assertNotIn('X-Response-Cache', self.client.get('/api/posts/'))
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', description='body')
+        self.comment = Comment.objects.create(post=self.post, author=self.reader, content='nice')
+        self.url = f'/api/posts/{self.post.id}/'
+        self.client.force_authenticate(self.reader)
+        self.addCleanup(view_buffer.flush)
+
+    def assertNotModified(self, etag, num_queries=1):
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unchanged_post_is_not_re_sent(self):
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response)
+        # Only the validator query runs; nothing is loaded or serialized.
+        self.assertNotModified(response['ETag'])
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_counters_and_comments_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        for change in (lambda: self.post.add_like(self.author),
+                       lambda: self.post.record_comment(),
+                       lambda: (setattr(self.comment, 'content', 'edited'), self.comment.save()),
+                       lambda: self.reader.save()):
+            time.sleep(0.001)
+            change()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+    def test_flushed_views_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        view_buffer.flush()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_per_viewer(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_per_representation(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(f'{self.url}?fields=id,title', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'id', 'title'})
+
+    def test_missing_post(self):
+        self.assertEqual(self.client.get('/api/posts/999999/').status_code, 404)
+
+    def test_lists_get_weak_etags(self):
+        response = self.client.get('/api/posts/explore/')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get('/api/posts/explore/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+
+class CounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+
+    def setUp(self):
+        self.post = Post.objects.create(author=self.author, title='Post', description='body')
+        self.client.force_authenticate(self.reader)
+
+    def test_like_counters_only_move_on_real_changes(self):
+        for _ in range(2):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(UserAnalytics.objects.get(user=self.author).total_likes, 1)
+
+        for _ in range(2):
+            self.client.post(f'/api/posts/{self.post.id}/unlike/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertEqual(UserAnalytics.objects.get(user=self.author).total_likes, 0)
+
+    def test_comment_counters(self):
+        response = self.client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'hi'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(UserAnalytics.objects.get(user=self.author).total_comments, 1)
+
+        self.client.delete(f"/api/posts/comment/{response.data['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(UserAnalytics.objects.get(user=self.author).total_comments, 0)
+
+    def test_likes_added_through_the_m2m_api_copy_the_post_time(self):
+        other = Post.objects.create(author=self.author, title='Other', description='body')
+        Post.objects.filter(pk=other.pk).update(created_at=self.post.created_at - timedelta(days=1))
+        other.refresh_from_db()
+        self.post.likes.add(self.author)
+        self.reader.liked_posts.add(self.post, other)
+        PostLike.objects.create(post=other, user=self.author)
+        self.assertEqual(
+            {(like.post_id, like.user_id): like.created_at for like in PostLike.objects.select_related('post')},
+            {(like.post_id, like.user_id): like.post.created_at for like in PostLike.objects.select_related('post')},
+        )
+        self.assertEqual(PostLike.objects.count(), 4)
+
+
+@override_settings(VIEW_BUFFER_MAX_EVENTS=1000, VIEW_BUFFER_FLUSH_INTERVAL=3600)
+class ViewBufferTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.posts = [Post.objects.create(author=cls.author, title=f'Post {i}', description='body') for i in range(3)]
+
+    def setUp(self):
+        view_buffer.flush()
+        self.addCleanup(view_buffer.flush)
+        self.client.force_authenticate(self.reader)
+
+    def test_views_are_written_on_flush(self):
+        first, second, _ = self.posts
+        for _ in range(3):
+            self.client.get(f'/api/posts/{first.id}/')
+        self.client.get(f'/api/posts/{second.id}/')
+        self.assertEqual(Post.objects.get(id=first.id).views_count, 0)
+
+        with self.assertNumQueries(4):  # savepoint, live ids, update, release
+            view_buffer.flush()
+        self.assertEqual(Post.objects.get(id=first.id).views_count, 3)
+        self.assertEqual(Post.objects.get(id=second.id).views_count, 1)
+
+    def test_view_marks_count_once_per_user(self):
+        post = self.posts[0]
+        for _ in range(3):
+            self.client.post(f'/api/posts/{post.id}/view/')
+        view_buffer.flush()
+        self.client.post(f'/api/posts/{post.id}/view/')
+        view_buffer.flush()
+
+        self.assertEqual(Post.objects.get(id=post.id).views_count, 1)
+        self.assertEqual(PostView.objects.filter(post=post, user=self.reader).count(), 1)
+
+    def test_mark_returns_the_count_including_this_view(self):
+        post = self.posts[0]
+        url = f'/api/posts/{post.id}/view/'
+        self.assertEqual(self.client.post(url).data['views_count'], 1)
+        self.assertEqual(self.client.post(url).data['views_count'], 1)
+        view_buffer.flush()
+        self.assertEqual(self.client.post(url).data['views_count'], 1)
+
+        self.client.force_authenticate(self.author)
+        with self.settings(VIEW_BUFFER_MAX_EVENTS=1):
+            # The mark flushes itself; the written count is read back.
+            self.assertEqual(self.client.post(url).data['views_count'], 2)
+        self.assertEqual(Post.objects.get(id=post.id).views_count, 2)
+
+    def test_flushes_when_buffer_is_full(self):
+        post = self.posts[0]
+        with self.settings(VIEW_BUFFER_MAX_EVENTS=2):
+            self.client.get(f'/api/posts/{post.id}/')
+            self.client.get(f'/api/posts/{post.id}/')
+        self.assertEqual(Post.objects.get(id=post.id).views_count, 2)
+
+
+@override_settings(VIEW_BUFFER_MAX_EVENTS=1000, VIEW_BUFFER_FLUSH_INTERVAL=0.1)
+class ViewBufferTimerTests(TransactionTestCase):
+    # The timer flushes on its own connection, so rows must be committed.
+    databases = {'default', 'read'}
+
+    def test_idle_buffer_is_flushed_by_the_timer(self):
+        author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        post = Post.objects.create(author=author, title='Post', description='body')
+        self.addCleanup(view_buffer.flush)
+        view_buffer.record(post.id)
+        view_buffer.record(post.id, user_id=author.id)
+
+        deadline = time.monotonic() + 5
+        while Post.objects.get(id=post.id).views_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(Post.objects.get(id=post.id).views_count, 2)
+        self.assertTrue(PostView.objects.filter(post=post, user=author).exists())
+        self.assertEqual(view_buffer.pending(post.id), 0)
+
+
+class TimelineTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        cls.star = User.objects.create_user(username='star', email='star@example.com', password='pass')
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def create_post(self, user, title):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/posts/', {'title': title, 'description': 'body'})
+        self.client.force_authenticate(self.reader)
+        return response.data['id']
+
+    def following_ids(self, url='/api/posts/following/'):
+        return [post['id'] for post in self.client.get(url).data['results']]
+
+    def test_new_posts_are_fanned_out_to_followers(self):
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        post_id = self.create_post(self.author, 'Hello')
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post_id=post_id).exists())
+        self.assertEqual(self.following_ids(), [post_id])
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        older = self.create_post(self.author, 'Before follow')
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        self.assertEqual(self.following_ids(), [older])
+
+        self.client.post(f'/api/accounts/unfollow/{self.author.id}/')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.following_ids(), [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_accounts_are_merged_at_read_time(self):
+        self.client.post(f'/api/accounts/follow/{self.star.id}/')
+        first = self.create_post(self.star, 'First')
+        second = self.create_post(self.star, 'Second')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.following_ids(), [second, first])
+
+    @override_settings(TIMELINE_MAX_ENTRIES=2)
+    def test_reading_past_the_capped_timeline_falls_back(self):
+        self.client.post(f'/api/accounts/follow/{self.author.id}/')
+        post_ids = [self.create_post(self.author, f'Post {i}') for i in range(4)]
+        timeline.trim()
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+        seen, url = [], '/api/posts/following/?limit=1'
+        while url:
+            response = self.client.get(url)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, post_ids[::-1])
+
+
+class PerformanceMiddlewareTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='perf', email='perf@example.com', password='pw')
+        Post.objects.create(author=cls.author, title='t', description='d', category='c')
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_server_timing_header_is_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/posts/'))
+        self.client.force_authenticate(self.author)
+        self.assertNotIn('Server-Timing', self.client.get('/api/posts/'))
+
+        self.author.is_staff = True
+        response = self.client.get('/api/posts/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        with self.settings(PERF_SERVER_TIMING='off'):
+            self.assertNotIn('Server-Timing', self.client.get('/api/posts/'))
+        self.client.force_authenticate(None)
+        with self.settings(PERF_SERVER_TIMING='all'):
+            self.assertIn('Server-Timing', self.client.get('/api/posts/'))
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SLOW_REQUEST_MS=0, PERF_SLOW_QUERY_MS=0)
+    def test_slow_requests_and_queries_are_logged(self):
+        with self.assertLogs('backend.perf', 'WARNING') as logs:
+            self.client.get('/api/posts/')
+        events = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(events[-1]['event'], 'slow_request')
+        self.assertEqual(events[-1]['view'], 'posts.views.PostListCreateView')
+        queries = [event for event in events if event['event'] == 'slow_query']
+        self.assertEqual(len(queries), events[-1]['queries'])
+        self.assertNotIn('%s, %s', ' '.join(event['sql'] for event in queries))
+
+    def test_nested_serializers_are_timed_once(self):
+        class Inner(TimedSerializerMixin, serializers.Serializer):
+            slow = serializers.SerializerMethodField()
+
+            def get_slow(self, obj):
+                time.sleep(0.05)
+                return 1
+
+        class Outer(TimedSerializerMixin, serializers.Serializer):
+            inner = serializers.SerializerMethodField()
+
+            def get_inner(self, obj):
+                return Inner(obj).data
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            Outer(object()).data
+        finally:
+            _current.reset(token)
+        self.assertGreaterEqual(metrics.serializer_time, 0.05)
+        self.assertLess(metrics.serializer_time, 0.09)
+        self.assertEqual(metrics.serializer_depth, 0)
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_drf_serializers_are_not_patched(self):
+        self.client.get('/api/posts/')
+        for cls in (serializers.Serializer, serializers.ListSerializer):
+            self.assertEqual(cls.data.fget.__module__, 'rest_framework.serializers')
+
+    @override_settings(PERF_SAMPLE_RATE=0, PERF_SERVER_TIMING='all')
+    def test_unsampled_requests_are_untouched(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/posts/'))
+
+
+class StaticFilesMiddlewareTests(APITestCase):
+    def setUp(self):
+        root = self.enterContext(tempfile.TemporaryDirectory())
+        Path(root, 'hello.txt').write_text('hello')
+        # Read when the test client loads its middleware, on its first request.
+        self.enterContext(override_settings(STATIC_ROOT=root))
+
+    def test_static_files_are_served(self):
+        response = self.client.get('/static/hello.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'hello')
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+
+    async def test_static_files_are_served_under_asgi(self):
+        response = await self.async_client.get('/static/hello.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'hello')
+        self.assertEqual((await self.async_client.get('/api/posts/')).status_code, 200)
+
+
+class DatabaseSetupTests(APITestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        # Every TestCase runs inside a transaction on default.
+        self.assertEqual(Post.objects.all().db, 'default')
+        self.assertEqual(ReadWriteRouter().db_for_write(Post), 'default')
+
+
+class QueryPlanAuditTests(APITestCase):
+    def test_endpoint_queries_use_indexes(self):
+        out = StringIO()
+        call_command('audit_query_plans', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
+
+    def test_sorts_and_filtered_scans_are_reported(self):
+        _, problems = plan_problems(Post.objects.order_by('title')[:10])
+        self.assertTrue(any('TEMP B-TREE' in line for line in problems))
+        _, problems = plan_problems(Post.objects.filter(title='x')[:10])
+        self.assertTrue(any('SCAN' in line for line in problems))
+
+
+class ReadWriteRouterTests(SimpleTestCase):
+    def test_reads_outside_transactions_use_the_read_alias(self):
+        router = ReadWriteRouter()
+        self.assertEqual(router.db_for_read(Post), 'read')
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('read', 'posts'))
@@ -0,0 +1,103 @@
+"""
+Materialized home timelines for FollowingPostsView.
+
+New posts are fanned out on write: ``fan_out`` pushes the post id into a
+TimelineEntry row per follower, so reading the following feed is one range
+read on ``(user, created_at, post)`` plus one batched hydrate. Authors with
+more than ``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers are not fanned out;
+their posts are read at request time and merged in. Timelines are capped to
+``TIMELINE_MAX_ENTRIES`` by ``trim``; a reader scrolling past the end of their
+timeline falls back to querying followed authors directly.
+"""
+from django.conf import settings
+from django.db.models import Subquery
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+from accounts.models import User
+from .models import Post, TimelineEntry
+from .pagination import keyset_filter
+
+
+def max_entries():
+    return getattr(settings, 'TIMELINE_MAX_ENTRIES', 800)
+
+
+def is_large_account(user):
+    return user.followers_count > getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def fan_out(post):
+    """Push a new post into its author's followers' timelines."""
+    author = User.objects.only('followers_count').get(pk=post.author_id)
+    if is_large_account(author):
+        return
+    follower_ids = User.followers.through.objects.filter(
+        from_user_id=post.author_id
+    ).values_list('to_user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created_at=post.created_at) for user_id in follower_ids.iterator()],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, followee):
+    """Copy ``followee``'s recent posts into ``user``'s timeline after a follow."""
+    if is_large_account(followee):
+        return
+    recent = Post.objects.filter(author=followee).order_by('-created_at', '-id')[:max_entries()]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=post_id, created_at=created_at)
+         for post_id, created_at in recent.values_list('id', 'created_at')],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    trim([user.pk])
+
+
+def purge(user, followee):
+    """Drop ``followee``'s posts from ``user``'s timeline after an unfollow."""
+    TimelineEntry.objects.filter(user=user, post__author=followee).delete()
+
+
+def trim(user_ids=None):
+    """Delete entries beyond the newest ``TIMELINE_MAX_ENTRIES`` per user."""
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    overflow = entries.annotate(
+        position=Window(RowNumber(), partition_by='user_id', order_by=('-created_at', '-post_id'))
+    ).filter(position__gt=max_entries()).values('id')
+    deleted, _ = TimelineEntry.objects.filter(id__in=Subquery(overflow)).delete()
+    return deleted
+
+
+def fetch(user, cursor, reverse, limit):
+    """
+    Return up to ``limit`` posts of ``user``'s following feed past ``cursor``,
+    in the shape FeedPagination.paginate_keyset expects.
+    """
+    entries = list(
+        keyset_filter(TimelineEntry.objects.filter(user=user), cursor, reverse, id_field='post_id')
+        .values_list('post_id', 'created_at')[:limit]
+    )
+    candidates = dict(entries)
+
+    followees = user.following.all()
+    if reverse or len(entries) < limit:
+        # Past the end of the materialized timeline: read followed authors directly.
+        sources = [Post.objects.filter(author__in=followees.values('id'))]
+    else:
+        # One range read per large account on (author, created_at, id), rather
+        # than merging all of their posts in a sort.
+        large_followees = followees.filter(
+            followers_count__gt=getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+        ).values_list('id', flat=True)
+        sources = [Post.objects.filter(author_id=author_id) for author_id in large_followees]
+    for source in sources:
+        candidates.update(keyset_filter(source, cursor, reverse).values_list('id', 'created_at')[:limit])
+
+    page = sorted(candidates, key=lambda post_id: (candidates[post_id], post_id), reverse=not reverse)[:limit]
+    posts = Post.objects.in_bulk(page)
+    return [posts[post_id] for post_id in page if post_id in posts]
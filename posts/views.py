@@ -1,6 +1,14 @@
+from django.db import transaction
+from django.db.models import F, Max
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from analytics.models import UserAnalytics
+from backend.conditional import ConditionalGetMixin
+from backend.response_cache import CachedResponseMixin
+from .buffers import view_buffer
 from .models import Post, Comment, PostView
+from .pagination import FeedPagination
+from . import timeline
 from .serializers import PostSerializer, CommentSerializer
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
@@ -13,36 +21,60 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         return obj.author == request.user
     
     
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_anonymous_only = True
+
+    def get_cache_entities(self):
+        return ['posts']
 
     def get_queryset(self):
-        return Post.objects.all().order_by('-created_at')
+        return Post.objects.order_by('-created_at')
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        timeline.fan_out(post)
+        UserAnalytics.objects.filter(user=self.request.user).update(total_posts=F('total_posts') + 1)
 
-class PostRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+class PostRetrieveUpdateDeleteView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthorOrReadOnly]
     queryset = Post.objects.all()
-    
+
+    def get_validators(self):
+        # The post, its embedded author, and its comments and their authors.
+        # A 304 revalidation is not counted as a view.
+        return Post.objects.filter(pk=self.kwargs['pk']).annotate(
+            comments_updated_at=Max('comments__updated_at'),
+            commenters_updated_at=Max('comments__author__updated_at'),
+        ).values_list('updated_at', 'author__updated_at', 'comments_updated_at', 'commenters_updated_at').first()
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
         if request.user.is_authenticated or request.user != instance.author:
-            instance.views_count += 1
-            instance.save(update_fields=['views_count'])
+            view_buffer.record(instance.id)
         
-        return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            UserAnalytics.objects.filter(user_id=instance.author_id).update(
+                total_posts=F('total_posts') - 1,
+                total_likes=F('total_likes') - instance.likes_count,
+                total_comments=F('total_comments') - instance.comments_count,
+            )
+            instance.delete()
 
 class LikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, post_id):
         post = Post.objects.get(id=post_id)
-        post.likes.add(request.user)
+        post.add_like(request.user)
         return Response({'message': 'Post liked'})
 
 class UnlikePostView(generics.GenericAPIView):
@@ -50,7 +82,7 @@ class UnlikePostView(generics.GenericAPIView):
 
     def post(self, request, post_id):
         post = Post.objects.get(id=post_id)
-        post.likes.remove(request.user)
+        post.remove_like(request.user)
         return Response({'message': 'Post unliked'})
 
 class CommentCreateView(generics.CreateAPIView):
@@ -60,7 +92,9 @@ class CommentCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
-        serializer.save(author=self.request.user, post=post)
+        with transaction.atomic():
+            serializer.save(author=self.request.user, post=post)
+            post.record_comment()
 
 class CommentUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CommentSerializer
@@ -70,14 +104,20 @@ class CommentUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Comment.objects.filter(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            instance.post.record_comment(-1)
+
 
 class ExplorePostsView(generics.ListAPIView):
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         # ✅ show ALL posts (including own posts)
-        return Post.objects.all().order_by("-created_at")
+        return Post.objects.order_by("-created_at")
 
 
 
@@ -93,8 +133,8 @@ class PostAnalyticsView(APIView):
         data = {
             'post_id': post.id,
             'title': post.title,
-            'likes_count': post.likes.count(),
-            'comments_count': post.comments.count(),
+            'likes_count': post.likes_count,
+            'comments_count': post.comments_count,
             'views_count': post.views_count,
             'created_at': post.created_at,
         }
@@ -104,24 +144,35 @@ class PostViewMarkView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, post_id):
-        try:
-            post = Post.objects.get(id=post_id)
-        except Post.DoesNotExist:
+        views_count = Post.objects.filter(id=post_id).values_list("views_count", flat=True).first()
+        if views_count is None:
             return Response({"error": "Post not found"}, status=404)
 
-        obj, created = PostView.objects.get_or_create(post=post, user=request.user)
-        if created:
-            post.views_count += 1
-            post.save(update_fields=["views_count"])
-
-        return Response({"views_count": post.views_count})
+        if not PostView.objects.filter(post_id=post_id, user_id=request.user.id).exists():
+            # Buffered: the PostView row and the increment are written on the next flush.
+            if view_buffer.record(post_id, user_id=request.user.id):
+                views_count = Post.objects.filter(id=post_id).values_list("views_count", flat=True).first() or 0
+        return Response({"views_count": views_count + view_buffer.pending(post_id)})
     
 class FollowingPostsView(generics.ListAPIView):
     serializer_class = PostSerializer
+    pagination_class = FeedPagination
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         following_users = self.request.user.following.all()
         return Post.objects.filter(author__in=following_users).order_by("-created_at")
 
+    def list(self, request, *args, **kwargs):
+        if self.paginator.use_offset(request):
+            return super().list(request, *args, **kwargs)
+
+        # Read from the materialized timeline (see posts.timeline).
+        page = self.paginator.paginate_keyset(
+            lambda cursor, reverse, limit: timeline.fetch(request.user, cursor, reverse, limit),
+            request,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
 
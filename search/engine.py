@@ -0,0 +1,144 @@
+"""
+Full-text search over posts and users.
+
+On SQLite the text lives in two FTS5 tables, ``search_post_index`` (title,
+description, category) and ``search_user_index`` (username, full_name, bio),
+keyed by the row id of the indexed object. They are kept in sync from model
+signals (see search.signals) and queried with BM25 ranking. Other database
+backends fall back to ``icontains`` filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from accounts.models import User
+from posts.models import Post
+
+POST_INDEX = 'search_post_index'
+USER_INDEX = 'search_user_index'
+
+# BM25 column weights: a hit in the title counts most, then category.
+POST_WEIGHTS = (10.0, 1.0, 4.0)
+# Username and full name count more than bio.
+USER_WEIGHTS = (10.0, 8.0, 1.0)
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {POST_INDEX} USING fts5("
+    "title, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_INDEX} USING fts5("
+    "username, full_name, bio, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+]
+REBUILD_SQL = [
+    f"DELETE FROM {POST_INDEX}",
+    f"INSERT INTO {POST_INDEX} (rowid, title, description, category) "
+    "SELECT id, title, description, COALESCE(category, '') FROM posts_post",
+    f"DELETE FROM {USER_INDEX}",
+    f"INSERT INTO {USER_INDEX} (rowid, username, full_name, bio) "
+    "SELECT id, username, COALESCE(full_name, ''), COALESCE(bio, '') FROM accounts_user",
+]
+
+
+def uses_fts(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must appear and
+    the last one may be a prefix, so results update as the user types.
+    Returns None when the query has no searchable words.
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _ranked_ids(table, weights, query, limit, offset):
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    weight_args = ', '.join(str(weight) for weight in weights)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s "
+            f"ORDER BY bm25({table}, {weight_args}) LIMIT %s OFFSET %s",
+            [expression, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _in_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def search_posts(query, limit, offset=0, queryset=None):
+    """Return up to ``limit`` posts matching ``query``, best match first."""
+    queryset = queryset if queryset is not None else Post.objects.all()
+    if not uses_fts():
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        for word in words:
+            queryset = queryset.filter(
+                Q(title__icontains=word) | Q(description__icontains=word) | Q(category__icontains=word)
+            )
+        return list(queryset.order_by('-created_at')[offset:offset + limit])
+    return _in_order(queryset, _ranked_ids(POST_INDEX, POST_WEIGHTS, query, limit, offset))
+
+
+def search_users(query, limit, offset=0, queryset=None):
+    """Return up to ``limit`` users matching ``query``, best match first."""
+    queryset = queryset if queryset is not None else User.objects.all()
+    if not uses_fts():
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        for word in words:
+            queryset = queryset.filter(
+                Q(username__icontains=word) | Q(full_name__icontains=word) | Q(bio__icontains=word)
+            )
+        return list(queryset.order_by('username')[offset:offset + limit])
+    return _in_order(queryset, _ranked_ids(USER_INDEX, USER_WEIGHTS, query, limit, offset))
+
+
+def index_post(post):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {POST_INDEX} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {POST_INDEX} (rowid, title, description, category) VALUES (%s, %s, %s, %s)",
+            [post.pk, post.title, post.description, post.category or ''],
+        )
+
+
+def index_user(user):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {USER_INDEX} WHERE rowid = %s", [user.pk])
+        cursor.execute(
+            f"INSERT INTO {USER_INDEX} (rowid, username, full_name, bio) VALUES (%s, %s, %s, %s)",
+            [user.pk, user.username, user.full_name or '', user.bio or ''],
+        )
+
+
+def remove(table, pk):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [pk])
+
+
+def rebuild():
+    """Recreate both indexes from the posts and users tables."""
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        for sql in CREATE_SQL + REBUILD_SQL:
+            cursor.execute(sql)
@@ -0,0 +1,73 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import User
+from posts.models import Post
+from search import engine
+
+TOPICS = (
+    "django react python rust docker kubernetes postgres sqlite redis graphql api rest "
+    "testing async cache index query frontend backend devops cloud design pattern career "
+    "interview tutorial guide roadmap security auth token stream search ranking"
+).split()
+SYLLABLES = "ka lo mi ne su ta ri po ve zu an el or is um".split()
+
+
+def vocabulary(rng, size=20_000):
+    """Topic words mixed into a Zipf-distributed filler vocabulary, like real text."""
+    words = TOPICS + [''.join(rng.choices(SYLLABLES, k=3)) for _ in range(size)]
+    rng.shuffle(words)
+    return words, list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 search with the old icontains scan over a seeded corpus (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not engine.uses_fts():
+            raise CommandError("The FTS5 engine is only used on SQLite.")
+
+        rng = random.Random(42)
+        words, cum_weights = vocabulary(rng)
+        queries = ["django", "kubernetes guide", "pyth", "redis cache", "zzzz"]
+
+        with transaction.atomic():
+            author = User.objects.create_user(username='bench-search', email='bench-search@example.com')
+            self.stdout.write(f"Seeding {options['posts']} posts...")
+            Post.objects.bulk_create(
+                (Post(author=author,
+                      title=' '.join(rng.choices(words, cum_weights=cum_weights, k=6)),
+                      description=' '.join(rng.choices(words, cum_weights=cum_weights, k=60)),
+                      category=rng.choice(TOPICS))
+                 for _ in range(options['posts'])),
+                batch_size=2000,
+            )
+            start = time.perf_counter()
+            engine.rebuild()
+            self.stdout.write(f"Index build: {time.perf_counter() - start:.2f} s")
+
+            self.stdout.write(f"{'query':<20}{'icontains ms':>14}{'fts5 ms':>10}")
+            for query in queries:
+                legacy = self.measure(lambda: list(
+                    Post.objects.filter(Q(title__icontains=query)).values_list('id', flat=True)
+                ), options['repeat'])
+                fts = self.measure(lambda: engine.search_posts(query, 10), options['repeat'])
+                self.stdout.write(f"{query:<20}{legacy:>14.2f}{fts:>10.2f}")
+
+            transaction.set_rollback(True)
+
+    def measure(self, func, repeat):
+        func()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
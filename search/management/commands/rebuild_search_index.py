@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search import engine
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search indexes for posts and users."
+
+    def handle(self, *args, **options):
+        if not engine.uses_fts():
+            self.stdout.write("Full-text indexes are only used on SQLite; nothing to do.")
+            return
+        with transaction.atomic():
+            engine.rebuild()
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt."))
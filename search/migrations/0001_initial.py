@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Frozen copies of the statements in search.engine, so later edits there do
+# not change what this migration does.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_post_index USING fts5("
+    "title, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_user_index USING fts5("
+    "username, full_name, bio, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO search_post_index (rowid, title, description, category) "
+    "SELECT id, title, description, COALESCE(category, '') FROM posts_post",
+    "INSERT INTO search_user_index (rowid, username, full_name, bio) "
+    "SELECT id, username, COALESCE(full_name, ''), COALESCE(bio, '') FROM accounts_user",
+]
+DROP_SQL = [
+    "DROP TABLE IF EXISTS search_post_index",
+    "DROP TABLE IF EXISTS search_user_index",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0007_user_followers_count_user_following_count'),
+        ('posts', '0007_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
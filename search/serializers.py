@@ -0,0 +1,22 @@
+from rest_framework import serializers
+from accounts.models import User
+from backend.fieldsets import SparseFieldsMixin
+from backend.middleware import TimedSerializerMixin
+from posts.models import Post
+
+
+class SearchUserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name', 'profile_photo']
+
+
+class SearchPostSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.username', read_only=True)
+
+    class Meta:
+        model = Post
+        fields = [
+            'id', 'author', 'author_name', 'title', 'category', 'image_url',
+            'likes_count', 'comments_count', 'created_at'
+        ]
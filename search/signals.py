@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from posts.models import Post
+from . import engine
+from .suggest import suggestions
+
+
+@receiver(pre_save, sender=Post)
+def remember_category(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Assume unchanged unless the category may be among the saved fields.
+    instance._saved_category = instance.category
+    if raw or instance.pk is None or suggestions.loaded_at is None:
+        return
+    if update_fields is None or 'category' in update_fields:
+        instance._saved_category = (
+            Post.objects.filter(pk=instance.pk).values_list('category', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        engine.index_post(instance)
+        old = None if created else instance._saved_category
+        suggestions.category_changed(old, instance.category)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    engine.remove(engine.POST_INDEX, instance.pk)
+    suggestions.category_changed(instance.category, None)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    searchable = {'username', 'full_name', 'bio'}
+    if not raw and (update_fields is None or searchable & set(update_fields)):
+        engine.index_user(instance)
+        suggestions.user_changed(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    engine.remove(engine.USER_INDEX, instance.pk)
+    suggestions.user_removed(instance.pk)
@@ -0,0 +1,247 @@
+"""
+In-memory prefix index behind ``/api/search/suggest/``.
+
+Each worker keeps two tries, one over usernames and full names (ranked by
+follower count) and one over post categories (ranked by number of posts).
+Every trie node caches its top matches, so a suggestion is a walk down the
+prefix and a slice, with no database access. The index is warmed at startup
+(backend.wsgi / backend.asgi, or on first use), updated from model signals
+in this process, and reloaded in the background every
+``SUGGEST_INDEX_REFRESH`` seconds to pick up writes made by other workers.
+"""
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+from accounts.models import User
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 10
+
+
+class _Node:
+    __slots__ = ('children', 'keys', 'top', 'dirty')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()   # entries with a term ending here
+        self.top = []       # best entries in this subtree, best first
+        self.dirty = False  # top may be missing entries; rebuild on read
+
+
+class PrefixIndex:
+    """A trie of scored entries that answers top-k prefix queries."""
+
+    def __init__(self):
+        self._root = _Node()
+        self._terms = {}
+        self._scores = {}
+        self._payloads = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def _rank(self, key):
+        return (-self._scores[key], key)
+
+    def _paths(self, key):
+        for term in self._terms[key]:
+            node, path = self._root, []
+            for char in term:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            yield path
+
+    def add(self, key, terms, score, payload):
+        """Insert or replace entry ``key`` reachable by each of ``terms``."""
+        with self._lock:
+            if key in self._scores:
+                self.remove(key)
+            self._terms[key] = {term.lower() for term in terms if term}
+            self._scores[key] = score
+            self._payloads[key] = payload
+            for term in self._terms[key]:
+                node = self._root
+                for char in term:
+                    node = node.children.setdefault(char, _Node())
+                    self._offer(node, key)
+                node.keys.add(key)
+
+    def remove(self, key):
+        with self._lock:
+            if key not in self._scores:
+                return
+            for path in self._paths(key):
+                for node in path:
+                    if key in node.top:
+                        node.top.remove(key)
+                        node.dirty = True
+                if path:
+                    path[-1].keys.discard(key)
+            del self._terms[key], self._scores[key], self._payloads[key]
+
+    def adjust(self, key, delta):
+        """Shift the score of ``key`` by ``delta``."""
+        with self._lock:
+            if key not in self._scores:
+                return
+            self._scores[key] += delta
+            for path in self._paths(key):
+                for node in path:
+                    if key in node.top:
+                        node.top.sort(key=self._rank)
+                        # A lower score may let an entry outside the cached top overtake it.
+                        if delta < 0 and len(node.top) == TOP_K:
+                            node.dirty = True
+                    elif delta > 0:
+                        self._offer(node, key)
+
+    def payload(self, key):
+        return self._payloads.get(key)
+
+    def score(self, key):
+        return self._scores.get(key, 0)
+
+    def search(self, prefix, limit=TOP_K):
+        prefix = prefix.lower()
+        with self._lock:
+            node = self._root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if node is self._root:
+                return []
+            if node.dirty:
+                self._refresh(node)
+            return [self._payloads[key] for key in node.top[:limit]]
+
+    def _offer(self, node, key):
+        if key not in node.top:
+            node.top.append(key)
+        node.top.sort(key=self._rank)
+        del node.top[TOP_K:]
+
+    def _refresh(self, node):
+        keys, stack = set(), [node]
+        while stack:
+            current = stack.pop()
+            keys |= current.keys
+            stack.extend(current.children.values())
+        node.top = heapq.nsmallest(TOP_K, keys, key=self._rank)
+        node.dirty = False
+
+
+class Suggestions:
+    """The per-process user and category indexes, loaded from the database."""
+
+    def __init__(self):
+        self.users = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.loaded_at = None
+        self._reloading = False
+
+    def warm(self):
+        """Load both indexes from the database, replacing the current ones."""
+        users, categories = PrefixIndex(), PrefixIndex()
+        rows = User.objects.values_list('id', 'username', 'full_name', 'profile_photo', 'followers_count')
+        for user_id, username, full_name, profile_photo, followers_count in rows.iterator():
+            users.add(user_id, user_terms(username, full_name), followers_count,
+                      user_payload(user_id, username, full_name, profile_photo))
+        counts = (
+            Post.objects.exclude(category__isnull=True).exclude(category='')
+            .values(key=Lower('category')).annotate(posts=Count('id'), label=Min('category'))
+        )
+        for row in counts:
+            categories.add(row['key'], [row['key']], row['posts'], category_payload(row['label']))
+
+        self.users, self.categories = users, categories
+        self.loaded_at = time.monotonic()
+
+    def warm_on_startup(self):
+        try:
+            self.warm()
+        except DatabaseError:
+            logger.warning("Could not warm the suggestion index; it will load on first use", exc_info=True)
+        finally:
+            # Do not carry this connection into forked workers.
+            connection.close()
+
+    def ensure_fresh(self):
+        if self.loaded_at is None:
+            self.warm()
+            return
+        refresh = getattr(settings, 'SUGGEST_INDEX_REFRESH', 300)
+        if refresh and time.monotonic() - self.loaded_at > refresh and not self._reloading:
+            self._reloading = True
+            threading.Thread(target=self._reload, daemon=True).start()
+
+    def user_changed(self, user):
+        if self.loaded_at is not None:
+            self.users.add(user.pk, user_terms(user.username, user.full_name), user.followers_count,
+                           user_payload(user.pk, user.username, user.full_name, user.profile_photo))
+
+    def user_removed(self, user_id):
+        self.users.remove(user_id)
+
+    def followers_changed(self, user_id, delta):
+        self.users.adjust(user_id, delta)
+
+    def category_changed(self, old, new):
+        """Move one post from category ``old`` to ``new`` (either may be blank)."""
+        if self.loaded_at is None or (old or '').lower() == (new or '').lower():
+            return
+        if old:
+            key = old.lower()
+            self.categories.adjust(key, -1)
+            if self.categories.score(key) <= 0:
+                self.categories.remove(key)
+        if new:
+            key = new.lower()
+            if self.categories.payload(key) is None:
+                self.categories.add(key, [key], 1, category_payload(new))
+            else:
+                self.categories.adjust(key, 1)
+
+    def _reload(self):
+        try:
+            self.warm()
+        except DatabaseError:
+            logger.exception("Reloading the suggestion index failed")
+        finally:
+            self._reloading = False
+            connection.close()
+
+    def suggest(self, prefix, limit):
+        self.ensure_fresh()
+        return {
+            'users': self.users.search(prefix, limit),
+            'categories': self.categories.search(prefix, limit),
+        }
+
+
+def user_terms(username, full_name):
+    full_name = (full_name or '').strip()
+    return [username, full_name, *full_name.split()]
+
+
+def user_payload(user_id, username, full_name, profile_photo):
+    return {'id': user_id, 'username': username, 'full_name': full_name, 'profile_photo': profile_photo}
+
+
+def category_payload(category):
+    return {'category': category}
+
+
+suggestions = Suggestions()
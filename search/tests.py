@@ -1,3 +1,137 @@
 from django.test import TestCase
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from accounts.models import User
+from posts.models import Post
+from .suggest import PrefixIndex, suggestions
+
+
+class SearchAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='pass', full_name='Alice Django'
+        )
+        cls.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass')
+        cls.title_hit = Post.objects.create(author=cls.bob, title='Django signals', description='Hooks.')
+        cls.body_hit = Post.objects.create(
+            author=cls.bob, title='Weekend notes', description='Some django and some react.'
+        )
+        cls.category_hit = Post.objects.create(
+            author=cls.bob, title='Deploying', description='Notes.', category='Django'
+        )
+        Post.objects.create(author=cls.bob, title='Rust ownership', description='Borrowing.')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_posts_are_ranked_by_field(self):
+        ids = [post['id'] for post in self.search('django')['posts']]
+        self.assertEqual(ids, [self.title_hit.id, self.category_hit.id, self.body_hit.id])
+
+    def test_users_match_full_name_and_prefix(self):
+        self.assertEqual([user['username'] for user in self.search('djan')['users']], ['alice'])
+        self.assertEqual([user['username'] for user in self.search('ali')['users']], ['alice'])
+
+    def test_sparse_fields_apply_to_both_result_lists(self):
+        results = self.search('django', fields='id,title,username')
+        self.assertEqual(set(results['posts'][0]), {'id', 'title'})
+        self.assertEqual(set(results['users'][0]), {'id', 'username'})
+        response = self.client.get('/api/search/', {'q': 'django', 'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lists_without_selected_fields_are_not_searched(self):
+        # The post search alone: FTS rowids, then the rows.
+        with self.assertNumQueries(2):
+            results = self.search('django', fields='title')
+        self.assertEqual(results['users'], [])
+        self.assertEqual([set(post) for post in results['posts']], [{'title'}] * 3)
+        results = self.search('django', fields='username')
+        self.assertEqual(results['posts'], [])
+        self.assertEqual(results['users'], [{'username': 'alice'}])
+
+    def test_results_use_slim_shape(self):
+        post = self.search('signals')['posts'][0]
+        self.assertNotIn('comments', post)
+        self.assertNotIn('author_profile', post)
+        self.assertEqual(post['author_name'], 'bob')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.title_hit.title = 'Flask signals'
+        self.title_hit.save()
+        self.assertNotIn(self.title_hit.id, [post['id'] for post in self.search('django')['posts']])
+
+        self.body_hit.delete()
+        self.assertEqual([post['id'] for post in self.search('react')['posts']], [])
+
+    def test_pagination(self):
+        first = self.search('django', limit=2)
+        self.assertEqual(len(first['posts']), 2)
+        self.assertIsNotNone(first['next'])
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(second['posts']), 1)
+        self.assertIsNone(second['next'])
+
+    def test_blank_query_returns_nothing(self):
+        self.assertEqual(self.search('  '), {'users': [], 'posts': [], 'next': None})
+
+
+class PrefixIndexTests(TestCase):
+    def test_top_matches_follow_score_changes(self):
+        index = PrefixIndex()
+        index.add(1, ['ana'], 5, 'ana')
+        index.add(2, ['andy', 'andrew smith', 'smith'], 9, 'andy')
+        index.add(3, ['anton'], 1, 'anton')
+        self.assertEqual(index.search('an'), ['andy', 'ana', 'anton'])
+        self.assertEqual(index.search('smi'), ['andy'])
+
+        index.adjust(3, 10)
+        self.assertEqual(index.search('an', 2), ['anton', 'andy'])
+        index.adjust(3, -10)
+        index.remove(2)
+        self.assertEqual(index.search('an'), ['ana', 'anton'])
+        self.assertEqual(index.search('smi'), [])
+
+
+class SuggestAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dana = User.objects.create_user(username='dana', email='dana@example.com', password='pass')
+        cls.dave = User.objects.create_user(
+            username='dave', email='dave@example.com', password='pass', full_name='David Daniels'
+        )
+        for i in range(3):
+            Post.objects.create(author=cls.dana, title=f'Post {i}', description='body', category='DevOps')
+        Post.objects.create(author=cls.dana, title='Post', description='body', category='Design')
+
+    def setUp(self):
+        suggestions.warm()
+
+    def suggest(self, prefix):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/search/suggest/', {'q': prefix})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_users_ranked_by_followers(self):
+        self.client.force_authenticate(self.dana)
+        self.client.post(f'/api/accounts/follow/{self.dave.id}/')
+        self.client.force_authenticate(None)
+        self.assertEqual([user['username'] for user in self.suggest('da')['users']], ['dave', 'dana'])
+        self.assertEqual([user['username'] for user in self.suggest('dani')['users']], ['dave'])
+
+    def test_categories_ranked_by_post_count(self):
+        self.assertEqual(self.suggest('de')['categories'], [{'category': 'DevOps'}, {'category': 'Design'}])
+
+    def test_index_follows_model_changes(self):
+        User.objects.create_user(username='daisy', email='daisy@example.com', password='pass')
+        post = Post.objects.create(author=self.dana, title='Post', description='body', category='Data')
+        self.assertIn('daisy', [user['username'] for user in self.suggest('dai')['users']])
+        self.assertEqual(self.suggest('dat')['categories'], [{'category': 'Data'}])
+
+        post.category = 'Docs'
+        post.save()
+        self.assertEqual(self.suggest('dat')['categories'], [])
+        self.assertEqual(self.suggest('doc')['categories'], [{'category': 'Docs'}])
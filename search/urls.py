@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import SearchAPIView
+from .views import SearchAPIView, SuggestAPIView
 
 urlpatterns = [
     path('', SearchAPIView.as_view(), name='search'),
+    path('suggest/', SuggestAPIView.as_view(), name='search-suggest'),
 ]
@@ -1,24 +1,95 @@
-from rest_framework import generics, permissions
-from posts.models import Post
-from accounts.models import User
-from posts.serializers import PostSerializer
-from accounts.serializers import UserSerializer
+from rest_framework import permissions
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
+from posts.models import Post
+from accounts.models import User
+from backend.fieldsets import Fieldset
+from . import engine
+from .serializers import SearchPostSerializer, SearchUserSerializer
+from .suggest import TOP_K, suggestions
 
 class SearchAPIView(APIView):
+    """
+    Ranked full-text search over posts (title, description, category) and
+    users (username, full name, bio).
+
+    GET ?q=<text>&limit=<n>&offset=<n>. ``next`` links to the following page
+    while either list may have more results. ``?fields=`` trims both lists
+    (see backend.fieldsets); a list none of whose fields are selected is
+    returned empty.
+    """
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'search'
+    default_limit = 10
+    max_limit = 50
 
     def get(self, request, *args, **kwargs):
         query = request.query_params.get('q', '')
+        limit, offset = self.get_limit_offset(request)
+        context = self.get_serializer_context(request)
+        user_fields = set(SearchUserSerializer(context=context).fields)
+        post_fields = set(SearchPostSerializer(context=context).fields)
 
-        users = User.objects.filter(username__icontains=query)
-        posts = Post.objects.filter(title__icontains=query)
+        # Fetch one extra row of each kind to know whether there is a next page,
+        # loading only the columns of the selected fields. A list with no
+        # selected field is not searched at all.
+        users = posts = []
+        if user_fields:
+            users = engine.search_users(
+                query, limit + 1, offset,
+                queryset=User.objects.only('id', *user_fields),
+            )
+        if post_fields:
+            post_columns = {'id', 'created_at', *(post_fields - {'author_name'})}
+            posts = Post.objects.all()
+            if 'author_name' in post_fields:
+                post_columns |= {'author', 'author__username'}
+                posts = posts.select_related('author')
+            posts = engine.search_posts(query, limit + 1, offset, queryset=posts.only(*post_columns))
 
-        user_serializer = UserSerializer(users, many=True)
-        post_serializer = PostSerializer(posts, many=True)
+        next_link = None
+        if len(users) > limit or len(posts) > limit:
+            next_link = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
 
         return Response({
-            'users': user_serializer.data,
-            'posts': post_serializer.data,
+            'users': SearchUserSerializer(users[:limit], many=True, context=context).data,
+            'posts': SearchPostSerializer(posts[:limit], many=True, context=context).data,
+            'next': next_link,
         })
+
+    def get_serializer_context(self, request):
+        # ?fields= applies to both lists; a name only has to exist in one of them.
+        fieldset = Fieldset.from_request(request)
+        if fieldset is not None:
+            fieldset.select(set(SearchUserSerializer().fields) | set(SearchPostSerializer().fields))
+        return {'request': request, 'fieldset': fieldset, 'strict_fields': False}
+
+    def get_limit_offset(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return self.default_limit, 0
+        return limit, offset
+
+
+class SuggestAPIView(APIView):
+    """
+    Prefix autocomplete for the search box, answered from the in-memory
+    index in search.suggest without touching the database.
+
+    GET ?q=<prefix>&limit=<k> returns the top ``k`` users by follower count
+    and categories by number of posts.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_scope = 'suggest'
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), TOP_K)
+        except ValueError:
+            limit = 5
+        return Response(suggestions.suggest(prefix, limit))